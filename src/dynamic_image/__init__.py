@@ -1,14 +1,18 @@
 """Dynamic Image - A Python project for dynamic image processing."""
 
+import os
+from pathlib import Path
+
 __version__ = "0.1.0"
 
-# Import main functions/classes here to make them available at package level
-# Example:
-# from .core import YourMainClass
-# from .utils import your_utility_function
+# 数据目录（prompt.md、images/、result/、video_download.db 所在目录）：
+# 默认是源码仓库根目录，可用环境变量 DYNAMIC_IMAGE_ROOT 或 `dynamic-image --root` 指定
+PROJECT_ROOT = Path(os.environ.get("DYNAMIC_IMAGE_ROOT") or Path(__file__).resolve().parent.parent.parent)
+
+# 包本身只做轻量导入；各子命令需要的 SDK（google.generativeai、curl_cffi、deep_translator）
+# 在对应模块被用到时才导入，见 dynamic_image.cli
 
 __all__ = [
     "__version__",
-    # Add your exported symbols here
+    "PROJECT_ROOT",
 ]
-
@@ -0,0 +1,6 @@
+"""python -m dynamic_image：与 dynamic-image 命令相同"""
+import sys
+
+from dynamic_image.cli import main
+
+sys.exit(main())
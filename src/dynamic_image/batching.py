@@ -0,0 +1,92 @@
+"""
+按 token 预算自适应分批
+
+Gemini 的输出上限是固定的 token 数，每批的条目数过多时返回的 JSON 会被截断。
+AdaptiveBatcher 按估算的输入 / 输出 token 数装批，并根据每批的结果自我调整：
+- 成功：按实际输出长度更新 "每条输出 token 数" 的估计，满批成功后批大小加法增长；
+- 截断：批大小降到失败批次的 3/4，调用方把失败的批次对半拆开重试。
+"""
+from typing import Callable, Deque, List, TypeVar
+
+
+T = TypeVar('T')
+
+# 粗略估算：英文平均每个 token 约 4 个字符
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class AdaptiveBatcher:
+    """
+    自适应批大小
+
+    - initial_size / min_size / max_size: 每批条目数的初值与上下限
+    - input_budget / output_budget: 每批输入、输出 token 的预算
+    - output_tokens_per_item: 每条输出 token 数的初始估计，之后按实际结果滑动平均
+    - increase: 满批成功后批大小增加的条目数
+    """
+
+    def __init__(
+        self,
+        initial_size: int = 100,
+        min_size: int = 1,
+        max_size: int = 500,
+        input_budget: int = 100_000,
+        output_budget: int = 6_500,
+        output_tokens_per_item: float = 60.0,
+        increase: int = 10,
+    ):
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.input_budget = input_budget
+        self.output_budget = output_budget
+        self.output_tokens_per_item = output_tokens_per_item
+        self.increase = increase
+        self.successes = 0
+        self.truncations = 0
+
+    def capacity(self) -> int:
+        """当前一批最多装多少条（批大小与输出预算两者取小）"""
+        by_output = int(self.output_budget // max(self.output_tokens_per_item, 1.0))
+        return max(self.min_size, min(self.size, by_output))
+
+    def take(self, pending: Deque[T], input_tokens: Callable[[T], int]) -> List[T]:
+        """从 pending 左侧取出下一批，至少取一条"""
+        limit = self.capacity()
+        batch: List[T] = []
+        used = 0
+        while pending and len(batch) < limit:
+            cost = input_tokens(pending[0])
+            if batch and used + cost > self.input_budget:
+                break
+            batch.append(pending.popleft())
+            used += cost
+        return batch
+
+    def record_success(self, batch_size: int, output_tokens: int):
+        """一批成功返回：更新每条输出 token 的估计，满批时增大批大小"""
+        self.successes += 1
+        if batch_size > 0:
+            observed = output_tokens / batch_size
+            self.output_tokens_per_item = 0.7 * self.output_tokens_per_item + 0.3 * observed
+        if batch_size >= self.size:
+            self.size = min(self.max_size, self.size + self.increase)
+
+    def record_truncated(self, batch_size: int):
+        """一批的输出被截断：批大小降到失败批次的 3/4"""
+        self.truncations += 1
+        self.size = max(self.min_size, min(self.size, batch_size * 3 // 4))
+
+
+def bisect(batch: List[T]) -> List[List[T]]:
+    """把失败的批次对半拆开；只剩一条时无法再拆，返回空列表"""
+    if len(batch) <= 1:
+        return []
+    middle = len(batch) // 2
+    return [batch[:middle], batch[middle:]]
+
@@ -0,0 +1,106 @@
+"""
+Prompt 分类结果的持久化缓存
+
+每条 prompt 的分类以 (prompt 内容哈希, prompt.md 哈希, 模型名, temperature) 为键保存在 SQLite 中：
+内容、分类标准或模型参数任一变化都会使缓存失效，否则同一条 prompt 不会再次发给 Gemini。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+
+# 单条 SQL 中 IN (...) 参数的最大个数
+_MAX_SQL_PARAMS = 500
+
+
+def content_hash(text: str) -> str:
+    """缓存键中的内容哈希：文本的 SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    """
+    分类缓存
+
+    写入攒够 batch_size 条后提交一次，flush() / close() 提交剩余写入；
+    读写经过同一把锁，可在并发分类的工作线程中调用。
+    """
+
+    def __init__(self, db_file: str, prompt_hash: str, model_name: str, temperature: float,
+                 batch_size: int = 100):
+        self.db_file = db_file
+        self.prompt_hash = prompt_hash
+        self.model_name = model_name
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS classification_cache (
+                content_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                categories TEXT NOT NULL,
+                created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, prompt_hash, model_name, temperature)
+            )
+        ''')
+        self._conn.commit()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, List[str]]:
+        """按内容哈希批量查询，返回 {内容哈希: 分类列表}，未缓存的不在结果中"""
+        hashes = list(dict.fromkeys(hashes))
+        found: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(hashes), _MAX_SQL_PARAMS):
+                chunk = hashes[start:start + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT content_hash, categories FROM classification_cache '
+                    f'WHERE prompt_hash = ? AND model_name = ? AND temperature = ? '
+                    f'AND content_hash IN ({placeholders})',
+                    (self.prompt_hash, self.model_name, self.temperature, *chunk)
+                ).fetchall()
+                for digest, categories in rows:
+                    found[digest] = json.loads(categories)
+        return found
+
+    def put_many(self, entries: Dict[str, List[str]]):
+        """写入 {内容哈希: 分类列表}，已有的键会被覆盖"""
+        with self._lock:
+            for digest, categories in entries.items():
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO classification_cache '
+                    '(content_hash, prompt_hash, model_name, temperature, categories) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (digest, self.prompt_hash, self.model_name, self.temperature,
+                     json.dumps(categories, ensure_ascii=False))
+                )
+                self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """提交所有尚未提交的写入"""
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        """提交剩余写入并关闭连接"""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -3,22 +3,113 @@
 """
 import json
 import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
-import google.generativeai as genai
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from dynamic_image import PROJECT_ROOT
+from dynamic_image.batching import AdaptiveBatcher, bisect, estimate_tokens
+from dynamic_image.classification_cache import ClassificationCache, content_hash
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.fake_gemini import FakeGemini
+from dynamic_image.gemini_classifier import GeminiClassifier, new_prompt_strategy
+from dynamic_image.keyword_classifier import KeywordClassifier
+from dynamic_image.metrics import Metrics, write_report
+from dynamic_image.near_duplicate import DEFAULT_MAX_DISTANCE, NearDuplicateIndex
+from dynamic_image.rate_limit import CircuitOpenError, RateController
+from dynamic_image.source_reader import PromptRecord
+from dynamic_image.source_snapshot import load_prompt_records
+
+if TYPE_CHECKING:
+    from dynamic_image.tfidf_classifier import TfidfModel
+
 
 # 配置文件路径
-PROJECT_ROOT = Path(__file__).parent.parent.parent
 PROMPT_FILE = PROJECT_ROOT / "prompt.md"
 SOURCE_JSON = PROJECT_ROOT / "images" / "source.json"
 RESULT_DIR = PROJECT_ROOT / "result"
+CACHE_DB = RESULT_DIR / "classification_cache.db"
+# 离线 TF-IDF 模型文件（与 tfidf_classifier.MODEL_FILE 相同）
+TFIDF_MODEL_FILE = RESULT_DIR / "tfidf_model.npz"
+# 下载器使用的数据库，分类结果合并进其中的 item / item_category 表
+DOWNLOAD_DB = PROJECT_ROOT / "video_download.db"
+# 每次运行的指标：JSON 汇总与 Prometheus textfile
+METRICS_DIR = RESULT_DIR / "metrics"
 
 # 加载 .env 文件
 load_dotenv(PROJECT_ROOT / ".env")
 
+# 每批处理的数据量（初始值，运行中按 token 预算和截断情况自动调整）
+BATCH_SIZE = 100
+MAX_BATCH_SIZE = 500
+# 单次请求的输出 token 上限；装批时只用其中 80%，留出余量
+MAX_OUTPUT_TOKENS = 8192
+# 单批输入 token 预算（不含 prompt.md）
+INPUT_TOKEN_BUDGET = 100_000
+# 分类使用的模型与 temperature（两者都是分类缓存键的一部分）
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+GEMINI_TEMPERATURE = 0.1
+# prompt.md 的交付方式："system_instruction"（模型创建时交付一次）或 "context_cache"（Gemini 显式上下文缓存，
+# 要求 prompt 达到模型的最小缓存长度，否则自动退回 system_instruction）
+PROMPT_DELIVERY = "system_instruction"
+# 增量模式：只把缓存中没有的 prompt 发给 Gemini；关闭时全部重新分类并刷新缓存
+INCREMENTAL = True
+# 流式读取源数据时，每次做本地分类和缓存查询的条目数
+LOOKUP_CHUNK_SIZE = 500
+# 本地关键词预分类：关键词能明确判断的 prompt 不再发给 Gemini
+LOCAL_PRECLASSIFY = True
+# 离线 TF-IDF 模型（python src/dynamic_image/tfidf_classifier.py 训练）：存在时先用它给缓存未命中的 prompt 打分
+USE_TFIDF_MODEL = True
+# 近似重复检测：SimHash 指纹汉明距离不超过该值的 prompt 复用同组已有的分类，设为 None 关闭
+NEAR_DUPLICATE_DISTANCE: Optional[int] = DEFAULT_MAX_DISTANCE
+# 紧凑协议：输入用批内序号代替 UUID，输出只返回 {序号: [分类代码]}，大幅减少 token
+COMPACT_PROTOCOL = True
+
+# prompt.md 中定义的全部分类（含 "未分类"），紧凑协议按顺序用 A、B、C... 作为代码
+CATEGORIES = [
+    "日漫风格", "奇幻，异世界风格", "科幻风格", "赛博朋克风格", "复古风格", "北欧风格",
+    "美女", "帅哥", "动物萌宠", "情侣", "未分类",
+]
+CATEGORY_CODES = {chr(ord('A') + i): name for i, name in enumerate(CATEGORIES)}
+# 同时进行中的 Gemini 请求数上限
+GEMINI_MAX_IN_FLIGHT = 4
+# 每分钟请求数预算（免费额度的 flash 模型为 15 RPM）
+GEMINI_RPM = 15
+
+# Gemini 限流：按 RPM 预算发请求，429/5xx 时降速并退避重试，恢复后逐步回到预算
+GEMINI_HOST = "generativelanguage.googleapis.com"
+GEMINI_MAX_RETRIES = 3
+# 需要退避重试的状态码；Gemini 的 403 是 API key 无效或无权限（PermissionDenied），不是防爬拦截
+GEMINI_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# 不可重试的状态码（请求无效、API key 无效或无权限、模型不存在）：拆批重试也没有用，直接中止本次分类
+GEMINI_FATAL_STATUS = frozenset({400, 401, 403, 404})
+gemini_limiter = RateController(
+    initial_rate=GEMINI_RPM / 60,
+    min_rate=0.05,
+    max_rate=GEMINI_RPM / 60,
+    burst=GEMINI_MAX_IN_FLIGHT,
+    increase=0.05,
+    retryable_status=GEMINI_RETRYABLE_STATUS,
+)
+
+keyword_classifier = KeywordClassifier()
+
+# 本次运行的分阶段耗时与计数
+metrics = Metrics("classify")
+
+# 设置 GEMINI_FAKE=1 时使用本地替身，离线调试并发与限流；
+# 否则在 init_gemini_api() 时才导入 google.generativeai（导入本身约需 1 秒）
+genai_backend = FakeGemini() if os.getenv("GEMINI_FAKE") else None
+
+# 并发批次共用一个调试文件，写入时加锁
+_debug_lock = threading.Lock()
+
 
 def load_classification_prompt() -> str:
     """加载分类提示词"""
@@ -35,19 +126,37 @@ def load_classification_prompt() -> str:
         raise
 
 
-def load_source_data() -> List[Dict]:
-    """加载源数据 JSON"""
-    try:
-        with open(SOURCE_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        print(f"✅ 成功加载源数据: {len(data)} 条记录")
-        return data
-    except FileNotFoundError:
-        print(f"❌ 找不到源数据文件: {SOURCE_JSON}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON 解析错误: {e}")
-        raise
+def load_source_data(path: Path = SOURCE_JSON) -> Iterator[PromptRecord]:
+    """加载源数据（JSON 数组或 JSONL），逐条产出 PromptRecord；源文件未变化时直接读取快照"""
+    if not Path(path).exists():
+        print(f"❌ 找不到源数据文件: {path}")
+        raise FileNotFoundError(path)
+    print(f"✅ 开始读取源数据: {path}")
+    return load_prompt_records(path)
+
+
+def load_local_model() -> Optional["TfidfModel"]:
+    """USE_TFIDF_MODEL 打开时加载离线 TF-IDF 模型；tfidf_classifier（及 NumPy）只在这里导入"""
+    if not USE_TFIDF_MODEL:
+        return None
+    from dynamic_image.tfidf_classifier import load_model
+    return load_model(TFIDF_MODEL_FILE)
+
+
+def extract_content(item) -> Optional[str]:
+    """
+    取出条目的 prompt 文本，没有时返回 None
+
+    支持 PromptRecord、精简记录 {id, content} 和原始记录 (prompt.decodedPrompt[0].content)。
+    """
+    if isinstance(item, PromptRecord):
+        return item.content
+    if 'content' in item:
+        return item['content']
+    decoded_prompts = item.get('prompt', {}).get('decodedPrompt', [])
+    if decoded_prompts:
+        return decoded_prompts[0].get('content', '')
+    return None
 
 
 def prepare_input_for_gemini(data: List[Dict]) -> str:
@@ -56,11 +165,9 @@ def prepare_input_for_gemini(data: List[Dict]) -> str:
     
     for item in data:
         video_id = item.get('id')
-        prompt_obj = item.get('prompt', {})
-        decoded_prompts = prompt_obj.get('decodedPrompt', [])
+        content = extract_content(item)
         
-        if decoded_prompts and len(decoded_prompts) > 0:
-            content = decoded_prompts[0].get('content', '')
+        if content is not None:
             simplified_data.append({
                 "id": video_id,
                 "prompt": {
@@ -73,8 +180,63 @@ def prepare_input_for_gemini(data: List[Dict]) -> str:
     return json.dumps(simplified_data, ensure_ascii=False, indent=2)
 
 
+def prepare_compact_input(data: List[Dict]) -> str:
+    """紧凑协议的输入：[[批内序号, 内容], ...]，无缩进、无多余空白"""
+    rows = [[index, extract_content(item) or ''] for index, item in enumerate(data)]
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
+
+
+def compact_instructions() -> str:
+    """附加在 prompt.md 之后的紧凑协议说明，覆盖其中的输入结构与输出格式"""
+    codes = "\n".join(f"- {code}: {name}" for code, name in CATEGORY_CODES.items())
+    return f"""
+
+# Compact Protocol (紧凑协议，优先于上面的 Input Data Structure 与 Output Format)
+输入是一个 JSON 列表，每个元素为 [序号, content]。
+分类代码：
+{codes}
+请输出一个 JSON 对象：键是序号（字符串），值是该条目所属分类代码的列表，例如 {{"0":["A","G"],"1":["K"]}}。
+每个序号都必须出现，不要输出 id、content 或任何其他文字。
+"""
+
+
+class MalformedResponseError(ValueError):
+    """Gemini 的返回能解析为 JSON，但结构不符合协议（通常是输出被截断或格式跑偏），拆小批次重试"""
+
+
+def expand_compact_result(response: Dict, data: List[Dict]) -> Dict:
+    """
+    把紧凑协议的 {序号: [分类代码]} 还原成 {分类: [{id, content}]}，忽略无效的分类代码
+
+    序号不是 0 到批次长度 - 1 之间的整数时说明输出跑偏，抛出 MalformedResponseError
+    （负数序号若按 Python 下标处理会把分类记到批次末尾的条目上）。
+    """
+    if not isinstance(response, dict):
+        raise MalformedResponseError("紧凑协议的返回不是 JSON 对象")
+    result: Dict[str, List[Dict]] = {}
+    for key, codes in response.items():
+        try:
+            index = int(key)
+        except ValueError:
+            raise MalformedResponseError(f"紧凑协议的序号无效: {key!r}") from None
+        if not 0 <= index < len(data):
+            raise MalformedResponseError(f"紧凑协议的序号超出范围: {key!r}")
+        item = data[index]
+        content = extract_content(item) or ''
+        for code in codes if isinstance(codes, list) else [codes]:
+            category = CATEGORY_CODES.get(code)
+            if category:
+                result.setdefault(category, []).append({"id": item.get('id'), "content": content[:50]})
+    return result
+
+
 def init_gemini_api(api_key: str = None):
     """初始化 Gemini API"""
+    global genai_backend
+    if isinstance(genai_backend, FakeGemini):
+        print("✅ 使用本地 Gemini 替身 (GEMINI_FAKE)")
+        return
+
     if api_key is None:
         api_key = os.getenv("GEMINI_API_KEY")
         if api_key is None:
@@ -83,35 +245,37 @@ def init_gemini_api(api_key: str = None):
                 "例如: export GEMINI_API_KEY='your-api-key'"
             )
     
-    genai.configure(api_key=api_key)
+    if genai_backend is None:
+        import google.generativeai as genai
+        genai_backend = genai
+    genai_backend.configure(api_key=api_key)
     print(f"✅ Gemini API 初始化完成")
 
 
-def classify_with_gemini(
-    classification_prompt: str,
-    input_data: str,
-    model_name: str = "gemini-2.0-flash-exp",
-    temperature: float = 0.1
-) -> Dict:
-    """使用 Gemini 模型进行分类"""
-    
-    print(f"🤖 使用模型: {model_name}")
-    print(f"📊 输入数据长度: {len(input_data)} 字符")
-    
-    # 创建模型实例
-    model = genai.GenerativeModel(
-        model_name=model_name,
+def new_classifier(classification_prompt: str, model_name: str = GEMINI_MODEL,
+                   temperature: float = GEMINI_TEMPERATURE) -> GeminiClassifier:
+    """创建本次分类共用的模型，prompt.md（含协议说明）作为静态部分只交付一次"""
+    classifier = GeminiClassifier(
+        genai_backend,
+        classification_prompt,
+        model_name,
         generation_config={
             "temperature": temperature,
-            "max_output_tokens": 8192,
+            "max_output_tokens": MAX_OUTPUT_TOKENS,
             "response_mime_type": "application/json"
-        }
+        },
+        prompt_strategy=new_prompt_strategy(PROMPT_DELIVERY),
     )
-    
-    # 构建完整的提示词
-    full_prompt = f"""
-{classification_prompt}
+    print(f"🤖 使用模型: {model_name}（分类标准通过 {classifier.strategy.name} 交付）")
+    return classifier
 
+
+def classify_with_gemini(classifier: GeminiClassifier, input_data: str) -> Dict:
+    """使用 Gemini 模型进行分类（分类标准已在 classifier 中，请求只包含本批输入）"""
+    
+    print(f"📊 输入数据长度: {len(input_data)} 字符")
+    
+    contents = f"""
 # Input Data (输入数据)
 请分析以下 JSON 数据并按照上述标准进行分类：
 
@@ -127,13 +291,11 @@ def classify_with_gemini(
     
     try:
         # 调用模型
-        response = model.generate_content(full_prompt)
+        with metrics.timer("api"):
+            result_text = classifier.generate(contents)
         
         print("✅ Gemini 模型返回成功")
         
-        # 获取返回文本
-        result_text = response.text
-        
         # 清理可能的 markdown 代码块标记
         result_text = result_text.strip()
         if result_text.startswith("```json"):
@@ -147,13 +309,14 @@ def classify_with_gemini(
         # 保存原始返回（用于调试）
         RESULT_DIR.mkdir(exist_ok=True)
         debug_file = RESULT_DIR / "debug_response.txt"
-        with open(debug_file, 'w', encoding='utf-8') as f:
+        with _debug_lock, open(debug_file, 'w', encoding='utf-8') as f:
             f.write(result_text)
         print(f"📝 原始返回已保存到: {debug_file}")
         
         # 解析 JSON
         try:
-            result_json = json.loads(result_text)
+            with metrics.timer("parse"):
+                result_json = json.loads(result_text)
         except json.JSONDecodeError as e:
             print(f"❌ JSON 解析错误: {e}")
             print(f"📄 返回内容长度: {len(result_text)} 字符")
@@ -171,17 +334,348 @@ def classify_with_gemini(
         raise
 
 
-def merge_classification_results(results: List[Dict]) -> Dict:
-    """合并多个分类结果"""
-    merged = {}
-    
-    for result in results:
-        for category, items in result.items():
-            if category not in merged:
-                merged[category] = []
-            merged[category].extend(items)
-    
-    return merged
+def _error_status(error: Exception) -> Optional[int]:
+    """从 Gemini SDK 抛出的异常中取出 HTTP 状态码（google.api_core 异常带有 code 属性）"""
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def classify_with_retry(classifier: GeminiClassifier, input_data: str) -> Dict:
+    """经过限流器调用 classify_with_gemini，遇到 429/5xx 时按退避时间重试，GEMINI_FATAL_STATUS 直接抛出"""
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        gemini_limiter.acquire(GEMINI_HOST)
+        metrics.inc("gemini_requests")
+        try:
+            result = classify_with_gemini(classifier, input_data)
+        except Exception as e:
+            status = _error_status(e)
+            metrics.inc("gemini_errors", status=status or "exception")
+            # 不可重试的错误不反馈给限流器（否则会被当作成功而提速）
+            delay = gemini_limiter.record(GEMINI_HOST, status) if status and status not in GEMINI_FATAL_STATUS else None
+            if delay is None or attempt == GEMINI_MAX_RETRIES:
+                raise
+            metrics.inc("gemini_retries")
+            print(f"   ⏳ Gemini 返回 {status}，{delay:.1f} 秒后重试 ({attempt + 1}/{GEMINI_MAX_RETRIES})")
+            time.sleep(delay)
+        else:
+            gemini_limiter.record(GEMINI_HOST, 200)
+            return result
+
+
+def new_batcher(compact: bool = COMPACT_PROTOCOL) -> AdaptiveBatcher:
+    """按配置创建自适应分批器（紧凑协议下每条输出的 token 少得多）"""
+    return AdaptiveBatcher(
+        initial_size=BATCH_SIZE,
+        max_size=MAX_BATCH_SIZE,
+        input_budget=INPUT_TOKEN_BUDGET,
+        output_budget=int(MAX_OUTPUT_TOKENS * 0.8),
+        output_tokens_per_item=8.0 if compact else 60.0,
+    )
+
+
+def _input_tokens(item: Dict) -> int:
+    """单条数据在输入中占用的 token 估计（内容 + id 与 JSON 结构）"""
+    return estimate_tokens(extract_content(item) or '') + 30
+
+
+def classify_items(
+    classification_prompt: str,
+    items: Iterable[Dict],
+    batcher: Optional[AdaptiveBatcher] = None,
+    max_in_flight: int = GEMINI_MAX_IN_FLIGHT,
+    on_result: Optional[Callable[[List[Dict], Dict], None]] = None,
+    compact: bool = COMPACT_PROTOCOL,
+) -> List[Dict]:
+    """
+    自适应分批并发分类，返回最终未能分类的条目
+
+    items 可以是生成器：只在装批时按需读取，内存中最多保留一个最大批次的待分类条目。
+    批大小由 batcher 按 token 预算决定；输出被截断或无法解析的批次对半拆开后优先重试，
+    返回结果中漏掉的条目重新排队一次，所以单个批次的输出出错不会丢掉整批数据。
+    重试用尽的其他错误（限流、网络等）只放弃该批次；GEMINI_FATAL_STATUS 中的错误（API key 无效等）
+    每个批次都会遇到，直接抛出，中止本次分类。
+    compact 为 True 时使用紧凑协议收发，结果仍还原为 {分类: [{id, content}]}。
+    on_result(批次, 结果) 在每个批次成功后立即调用（在调用方线程中）。
+    """
+    batcher = batcher or new_batcher(compact)
+    source = iter(items)
+    pending: Deque[Dict] = deque()
+    retry: Deque[List[Dict]] = deque()
+    requeued = set()
+    lost: List[Dict] = []
+
+    if compact:
+        classification_prompt += compact_instructions()
+    classifier = new_classifier(classification_prompt)
+
+    def run(batch: List[Dict]):
+        """返回 (还原后的结果, 原始输出的 token 估计)"""
+        if not compact:
+            with metrics.timer("serialize"):
+                input_data = prepare_input_for_gemini(batch)
+            result = classify_with_retry(classifier, input_data)
+            if not isinstance(result, dict) or not all(isinstance(v, list) for v in result.values()):
+                raise MalformedResponseError("返回不是 {分类: [条目]} 格式的 JSON 对象")
+            return result, estimate_tokens(json.dumps(result, ensure_ascii=False))
+        with metrics.timer("serialize"):
+            input_data = prepare_compact_input(batch)
+        response = classify_with_retry(classifier, input_data)
+        with metrics.timer("parse"):
+            output_tokens = estimate_tokens(json.dumps(response, ensure_ascii=False, separators=(',', ':')))
+            return expand_compact_result(response, batch), output_tokens
+
+    with classifier, ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        running = {}
+        while True:
+            while len(running) < max_in_flight:
+                if retry:
+                    batch = retry.popleft()
+                else:
+                    # 待分类条目不足一个最大批次时从 items 补充
+                    pending.extend(islice(source, max(0, batcher.max_size - len(pending))))
+                    if not pending:
+                        break
+                    batch = batcher.take(pending, _input_tokens)
+                running[executor.submit(run, batch)] = batch
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = running.pop(future)
+                try:
+                    result, output_tokens = future.result()
+                except CircuitOpenError as e:
+                    print(f"   🛑 {len(batch)} 条数据跳过: {e}")
+                    lost.extend(batch)
+                    continue
+                except (json.JSONDecodeError, MalformedResponseError) as e:
+                    batcher.record_truncated(len(batch))
+                    halves = bisect(batch)
+                    if halves:
+                        print(f"   ✂️  {len(batch)} 条的批次输出无效，拆成 "
+                              f"{len(halves[0])} + {len(halves[1])} 条重试 (批大小降到 {batcher.size})")
+                        retry.extend(halves)
+                    else:
+                        print(f"   ❌ {batch[0].get('id')} 分类失败: {e}")
+                        lost.extend(batch)
+                    continue
+                except Exception as e:
+                    if _error_status(e) in GEMINI_FATAL_STATUS:
+                        print(f"   🛑 Gemini 返回 {_error_status(e)}，无法重试，中止本次分类: {e}")
+                        raise
+                    print(f"   ❌ {len(batch)} 条数据分类失败: {e}")
+                    lost.extend(batch)
+                    continue
+
+                batcher.record_success(len(batch), output_tokens)
+                if on_result is not None:
+                    on_result(batch, result)
+
+                # Gemini 漏掉的条目重新排队一次，仍然漏掉就放弃
+                classified = invert_result(result)
+                missing = [item for item in batch if item.get('id') not in classified]
+                again = [item for item in missing if item.get('id') not in requeued]
+                requeued.update(item.get('id') for item in again)
+                lost.extend(item for item in missing if item not in again)
+                if again:
+                    retry.append(again)
+
+                print(f"   ✅ {len(batch) - len(missing)}/{len(batch)} 条完成 "
+                      f"(批大小 {batcher.size}, 当前速率 {gemini_limiter.current_rate(GEMINI_HOST) * 60:.1f} 请求/分钟)")
+
+    print(f"📦 成功 {batcher.successes} 批，截断 {batcher.truncations} 批，最终批大小 {batcher.size}")
+    print(f"📈 {classifier.summary()}")
+    record_token_usage(classifier)
+    metrics.inc("batches", batcher.successes, result="success")
+    metrics.inc("batches", batcher.truncations, result="truncated")
+    return lost
+
+
+def record_token_usage(classifier: GeminiClassifier):
+    """把本次调用的 token 用量计入运行指标"""
+    metrics.inc("gemini_tokens", classifier.prompt_tokens, kind="input")
+    metrics.inc("gemini_tokens", classifier.cached_tokens, kind="cached")
+    metrics.inc("gemini_tokens", classifier.output_tokens, kind="output")
+
+
+def invert_result(result: Dict) -> Dict[str, List[str]]:
+    """把 {分类: [{id, content}]} 转成 {id: [分类, ...]}"""
+    categories_by_id: Dict[str, List[str]] = {}
+    for category, items in result.items():
+        for item in items:
+            video_id = item.get('id') if isinstance(item, dict) else None
+            if video_id:
+                categories = categories_by_id.setdefault(video_id, [])
+                if category not in categories:
+                    categories.append(category)
+    return categories_by_id
+
+
+def build_result_from_cache(
+    order: Iterable[Tuple[str, str]],
+    snippets: Dict[str, str],
+    categories_by_hash: Dict[str, List[str]],
+) -> Dict:
+    """
+    按源数据顺序重建完整的 {分类: [{id, content}]} 结果
+
+    order 为 [(id, 内容哈希)]，snippets 为 {内容哈希: 内容前 50 字符}。
+    """
+    result: Dict[str, List[Dict]] = {}
+    for video_id, digest in order:
+        for category in categories_by_hash.get(digest, []):
+            result.setdefault(category, []).append({"id": video_id, "content": snippets[digest]})
+    return result
+
+
+def classify_incrementally(
+    classification_prompt: str,
+    records: Iterable[PromptRecord],
+    cache: ClassificationCache,
+    incremental: bool = INCREMENTAL,
+    preclassify: bool = LOCAL_PRECLASSIFY,
+    local_model: Optional["TfidfModel"] = None,
+    near_duplicates: Optional[NearDuplicateIndex] = None,
+    on_classified: Optional[Callable[[List[Tuple[str, str, List[str]]]], None]] = None,
+) -> Dict:
+    """
+    只把本地规则无法判断、且缓存中没有的 prompt 分批发给 Gemini，再重建全部数据的分类结果
+
+    records 可以是流式读取的生成器，整个过程只遍历一次：逐块做本地分类和缓存查询，
+    需要 Gemini 的条目直接流入分批；每条记录只保留 id、内容哈希和 50 字符摘要用于重建结果。
+    内容相同的 prompt 只发送一次；每个批次完成后立即写入缓存，中途失败也不会丢失已完成的批次。
+    提供 near_duplicates 时每条记录都加入该索引；缓存未命中、且与之前的 prompt 近似重复的条目
+    不再单独分类，复用同组代表的分类。
+    缓存未命中的条目若提供了 local_model（离线 TF-IDF 模型），整块一次打分，有把握的直接采用。
+    本地规则和模型的结果每次重新计算，不写缓存；Gemini 漏掉的条目不写缓存，下次运行会重新发送。
+
+    on_classified([(id, 完整内容, 分类列表)]) 在条目确定分类后立即调用（在调用方线程中）：
+    本地规则、缓存和模型的结果每读完一块调用一次，Gemini 的结果每个批次调用一次，
+    近似重复的条目在最后调用。它阻塞时读取与分批也随之暂停，可用来对下游施加背压。
+    """
+    order: List[Tuple[str, str]] = []
+    snippets: Dict[str, str] = {}
+    categories_by_hash: Dict[str, List[str]] = {}
+    stats = {"local": 0, "cached": 0, "near_duplicate": 0, "model": 0, "gemini": 0}
+    # 近似重复：{代表的 id: 代表的内容哈希}，{重复条目的内容哈希: 代表的内容哈希}
+    representative_digests: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    # 尚未通知 on_classified 的条目：{内容哈希: [(id, 内容)]}
+    waiting: Dict[str, List[Tuple[str, str]]] = {}
+
+    def release(digests: Iterable[str]):
+        """把已确定分类的条目交给 on_classified"""
+        ready = [
+            (item_id, content, categories_by_hash[digest])
+            for digest in digests if digest in categories_by_hash
+            for item_id, content in waiting.pop(digest, ())
+        ]
+        if ready:
+            on_classified(ready)
+
+    def pending_items() -> Iterator[Dict]:
+        """逐块读取 records，只产出需要 Gemini 分类的条目"""
+        source = iter(records)
+        while True:
+            with metrics.timer("load"):
+                chunk = list(islice(source, LOOKUP_CHUNK_SIZE))
+            if not chunk:
+                return
+            fresh: Dict[str, Dict] = {}
+            representatives: Dict[str, str] = {}
+            for item in chunk:
+                content = extract_content(item)
+                if content is None:
+                    continue
+                item_id = item.id if isinstance(item, PromptRecord) else item.get('id')
+                digest = content_hash(content)
+                order.append((item_id, digest))
+                if on_classified is not None:
+                    waiting.setdefault(digest, []).append((item_id, content))
+                if near_duplicates is not None:
+                    representative = near_duplicates.add(item_id, content)
+                    if representative is None:
+                        representative_digests[item_id] = digest
+                    elif digest not in snippets:
+                        representatives[digest] = representative_digests[representative]
+                if digest in snippets:
+                    continue
+                snippets[digest] = content[:50]
+                fresh[digest] = {"id": item_id, "content": content}
+
+            # 缓存中的 Gemini 结果优先；关键词规则只处理缓存未命中的内容
+            if incremental and fresh:
+                cached = cache.get_many(fresh)
+                categories_by_hash.update(cached)
+                stats["cached"] += len(cached)
+            if preclassify:
+                for digest in [d for d in fresh if d not in categories_by_hash]:
+                    categories = keyword_classifier.classify(fresh[digest]["content"])
+                    if categories is not None:
+                        categories_by_hash[digest] = categories
+                        stats["local"] += 1
+                        del fresh[digest]
+            for digest, representative in representatives.items():
+                if digest in fresh and digest not in categories_by_hash:
+                    aliases[digest] = representative
+                    stats["near_duplicate"] += 1
+                    del fresh[digest]
+            if local_model is not None:
+                unresolved = [d for d in fresh if d not in categories_by_hash]
+                predictions = local_model.predict([fresh[d]["content"] for d in unresolved])
+                for digest, categories in zip(unresolved, predictions):
+                    if categories is not None:
+                        categories_by_hash[digest] = categories
+                        stats["model"] += 1
+            if on_classified is not None:
+                release(list(waiting))
+            for digest, item in fresh.items():
+                if digest not in categories_by_hash:
+                    stats["gemini"] += 1
+                    yield item
+
+    def store_batch(batch: List[Dict], result: Dict):
+        categories_by_id = invert_result(result)
+        entries = {
+            content_hash(extract_content(item)): categories_by_id[item['id']]
+            for item in batch if item.get('id') in categories_by_id
+        }
+        cache.put_many(entries)
+        categories_by_hash.update(entries)
+        if on_classified is not None:
+            release(entries)
+
+    print(f"   初始每批 {BATCH_SIZE} 条（按 token 预算自动调整），最多 {GEMINI_MAX_IN_FLIGHT} 批同时进行，"
+          f"预算 {GEMINI_RPM} 请求/分钟")
+    lost = classify_items(classification_prompt, pending_items(), on_result=store_batch)
+    cache.flush()
+    for digest, representative in aliases.items():
+        if representative in categories_by_hash:
+            categories_by_hash[digest] = categories_by_hash[representative]
+    if on_classified is not None:
+        release(list(waiting))
+
+    total = len(snippets)
+    print(f"✅ 共 {len(order)} 条数据，{total} 条不同的 prompt")
+    if preclassify:
+        print(f"🏠 本地关键词规则分类 {stats['local']}/{total} 条 "
+              f"({stats['local'] / max(total, 1):.0%})，这部分不调用 Gemini")
+    if incremental:
+        print(f"✅ 缓存命中 {stats['cached']} 条")
+    if near_duplicates is not None:
+        print(f"🔁 近似重复 {stats['near_duplicate']} 条复用同组已有的分类")
+    if local_model is not None:
+        print(f"🧮 本地 TF-IDF 模型分类 {stats['model']}/{total} 条 "
+              f"({stats['model'] / max(total, 1):.0%})，这部分不调用 Gemini")
+    print(f"🤖 Gemini 分类 {stats['gemini']} 条")
+    if lost:
+        print(f"⚠️  {len(lost)} 条数据未能分类，下次运行会重试")
+    for source, count in stats.items():
+        metrics.inc("items", count, source=source)
+    metrics.inc("items", len(lost), source="lost")
+    with metrics.timer("merge"):
+        return build_result_from_cache(order, snippets, categories_by_hash)
 
 
 def save_result(result: Dict, filename: str = None):
@@ -222,9 +716,6 @@ def main():
     print("🎨 Midjourney Prompt 智能分类系统 (Powered by Gemini)")
     print("=" * 80)
     
-    # 配置批处理参数
-    BATCH_SIZE = 100  # 每批处理的数据量
-    
     try:
         # 1. 初始化 Gemini API
         print("\n🔑 步骤 1: 初始化 Gemini API")
@@ -233,61 +724,48 @@ def main():
         
         # 2. 加载分类提示词
         print("\n📖 步骤 2: 加载分类提示词")
-        classification_prompt = load_classification_prompt()
+        with metrics.timer("load"):
+            classification_prompt = load_classification_prompt()
         
         # 3. 加载源数据
         print("\n📂 步骤 3: 加载源数据")
         source_data = load_source_data()
-        total_items = len(source_data)
         
-        # 4. 分批处理
-        print(f"\n🔧 步骤 4: 准备分批处理")
-        num_batches = (total_items + BATCH_SIZE - 1) // BATCH_SIZE
-        print(f"✅ 总共 {total_items} 条数据，将分为 {num_batches} 批处理")
-        print(f"   每批处理 {BATCH_SIZE} 条数据")
+        # 4. 查询分类缓存，只分类新增或变化的 prompt
+        print(f"\n🔧 步骤 4: 查询分类缓存 ({'增量模式' if INCREMENTAL else '全量刷新'})")
+        RESULT_DIR.mkdir(exist_ok=True)
+        cache = ClassificationCache(
+            str(CACHE_DB), content_hash(classification_prompt), GEMINI_MODEL, GEMINI_TEMPERATURE
+        )
         
-        # 5. 调用 Gemini 进行分类（分批）
+        # 5. 调用 Gemini 进行分类（并发分批，失败的批次不中断整个流程，下次运行会重试）
         print("\n🤖 步骤 5: 调用 Gemini 模型进行分类")
         print("=" * 80)
         
-        all_results = []
+        local_model = load_local_model()
+        near_duplicates = NearDuplicateIndex(NEAR_DUPLICATE_DISTANCE) if NEAR_DUPLICATE_DISTANCE is not None else None
+        with cache:
+            final_result = classify_incrementally(
+                classification_prompt, source_data, cache,
+                local_model=local_model, near_duplicates=near_duplicates,
+            )
         
-        for batch_idx in range(num_batches):
-            start_idx = batch_idx * BATCH_SIZE
-            end_idx = min(start_idx + BATCH_SIZE, total_items)
-            batch_data = source_data[start_idx:end_idx]
-            
-            print(f"\n📦 批次 {batch_idx + 1}/{num_batches}")
-            print(f"   处理第 {start_idx + 1} 到 {end_idx} 条数据 (共 {len(batch_data)} 条)")
-            
-            # 准备这一批的输入数据
-            input_data = prepare_input_for_gemini(batch_data)
-            
-            # 调用 Gemini
-            try:
-                batch_result = classify_with_gemini(classification_prompt, input_data)
-                all_results.append(batch_result)
-                print(f"   ✅ 批次 {batch_idx + 1} 完成")
-            except Exception as e:
-                print(f"   ❌ 批次 {batch_idx + 1} 失败: {e}")
-                print(f"   ⚠️  将继续处理下一批...")
-                # 添加一个空结果，避免中断整个流程
-                all_results.append({})
-            
-            # 批次之间稍作延迟，避免触发 API 限流
-            if batch_idx < num_batches - 1:
-                import time
-                print(f"   ⏳ 等待 2 秒后继续...")
-                time.sleep(2)
+        print(f"\n🚦 {gemini_limiter.summary()}")
         
-        # 6. 合并结果
-        print("\n🔗 步骤 6: 合并分类结果")
-        final_result = merge_classification_results(all_results)
-        print(f"✅ 已合并 {len(all_results)} 个批次的结果")
+        # 6. 保存结果
+        print("\n💾 步骤 6: 保存分类结果")
+        with metrics.timer("save"):
+            save_result(final_result)
         
-        # 7. 保存结果
-        print("\n💾 步骤 7: 保存分类结果")
-        save_result(final_result)
+        # 7. 合并进下载器的分类结果表
+        print("\n🗃️  步骤 7: 合并分类结果到数据库")
+        with metrics.timer("merge"), DownloadStore(str(DOWNLOAD_DB)) as store:
+            count = store.merge_classification(final_result)
+            if near_duplicates is not None:
+                store.mark_duplicates(near_duplicates.duplicates)
+        print(f"✅ 已合并 {count} 个视频的分类结果到 {DOWNLOAD_DB}")
+        if near_duplicates is not None:
+            print(f"🔁 标记近似重复视频 {len(near_duplicates.duplicates)} 个（下载器可跳过或延后）")
         
         print("\n" + "=" * 80)
         print("🎉 分类完成！")
@@ -299,6 +777,9 @@ def main():
         traceback.print_exc()
         return 1
     
+    finally:
+        write_report(metrics, METRICS_DIR)
+    
     return 0
 
 
@@ -0,0 +1,232 @@
+"""
+统一命令行入口：dynamic-image <子命令>
+
+    dynamic-image classify [--fake] [--full]             # 分类（classify_prompts.py）
+    dynamic-image download [--limit 5] [--category 美女=2]  # 下载一轮（download_vedio.py）
+    dynamic-image pipeline [--max-downloads 100]         # 边分类边下载（pipeline.py）
+    dynamic-image search 宗山塁 横山悠                     # 球员查询（search_player.py）
+    dynamic-image stats                                  # 分类与下载进度
+    dynamic-image scan [--rescan]                        # 扫描已下载视频的 MP4 元数据（mp4_index.py）
+    dynamic-image train-tfidf [--evaluate-only]          # 训练 / 评估本地 TF-IDF 模型（tfidf_classifier.py）
+    dynamic-image bench-imports                          # 各子命令的导入耗时
+
+各子命令的模块在执行时才导入：download / stats / search 不会导入 google.generativeai（约 1 秒），
+cron 定时跑 "dynamic-image download --limit 5" 这类短任务时启动只需几十毫秒。
+--root（或环境变量 DYNAMIC_IMAGE_ROOT）指定数据目录，下载相关的子命令在该目录下运行。
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import dynamic_image
+
+
+# 各子命令用到的模块（bench-imports 逐个测量导入耗时）
+COMMAND_MODULES = {
+    "classify": "dynamic_image.classify_prompts",
+    "download": "dynamic_image.download_vedio",
+    "pipeline": "dynamic_image.pipeline",
+    "search": "dynamic_image.search_player",
+    "stats": "dynamic_image.download_store",
+    "scan": "dynamic_image.mp4_index",
+    "train-tfidf": "dynamic_image.tfidf_classifier",
+}
+# bench-imports 每个模块测量的次数（取最小值）
+BENCH_REPEAT = 3
+
+
+def _set_root(root: Optional[str]):
+    """在导入子命令模块之前设置数据目录"""
+    if root:
+        path = Path(root).resolve()
+        os.environ["DYNAMIC_IMAGE_ROOT"] = str(path)
+        dynamic_image.PROJECT_ROOT = path
+
+
+def _enter_root():
+    """download_vedio 的路径相对于当前目录，下载相关的子命令切换到数据目录运行"""
+    os.chdir(dynamic_image.PROJECT_ROOT)
+
+
+def category_weight(value: str) -> Tuple[str, int]:
+    """解析 --category 参数："美女=2" -> ("美女", 2)，省略权重时为 1"""
+    name, _, weight = value.partition("=")
+    try:
+        return name.strip(), int(weight) if weight else 1
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"权重必须是整数: {value}") from None
+
+
+def cmd_classify(args) -> int:
+    if args.fake:
+        os.environ["GEMINI_FAKE"] = "1"
+    classify_prompts = importlib.import_module("dynamic_image.classify_prompts")
+    if args.full:
+        classify_prompts.INCREMENTAL = False
+    return classify_prompts.main()
+
+
+def cmd_download(args) -> int:
+    _enter_root()
+    download_vedio = importlib.import_module("dynamic_image.download_vedio")
+    if args.limit is not None:
+        download_vedio.BATCH_SIZE = args.limit
+    if args.category:
+        download_vedio.TARGET_CATEGORIES = dict(args.category)
+    if args.no_translate:
+        download_vedio.TRANSLATE_PROMPTS = False
+    return download_vedio.main()
+
+
+def cmd_pipeline(args) -> int:
+    _enter_root()
+    if args.fake:
+        os.environ["GEMINI_FAKE"] = "1"
+    pipeline = importlib.import_module("dynamic_image.pipeline")
+    if args.max_downloads is not None:
+        pipeline.PIPELINE_MAX_DOWNLOADS = args.max_downloads
+    if args.category:
+        pipeline.download_vedio.TARGET_CATEGORIES = dict(args.category)
+    return pipeline.main()
+
+
+def cmd_search(args) -> int:
+    search_player = importlib.import_module("dynamic_image.search_player")
+    argv = list(args.names)
+    if args.file:
+        argv += ["--file", args.file]
+    if args.no_cache:
+        argv.append("--no-cache")
+    return search_player.main(argv)
+
+
+def cmd_stats(args) -> int:
+    from dynamic_image.download_store import DownloadStore, SchemaOutdatedError
+
+    db_file = dynamic_image.PROJECT_ROOT / "video_download.db"
+    if not db_file.exists():
+        print(f"❌ 找不到数据库: {db_file}")
+        return 1
+    # 只读打开：查看统计不应迁移或改动数据库
+    try:
+        store = DownloadStore(str(db_file), read_only=True)
+    except SchemaOutdatedError as e:
+        print(f"❌ {e}，请先运行 dynamic-image download 或 classify")
+        return 1
+    with store:
+        counts = store.category_counts()
+        print(f"📊 分类结果中共 {store.count_items()} 个视频")
+        for category, (total, downloaded) in sorted(counts.items(), key=lambda kv: -kv[1][0]):
+            percent = downloaded / total * 100 if total else 100
+            print(f"   {category}: {downloaded}/{total} ({percent:.0f}%)")
+    return 0
+
+
+def cmd_scan(args) -> int:
+    _enter_root()
+    download_vedio = importlib.import_module("dynamic_image.download_vedio")
+    mp4_index = importlib.import_module("dynamic_image.mp4_index")
+    from dynamic_image.download_store import DownloadStore
+
+    with DownloadStore(download_vedio.DB_FILE) as store:
+        stats = mp4_index.scan_downloads(store, rescan=args.rescan, workers=args.workers)
+    print(f"✅ 扫描 {stats['scanned']} 个文件，不完整 {stats['incomplete']} 个")
+    return 0
+
+
+def cmd_train_tfidf(args) -> int:
+    tfidf_classifier = importlib.import_module("dynamic_image.tfidf_classifier")
+    return tfidf_classifier.main(save=not args.evaluate_only)
+
+
+def import_time(module: str, repeat: int = BENCH_REPEAT) -> float:
+    """在新的解释器中导入 module，返回 repeat 次中最短的耗时（毫秒）"""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; print((time.perf_counter() - started) * 1000)"
+    )
+    best = float("inf")
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", code],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        best = min(best, float(output.strip().splitlines()[-1]))
+    return best
+
+
+def cmd_bench_imports(args) -> int:
+    modules = dict(COMMAND_MODULES, cli="dynamic_image.cli")
+    if args.heavy:
+        modules.update({"(google.generativeai)": "google.generativeai",
+                        "(curl_cffi)": "curl_cffi", "(deep_translator)": "deep_translator"})
+    print(f"⏱️  导入耗时（新解释器，{args.repeat} 次取最小值）:")
+    for name, module in modules.items():
+        try:
+            print(f"   {name:<22} {import_time(module, args.repeat):8.1f} ms  ({module})")
+        except subprocess.CalledProcessError:
+            print(f"   {name:<22} {'导入失败':>8}     ({module})")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="dynamic-image", description="Midjourney 视频分类、下载与球员查询")
+    parser.add_argument("--version", action="version", version=dynamic_image.__version__)
+    parser.add_argument("--root", help="数据目录（默认取环境变量 DYNAMIC_IMAGE_ROOT，否则为仓库根目录）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    classify = commands.add_parser("classify", help="用 Gemini 分类全部 prompt")
+    classify.add_argument("--fake", action="store_true", help="使用本地 Gemini 替身")
+    classify.add_argument("--full", action="store_true", help="忽略分类缓存，全量重新分类")
+    classify.set_defaults(func=cmd_classify)
+
+    download = commands.add_parser("download", help="按权重下载一轮视频")
+    download.add_argument("--limit", type=int, help="本轮下载的视频数（默认 BATCH_SIZE）")
+    download.add_argument("--category", action="append", type=category_weight, metavar="分类[=权重]", help="目标分类，可重复")
+    download.add_argument("--no-translate", action="store_true", help="不翻译 Prompt")
+    download.set_defaults(func=cmd_download)
+
+    pipeline = commands.add_parser("pipeline", help="边分类边下载")
+    pipeline.add_argument("--fake", action="store_true", help="使用本地 Gemini 替身")
+    pipeline.add_argument("--max-downloads", type=int, help="本次最多下载的视频数")
+    pipeline.add_argument("--category", action="append", type=category_weight, metavar="分类[=权重]", help="目标分类，可重复")
+    pipeline.set_defaults(func=cmd_pipeline)
+
+    search = commands.add_parser("search", help="批量查询球员")
+    search.add_argument("names", nargs="*", help="球员名字")
+    search.add_argument("-f", "--file", help="名字列表文件，每行一个")
+    search.add_argument("--no-cache", action="store_true", help="不使用本地缓存和索引")
+    search.set_defaults(func=cmd_search)
+
+    stats = commands.add_parser("stats", help="显示各分类的下载进度")
+    stats.set_defaults(func=cmd_stats)
+
+    scan = commands.add_parser("scan", help="扫描已下载视频的时长、分辨率、编码与完整性")
+    scan.add_argument("--rescan", action="store_true", help="重新扫描已扫描过的文件")
+    scan.add_argument("--workers", type=int, help="进程数（默认 CPU 核数）")
+    scan.set_defaults(func=cmd_scan)
+
+    train = commands.add_parser("train-tfidf", help="用以往的 Gemini 分类结果训练本地 TF-IDF 模型")
+    train.add_argument("--evaluate-only", action="store_true", help="只报告留出集上的一致率，不保存模型")
+    train.set_defaults(func=cmd_train_tfidf)
+
+    bench = commands.add_parser("bench-imports", help="测量各子命令的导入耗时")
+    bench.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+    bench.add_argument("--heavy", action="store_true", help="同时测量 SDK 本身的导入耗时")
+    bench.set_defaults(func=cmd_bench_imports)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    _set_root(args.root)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,574 @@
+"""
+视频下载记录的 SQLite 存储
+
+整个进程只持有一个连接（WAL 模式），写操作攒批后在一个事务里提交，
+所有读写都经过同一把锁，可以在并发下载的工作线程里直接调用。
+"""
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _migrate_v1(cursor: sqlite3.Cursor):
+    """v1: 按分类记录进度的表结构、常用索引，并归档旧版单序列表"""
+    # category_sequence 用于记录每个分类的下载进度。
+    # v4 起下载顺序由 item_category 决定（next_undownloaded），这张表只记录每个分类最后下载的视频
+    # 与 Prompt（启动时显示）；current_index 是旧版的下载游标，现在只是该分类已下载的计数，不参与取数
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_sequence (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_name TEXT NOT NULL UNIQUE,
+            current_index INTEGER NOT NULL DEFAULT 0,
+            video_id TEXT,
+            prompt_content TEXT,
+            prompt_content_cn TEXT,
+            updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # downloaded_videos 用于记录所有已下载的视频信息
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS downloaded_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL UNIQUE,
+            category_name TEXT,
+            prompt_content TEXT,
+            prompt_content_cn TEXT,
+            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            file_path TEXT
+        )
+    ''')
+
+    # 早期版本的 downloaded_videos 没有 category_name 列
+    cursor.execute("PRAGMA table_info(downloaded_videos)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'category_name' not in columns:
+        cursor.execute('ALTER TABLE downloaded_videos ADD COLUMN category_name TEXT')
+
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_downloaded_videos_category '
+        'ON downloaded_videos(category_name)'
+    )
+
+    # 分类之前的版本只有一条全局进度 (video_sequence)，它对应的是不分类的视频列表，
+    # 无法换算到任何分类，改名保留以备查询
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'video_sequence'"
+    )
+    if cursor.fetchone():
+        cursor.execute('ALTER TABLE video_sequence RENAME TO legacy_video_sequence')
+
+
+def _migrate_v2(cursor: sqlite3.Cursor):
+    """v2: 视频与分类的多对多归属表，一个视频只下载一次但可属于多个分类"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS video_categories (
+            video_id TEXT NOT NULL,
+            category_name TEXT NOT NULL,
+            PRIMARY KEY (video_id, category_name)
+        )
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_video_categories_category '
+        'ON video_categories(category_name)'
+    )
+    # 已有记录按其下载时的分类回填
+    cursor.execute('''
+        INSERT OR IGNORE INTO video_categories (video_id, category_name)
+        SELECT video_id, category_name FROM downloaded_videos
+        WHERE category_name IS NOT NULL
+    ''')
+
+
+def _migrate_v3(cursor: sqlite3.Cursor):
+    """v3: 翻译缓存，以原文哈希为键，相同 prompt 只翻译一次"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS translation_cache (
+            text_hash TEXT PRIMARY KEY,
+            source_text TEXT NOT NULL,
+            translated_text TEXT NOT NULL,
+            created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migrate_v4(cursor: sqlite3.Cursor):
+    """v4: 分类结果表，代替每次解析 result/ 下最新的分类 JSON"""
+    # item 的 seq 按首次导入的顺序递增，同一分类内按 seq 顺序下载；
+    # failures 为下载失败次数，失败过的视频不再重复尝试
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS item (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            content TEXT,
+            failures INTEGER NOT NULL DEFAULT 0,
+            updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # 主键 (category, seq) 即 "某分类按顺序往后取" 所用的索引
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS item_category (
+            category TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            PRIMARY KEY (category, seq)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_item_category_id ON item_category(id)')
+
+
+def _migrate_v5(cursor: sqlite3.Cursor):
+    """v5: 近似重复标记，dup_of 为同组中最早出现的视频 id（classify_prompts 导入时写入）"""
+    cursor.execute('ALTER TABLE item ADD COLUMN dup_of TEXT')
+
+
+def _migrate_v6(cursor: sqlite3.Cursor):
+    """v6: 已下载视频的 MP4 元数据（mp4_index 扫描写入），按时长、分辨率、编码、完整性查询"""
+    for column, column_type in (
+        ('file_size', 'INTEGER'), ('duration', 'REAL'), ('width', 'INTEGER'), ('height', 'INTEGER'),
+        ('codec', 'TEXT'), ('faststart', 'INTEGER'), ('complete', 'INTEGER'), ('scan_error', 'TEXT'),
+        ('scanned_time', 'TIMESTAMP'),
+    ):
+        cursor.execute(f'ALTER TABLE downloaded_videos ADD COLUMN {column} {column_type}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloaded_videos_duration ON downloaded_videos(duration)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_downloaded_videos_resolution ON downloaded_videos(width, height)'
+    )
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloaded_videos_codec ON downloaded_videos(codec)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloaded_videos_complete ON downloaded_videos(complete)')
+
+
+def _migrate_v7(cursor: sqlite3.Cursor):
+    """v7: 删除 v1 建立的 video_id 索引，UNIQUE(video_id) 约束自带的索引已经覆盖它，多一个只会拖慢写入"""
+    cursor.execute('DROP INDEX IF EXISTS idx_downloaded_videos_video_id')
+
+
+# 按顺序执行的迁移，下标 + 1 即迁移后的 schema 版本 (PRAGMA user_version)
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+]
+
+# 单条 SQL 中 IN (...) 参数的最大个数
+_MAX_SQL_PARAMS = 500
+
+
+class SchemaOutdatedError(Exception):
+    """只读打开的数据库尚未迁移到最新 schema"""
+
+    def __init__(self, db_file: str, version: int):
+        super().__init__(f"{db_file} 的 schema 为 v{version}，低于 v{len(MIGRATIONS)}，需要先迁移")
+        self.version = version
+
+
+class DownloadStore:
+    """
+    下载记录存储
+
+    写操作（保存视频、推进序列号）不会立即提交，累计 batch_size 条后统一提交；
+    flush() / close() 会提交剩余的写入。同一连接内的读操作能看到未提交的写入。
+    read_only 为 True 时以只读方式打开，不做迁移（schema 不是最新时抛出 SchemaOutdatedError），
+    用于只查询统计、不应改动数据库的场合。
+    """
+
+    def __init__(self, db_file: str, batch_size: int = 20, read_only: bool = False):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.RLock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRATIONS):
+                self._conn.close()
+                raise SchemaOutdatedError(db_file, version)
+            return
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self.migrate()
+
+    # ---------- 生命周期 ----------
+
+    def migrate(self):
+        """把数据库升级到最新 schema 版本"""
+        with self._lock:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                cursor = self._conn.cursor()
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {target}')
+                self._conn.commit()
+                print(f"✅ 数据库已迁移到 schema v{target}")
+
+    def flush(self):
+        """提交所有尚未提交的写入"""
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        """提交剩余写入并关闭连接"""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        """执行一条写语句，攒够 batch_size 条后提交一次"""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+            return cursor
+
+    # ---------- 分类进度 ----------
+
+    def init_category_if_not_exists(self, category_name: str):
+        """如果分类记录不存在，则初始化"""
+        self._write('''
+            INSERT OR IGNORE INTO category_sequence (category_name, current_index)
+            VALUES (?, 0)
+        ''', (category_name,))
+
+    def get_current_sequence(self, category_name: str) -> int:
+        """获取指定分类的当前下载序列号（旧版游标，现在只是已下载计数，见 _migrate_v1）"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT current_index FROM category_sequence WHERE category_name = ?',
+                (category_name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_last_downloaded_info(self, category_name: str) -> Optional[Dict]:
+        """获取指定分类最后下载的视频信息"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT current_index, video_id, prompt_content, prompt_content_cn
+                FROM category_sequence
+                WHERE category_name = ?
+            ''', (category_name,)).fetchone()
+        if row:
+            return {
+                'index': row[0],
+                'video_id': row[1],
+                'prompt_content': row[2],
+                'prompt_content_cn': row[3]
+            }
+        return None
+
+    def update_sequence(self, category_name: str, video_id: str, prompt_content: str,
+                        prompt_content_cn: Optional[str]):
+        """更新指定分类的序列号，+1，并记录视频ID、Prompt和中文Prompt（仅用于显示，不影响下载顺序）"""
+        self._write('''
+            UPDATE category_sequence
+            SET current_index = current_index + 1,
+                video_id = ?,
+                prompt_content = ?,
+                prompt_content_cn = ?,
+                updated_time = CURRENT_TIMESTAMP
+            WHERE category_name = ?
+        ''', (video_id, prompt_content, prompt_content_cn, category_name))
+
+    # ---------- 已下载视频 ----------
+
+    def save_downloaded_video(self, video_id: str, category_name: str, prompt_content: str,
+                              prompt_content_cn: Optional[str], file_path: str) -> bool:
+        """保存已下载的视频信息，视频已存在时返回 False"""
+        cursor = self._write('''
+            INSERT OR IGNORE INTO downloaded_videos
+                (video_id, category_name, prompt_content, prompt_content_cn, file_path)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (video_id, category_name, prompt_content, prompt_content_cn, file_path))
+        return cursor.rowcount > 0
+
+    def get_file_path(self, video_id: str) -> Optional[str]:
+        """返回已下载视频的文件路径，未下载时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT file_path FROM downloaded_videos WHERE video_id = ?', (video_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_downloaded(self, video_id: str) -> bool:
+        """视频是否已下载过（不论归属哪个分类）"""
+        return self.get_file_path(video_id) is not None
+
+    def attribute_video(self, video_id: str, categories: Iterable[str]):
+        """把视频归入若干分类（已存在的归属会被忽略）"""
+        for category_name in categories:
+            self._write(
+                'INSERT OR IGNORE INTO video_categories (video_id, category_name) VALUES (?, ?)',
+                (video_id, category_name)
+            )
+
+    # ---------- 翻译 ----------
+
+    def get_cached_translations(self, hashes: List[str]) -> Dict[str, str]:
+        """按原文哈希批量查询翻译缓存，返回 {哈希: 译文}"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _MAX_SQL_PARAMS):
+                chunk = hashes[start:start + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT text_hash, translated_text FROM translation_cache '
+                    f'WHERE text_hash IN ({placeholders})', chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def cache_translations(self, entries: Dict[str, Tuple[str, str]]):
+        """写入翻译缓存，entries 为 {哈希: (原文, 译文)}"""
+        for digest, (source_text, translated_text) in entries.items():
+            self._write(
+                'INSERT OR REPLACE INTO translation_cache (text_hash, source_text, translated_text) '
+                'VALUES (?, ?, ?)',
+                (digest, source_text, translated_text)
+            )
+
+    def update_translation(self, video_id: str, prompt_content_cn: str):
+        """回填视频的中文 Prompt（下载记录和分类进度里的最近一条都会更新）"""
+        self._write(
+            'UPDATE downloaded_videos SET prompt_content_cn = ? WHERE video_id = ?',
+            (prompt_content_cn, video_id)
+        )
+        self._write(
+            'UPDATE category_sequence SET prompt_content_cn = ? WHERE video_id = ?',
+            (prompt_content_cn, video_id)
+        )
+
+    def get_untranslated(self, limit: int) -> List[Tuple[str, str]]:
+        """返回尚未翻译的已下载视频 [(video_id, prompt_content)]"""
+        with self._lock:
+            return self._conn.execute('''
+                SELECT video_id, prompt_content FROM downloaded_videos
+                WHERE (prompt_content_cn IS NULL OR prompt_content_cn = 'skip')
+                  AND prompt_content IS NOT NULL
+                ORDER BY id
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+    # ---------- 分类结果 ----------
+
+    def merge_classification(self, result: Dict[str, List[Dict]]) -> int:
+        """
+        把分类结果 {分类: [{id, content}]} 合并进 item / item_category，返回涉及的视频数
+
+        新视频追加在末尾；已有的视频更新 content，并以本次结果中的分类替换原有分类，
+        本次结果中没有出现的视频保持不变。
+        """
+        categories_by_id: Dict[str, List[str]] = {}
+        contents: Dict[str, Optional[str]] = {}
+        for category, entries in result.items():
+            for entry in entries:
+                video_id = entry.get('id') if isinstance(entry, dict) else None
+                if not video_id:
+                    continue
+                contents.setdefault(video_id, entry.get('content'))
+                categories = categories_by_id.setdefault(video_id, [])
+                if category not in categories:
+                    categories.append(category)
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            for video_id, categories in categories_by_id.items():
+                cursor.execute('''
+                    INSERT INTO item (id, content) VALUES (?, ?)
+                    ON CONFLICT(id) DO UPDATE SET content = excluded.content,
+                                                  updated_time = CURRENT_TIMESTAMP
+                ''', (video_id, contents[video_id]))
+                seq = cursor.execute('SELECT seq FROM item WHERE id = ?', (video_id,)).fetchone()[0]
+                cursor.execute('DELETE FROM item_category WHERE id = ?', (video_id,))
+                cursor.executemany(
+                    'INSERT INTO item_category (category, seq, id) VALUES (?, ?, ?)',
+                    [(category, seq, video_id) for category in categories]
+                )
+            self._conn.commit()
+            self._pending = 0
+        return len(categories_by_id)
+
+    def count_items(self) -> int:
+        """分类结果中的视频总数"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM item').fetchone()[0]
+
+    def category_counts(self) -> Dict[str, Tuple[int, int]]:
+        """各分类的 (视频总数, 已下载数)"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT c.category, COUNT(*), COUNT(d.video_id)
+                FROM item_category c
+                LEFT JOIN downloaded_videos d ON d.video_id = c.id
+                GROUP BY c.category
+            ''').fetchall()
+        return {category: (total, downloaded) for category, total, downloaded in rows}
+
+    def next_undownloaded(self, category: str, limit: int, max_failures: int = 1,
+                          duplicates: str = 'keep') -> List[Tuple[str, str]]:
+        """
+        按顺序返回该分类中接下来 limit 个未下载、且失败次数少于 max_failures 的视频 [(id, content)]
+
+        duplicates 决定近似重复的视频（dup_of 非空）如何处理：
+        'keep' 照常排序，'deprioritize' 排在其他视频之后，'skip' 不再返回。
+        """
+        if duplicates not in ('keep', 'deprioritize', 'skip'):
+            raise ValueError(f"未知的近似重复处理方式: {duplicates}")
+        if duplicates == 'keep':
+            return self._undownloaded(category, limit, max_failures, '')
+        # 'deprioritize' 分两次按 seq 查询（先非重复、不够再取重复），两次都沿 (category, seq) 主键顺序扫描，
+        # 不需要对整个分类排序
+        rows = self._undownloaded(category, limit, max_failures, 'AND i.dup_of IS NULL')
+        if duplicates == 'deprioritize' and len(rows) < limit:
+            rows += self._undownloaded(category, limit - len(rows), max_failures, 'AND i.dup_of IS NOT NULL')
+        return rows
+
+    def _undownloaded(self, category: str, limit: int, max_failures: int, condition: str) -> List[Tuple[str, str]]:
+        """按 seq 顺序取该分类中未下载的视频，condition 为附加的过滤条件"""
+        with self._lock:
+            return self._conn.execute(f'''
+                SELECT c.id, i.content
+                FROM item_category c
+                JOIN item i ON i.seq = c.seq
+                WHERE c.category = ?
+                  AND i.failures < ?
+                  AND NOT EXISTS (SELECT 1 FROM downloaded_videos d WHERE d.video_id = c.id)
+                  {condition}
+                ORDER BY c.seq
+                LIMIT ?
+            ''', (category, max_failures, limit)).fetchall()
+
+    def filter_undownloaded(self, video_ids: List[str], max_failures: int = 1) -> List[str]:
+        """从 video_ids 中筛出未下载、且失败次数少于 max_failures 的视频（保持原顺序）"""
+        excluded = set()
+        with self._lock:
+            for start in range(0, len(video_ids), _MAX_SQL_PARAMS):
+                chunk = video_ids[start:start + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                excluded.update(row[0] for row in self._conn.execute(
+                    f'SELECT video_id FROM downloaded_videos WHERE video_id IN ({placeholders})', chunk
+                ))
+                excluded.update(row[0] for row in self._conn.execute(
+                    f'SELECT id FROM item WHERE id IN ({placeholders}) AND failures >= ?', chunk + [max_failures]
+                ))
+        return [video_id for video_id in video_ids if video_id not in excluded]
+
+    def get_item_categories(self, video_ids: List[str]) -> Dict[str, List[str]]:
+        """批量查询视频所属的全部分类，返回 {id: [分类, ...]}"""
+        found: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(video_ids), _MAX_SQL_PARAMS):
+                chunk = video_ids[start:start + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT id, category FROM item_category WHERE id IN ({placeholders}) ORDER BY rowid',
+                    chunk
+                ).fetchall()
+                for video_id, category in rows:
+                    found.setdefault(video_id, []).append(category)
+        return found
+
+    def attribute_downloaded(self, category: str) -> List[Tuple[str, str]]:
+        """
+        把分类结果中属于该分类、已下载但尚未归入该分类的视频补充归属
+
+        返回新归入的 [(video_id, file_path)]，供调用方建立分类链接。
+        """
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT c.id, d.file_path
+                FROM item_category c
+                JOIN downloaded_videos d ON d.video_id = c.id
+                WHERE c.category = ?
+                  AND NOT EXISTS (SELECT 1 FROM video_categories v
+                                  WHERE v.video_id = c.id AND v.category_name = c.category)
+            ''', (category,)).fetchall()
+            for video_id, _ in rows:
+                self.attribute_video(video_id, [category])
+        return rows
+
+    def mark_duplicates(self, duplicates: Dict[str, str]):
+        """记录近似重复关系 {视频 id: 同组最早的视频 id}"""
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE item SET dup_of = ? WHERE id = ?',
+                [(canonical, video_id) for video_id, canonical in duplicates.items()]
+            )
+            self._conn.commit()
+            self._pending = 0
+
+    def get_duplicate_translations(self, video_ids: List[str]) -> Dict[str, str]:
+        """对近似重复的视频，返回同组已下载视频的中文 Prompt {id: 中文}"""
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(video_ids), _MAX_SQL_PARAMS):
+                chunk = video_ids[start:start + _MAX_SQL_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(f'''
+                    SELECT i.id, d.prompt_content_cn
+                    FROM item i
+                    JOIN downloaded_videos d ON d.video_id = i.dup_of
+                    WHERE i.id IN ({placeholders})
+                      AND d.prompt_content_cn IS NOT NULL AND d.prompt_content_cn != 'skip'
+                ''', chunk).fetchall()
+                found.update(rows)
+        return found
+
+    def mark_failed(self, video_id: str):
+        """记录一次下载失败"""
+        self._write('UPDATE item SET failures = failures + 1 WHERE id = ?', (video_id,))
+
+    # ---------- 视频元数据 ----------
+
+    def get_files_to_scan(self, rescan: bool = False) -> List[Tuple[str, str]]:
+        """尚未扫描 MP4 元数据（rescan 时为全部）的已下载视频 [(video_id, 文件路径)]"""
+        where = '' if rescan else 'AND scanned_time IS NULL'
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT video_id, file_path FROM downloaded_videos WHERE file_path IS NOT NULL {where} ORDER BY id'
+            ).fetchall()
+
+    def save_video_metadata(self, entries: Dict):
+        """写入 {video_id: Mp4Info}（见 mp4_index）"""
+        for video_id, info in entries.items():
+            self._write('''
+                UPDATE downloaded_videos SET
+                    file_size = ?, duration = ?, width = ?, height = ?, codec = ?,
+                    faststart = ?, complete = ?, scan_error = ?, scanned_time = CURRENT_TIMESTAMP
+                WHERE video_id = ?
+            ''', (info.file_size, info.duration, info.width, info.height, info.codec,
+                  int(info.faststart), int(info.complete), info.error, video_id))
+
+    def find_videos(self, min_duration: Optional[float] = None, min_height: Optional[int] = None,
+                    codec: Optional[str] = None, complete: Optional[bool] = True) -> List[Tuple[str, str]]:
+        """按扫描得到的元数据筛选已下载视频，返回 [(video_id, 文件路径)]；条件为 None 时不限"""
+        conditions, params = [], []
+        if min_duration is not None:
+            conditions.append('duration >= ?')
+            params.append(min_duration)
+        if min_height is not None:
+            conditions.append('height >= ?')
+            params.append(min_height)
+        if codec is not None:
+            conditions.append('codec = ?')
+            params.append(codec)
+        if complete is not None:
+            conditions.append('complete = ?')
+            params.append(int(complete))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT video_id, file_path FROM downloaded_videos {where} ORDER BY id', params
+            ).fetchall()
@@ -1,20 +1,66 @@
-from curl_cffi import requests
+import os
 import sys
+import time
 import json
-import sqlite3
 from pathlib import Path
-from deep_translator import GoogleTranslator
 import glob
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.http_pool import get_session_pool
+from dynamic_image.metrics import Metrics, write_report
+from dynamic_image.mp4_index import probe
+from dynamic_image.rate_limit import CircuitOpenError, RateController
+from dynamic_image.scheduler import build_work_queue
+from dynamic_image.transfer import ProgressReporter, StreamWriter, preallocate
+from dynamic_image.translation import BackgroundTranslator, text_hash, translate_text
 
 # ==================== 配置项 ====================
-# 指定要下载的分类（从分类结果文件中选择一个分类名称）
-TARGET_CATEGORY = "美女"  # 可选: 日漫风格, 奇幻，异世界风格, 科幻风格, 赛博朋克风格, 复古风格, 北欧风格, 美女, 帅哥, 动物萌宠, 情侣, 未分类
+# 指定要下载的分类及权重（从分类结果文件中选择分类名称，权重越大本轮分到的视频越多）
+# 可选: 日漫风格, 奇幻，异世界风格, 科幻风格, 赛博朋克风格, 复古风格, 北欧风格, 美女, 帅哥, 动物萌宠, 情侣, 未分类
+TARGET_CATEGORIES = {
+    "美女": 1,
+}
+# 每次运行下载的视频数量（所有分类合计，同一视频只下载一次）
+BATCH_SIZE = 20
+# 下载失败多少次（多少轮）后不再尝试该视频；未完成的 .part 会在之后的轮次中续传
+MAX_DOWNLOAD_FAILURES = 3
+# 近似重复的视频（classify_prompts 标记，prompt 与之前的视频几乎相同）如何处理：
+# "keep" 照常下载，"deprioritize" 排在其他视频之后，"skip" 不下载
+NEAR_DUPLICATES = "deprioritize"
+# 同时进行的下载数量上限（设为 1 即退化为逐个下载）
+MAX_WORKERS = 8
+# 超过该大小（字节）的文件拆成多个 Range 分段并行下载，设为 0 关闭分段
+# 开启后每个视频会多一次探测请求（Range: bytes=0-0）用于获取文件大小
+SEGMENT_THRESHOLD = 0
+# 分段下载时的分段数
+SEGMENT_COUNT = 4
+# 单个视频遇到 403/429/5xx 或连接中断时的最大重试次数（连接中断后从 .part 已有的字节处续传）
+MAX_RETRIES = 3
+# 连接中断后第一次续传前等待的秒数，之后每次翻倍
+RESUME_BACKOFF = 1.0
+# 写盘缓冲大小：攒够这么多字节才落盘一次
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 进度条重绘间隔（秒）
+PROGRESS_INTERVAL = 0.5
+# 是否在后台翻译 Prompt 并回填中文（翻译不阻塞下载）
+TRANSLATE_PROMPTS = True
+# 后台翻译线程数
+TRANSLATION_WORKERS = 2
+# 每轮顺带补翻的历史记录条数（之前未翻译或标记为 skip 的记录）
+TRANSLATION_BACKFILL_LIMIT = 100
 # ==============================================
 
-# 自动查找 result 目录下最新的分类结果文件
+# 分类结果存放在 DB_FILE 的 item / item_category 表中（classify_prompts 运行后写入）；
+# 表为空时从 result 目录下最新的分类结果文件导入一次
 RESULT_DIR = "result"
 DB_FILE = "video_download.db"
 OUTPUT_DIR = "downloaded_videos"
+# 按分类浏览的目录：downloaded_videos/by_category/{分类}/{video_id}.mp4 硬链接到同一个文件
+CATEGORY_VIEW_DIR = "by_category"
+# 每次运行的指标：JSON 汇总与 Prometheus textfile
+METRICS_DIR = Path(RESULT_DIR) / "metrics"
 
 # 模拟浏览器的 Headers (Sec-Fetch 系列头对于视频请求很重要)
 headers = {
@@ -29,131 +75,32 @@ headers = {
     'Range': 'bytes=0-',  # 许多视频服务器要求这个头
 }
 
+# 共享会话池：使用 impersonate="chrome120" 来模拟真实浏览器的 TLS 指纹，
+# 同一线程内的下载复用连接，对 CDN 的并发连接数不超过 MAX_WORKERS
+session_pool = get_session_pool("curl_cffi", impersonate="chrome120", max_per_host=MAX_WORKERS)
 
-def init_database():
-    """初始化数据库，创建表记录视频下载序列（按分类）"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # 创建表：category_sequence 用于记录每个分类的下载进度
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS category_sequence (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category_name TEXT NOT NULL UNIQUE,
-            current_index INTEGER NOT NULL DEFAULT 0,
-            video_id TEXT,
-            prompt_content TEXT,
-            prompt_content_cn TEXT,
-            updated_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # 创建表：downloaded_videos 用于记录所有已下载的视频信息
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS downloaded_videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            video_id TEXT NOT NULL UNIQUE,
-            category_name TEXT,
-            prompt_content TEXT,
-            prompt_content_cn TEXT,
-            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            file_path TEXT
-        )
-    ''')
-    
-    # 检查 downloaded_videos 表是否需要添加 category_name 列
-    cursor.execute("PRAGMA table_info(downloaded_videos)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    if 'category_name' not in columns:
-        cursor.execute('ALTER TABLE downloaded_videos ADD COLUMN category_name TEXT')
-        print("✅ 已添加 category_name 列到 downloaded_videos 表")
-    
-    conn.commit()
-    conn.close()
-    print("✅ 数据库初始化完成")
-
-
-def get_current_sequence(category_name):
-    """获取指定分类的当前下载序列号"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT current_index FROM category_sequence WHERE category_name = ?', (category_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else 0
-
-
-def get_last_downloaded_info(category_name):
-    """获取指定分类最后下载的视频信息"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT current_index, video_id, prompt_content, prompt_content_cn 
-        FROM category_sequence 
-        WHERE category_name = ?
-    ''', (category_name,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        return {
-            'index': result[0],
-            'video_id': result[1],
-            'prompt_content': result[2],
-            'prompt_content_cn': result[3]
-        }
-    return None
-
-
-def init_category_if_not_exists(category_name):
-    """如果分类记录不存在，则初始化"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR IGNORE INTO category_sequence (category_name, current_index)
-        VALUES (?, 0)
-    ''', (category_name,))
-    conn.commit()
-    conn.close()
+# CDN 限流：遇到 403/429/5xx 自动降速退避，连续多次 403（风控）时暂停该主机
+CDN_HOST = "cdn.midjourney.com"
+rate_controller = RateController(initial_rate=MAX_WORKERS, max_rate=MAX_WORKERS * 4, burst=MAX_WORKERS)
+
+# 本次运行的分阶段耗时与计数
+metrics = Metrics("download")
+
+
+def record_response(status, retry_after=None):
+    """把 CDN 响应交给限流器，同时按状态码计数；返回限流器给出的重试等待时间"""
+    metrics.inc("http_responses", status=status)
+    return rate_controller.record(CDN_HOST, status, retry_after)
 
 
 def translate_to_chinese(text):
-    """将英文文本翻译为中文"""
+    """将英文文本翻译为中文（单条、同步，翻译失败时返回原文）"""
     if not text:
         return None
     
     try:
         print(f"🌐 正在翻译 Prompt 为中文...")
-        # 使用 Google 翻译，从英文翻译到简体中文
-        translator = GoogleTranslator(source='en', target='zh-CN')
-        
-        # 如果文本过长，分段翻译（Google Translate 有字符限制）
-        max_length = 4500
-        if len(text) <= max_length:
-            translated = translator.translate(text)
-        else:
-            # 分段翻译
-            segments = []
-            sentences = text.split('. ')
-            current_segment = ""
-            
-            for sentence in sentences:
-                if len(current_segment) + len(sentence) + 2 <= max_length:
-                    current_segment += sentence + '. '
-                else:
-                    if current_segment:
-                        segments.append(current_segment.strip())
-                    current_segment = sentence + '. '
-            
-            if current_segment:
-                segments.append(current_segment.strip())
-            
-            # 翻译每个段落
-            translated_segments = []
-            for segment in segments:
-                translated_segments.append(translator.translate(segment))
-            
-            translated = ' '.join(translated_segments)
+        translated = translate_text(text)
         print(f"✅ 翻译完成")
         return translated
     
@@ -163,40 +110,6 @@ def translate_to_chinese(text):
         return text  # 如果翻译失败，返回原文本
 
 
-def save_downloaded_video(video_id, category_name, prompt_content, prompt_content_cn, file_path):
-    """保存已下载的视频信息到 downloaded_videos 表"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO downloaded_videos (video_id, category_name, prompt_content, prompt_content_cn, file_path)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (video_id, category_name, prompt_content, prompt_content_cn, file_path))
-        conn.commit()
-        print(f"✅ 已保存视频记录到数据库: {video_id} (分类: {category_name})")
-    except sqlite3.IntegrityError:
-        print(f"⚠️  视频 {video_id} 已存在于数据库中")
-    finally:
-        conn.close()
-
-
-def update_sequence(category_name, video_id, prompt_content, prompt_content_cn):
-    """更新指定分类的序列号，+1，并记录视频ID、Prompt和中文Prompt"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE category_sequence 
-        SET current_index = current_index + 1,
-            video_id = ?,
-            prompt_content = ?,
-            prompt_content_cn = ?,
-            updated_time = CURRENT_TIMESTAMP
-        WHERE category_name = ?
-    ''', (video_id, prompt_content, prompt_content_cn, category_name))
-    conn.commit()
-    conn.close()
-
-
 def find_latest_classification_file():
     """自动查找 result 目录下最新的分类结果文件"""
     pattern = f"{RESULT_DIR}/classification_result_*.json"
@@ -211,112 +124,325 @@ def find_latest_classification_file():
     return latest_file
 
 
-def load_video_data(category_name):
-    """从 JSON 文件加载指定分类的视频数据"""
-    try:
+def load_classification(store, category_names):
+    """
+    检查分类结果表中有所需的分类，返回各分类的 (视频总数, 已下载数)
+
+    表为空时（分类结果入库之前的数据）先从 result 目录下最新的分类结果文件导入一次。
+    """
+    if store.count_items() == 0:
         json_file = find_latest_classification_file()
-        print(f"📁 使用文件: {json_file}")
-        
-        with open(json_file, 'r', encoding='utf-8') as f:
-            all_data = json.load(f)
-        
-        # 检查分类是否存在
-        if category_name not in all_data:
-            print(f"❌ 分类 '{category_name}' 不存在")
-            print(f"📋 可用的分类: {', '.join(all_data.keys())}")
+        print(f"📁 导入分类结果: {json_file}")
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                count = store.merge_classification(json.load(f))
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON 解析错误: {e}")
             sys.exit(1)
-        
-        category_data = all_data[category_name]
-        print(f"✅ 成功加载分类 '{category_name}': {len(category_data)} 个视频")
-        return category_data
-        
-    except FileNotFoundError as e:
-        print(f"❌ 找不到文件: {e}")
-        sys.exit(1)
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON 解析错误: {e}")
+        print(f"✅ 已导入 {count} 个视频的分类结果")
+    
+    counts = store.category_counts()
+    missing = [name for name in category_names if name not in counts]
+    if missing:
+        print(f"❌ 分类 {', '.join(missing)} 不存在")
+        print(f"📋 可用的分类: {', '.join(counts)}")
         sys.exit(1)
+    
+    for name in category_names:
+        total, downloaded = counts[name]
+        print(f"✅ 分类 '{name}': {total} 个视频，已下载 {downloaded} 个")
+    return counts
+
+
+def link_into_categories(file_path, categories):
+    """在按分类浏览的目录下为视频建立硬链接（不支持硬链接时退回符号链接）"""
+    source = Path(file_path)
+    for category_name in categories:
+        category_dir = Path(OUTPUT_DIR) / CATEGORY_VIEW_DIR / category_name
+        category_dir.mkdir(parents=True, exist_ok=True)
+        target = category_dir / source.name
+        if target.exists():
+            continue
+        try:
+            os.link(source, target)
+        except OSError:
+            try:
+                target.symlink_to(source.resolve())
+            except OSError as e:
+                print(f"⚠️  无法为 {source.name} 建立分类链接 ({category_name}): {e}")
+
+
+def _parse_content_range(value):
+    """解析 Content-Range 响应头，返回 (起始偏移, 文件总大小)，无法解析的部分为 None"""
+    # 形如 "bytes 100-199/1000" 或 "bytes */1000"
+    if not value or not value.startswith('bytes '):
+        return None, None
+    range_part, _, total = value[len('bytes '):].partition('/')
+    try:
+        start = None if range_part == '*' else int(range_part.split('-')[0])
+        total_size = int(total) if total != '*' else None
+    except ValueError:
+        return None, None
+    return start, total_size
+
+
+def _download_segmented(video_url, output_filename, total_size, progress, segment_count=SEGMENT_COUNT):
+    """把大文件拆成多个 Range 分段并行下载，全部分段校验通过后再改名到位"""
+    # 分段文件里可能有空洞，不能用文件大小判断进度，所以不与 .part 共用
+    seg_filename = output_filename.with_name(output_filename.name + '.seg')
+    with open(seg_filename, 'wb') as f:
+        # 一次分配好完整空间，分配失败时退回稀疏文件
+        if not preallocate(f.fileno(), 0, total_size, keep_size=False):
+            f.truncate(total_size)
+
+    segment_size = -(-total_size // segment_count)
+    byte_ranges = [
+        (start, min(start + segment_size, total_size) - 1)
+        for start in range(0, total_size, segment_size)
+    ]
+
+    def fetch_segment(byte_range):
+        start, end = byte_range
+        range_headers = {**headers, 'Range': f'bytes={start}-{end}'}
+        rate_controller.acquire(CDN_HOST)
+        with StreamWriter(seg_filename, start, WRITE_BUFFER_SIZE) as writer:
+            def on_chunk(chunk):
+                writer.write(chunk)
+                progress.update(video_key, len(chunk))
+                metrics.inc("bytes", len(chunk))
+
+            response = session_pool.fetch('GET', video_url, on_chunk, headers=range_headers)
+            written = writer.written
+        record_response(response.status_code)
+        if response.status_code != 206:
+            raise RuntimeError(f"分段 {start}-{end} 返回状态码 {response.status_code}")
+        if written != end - start + 1:
+            raise RuntimeError(f"分段 {start}-{end} 不完整: {written} 字节")
+
+    video_key = output_filename.stem
+    progress.start(video_key, total=total_size)
+    print(f"🧩 文件较大，拆分为 {len(byte_ranges)} 个分段并行下载")
+    try:
+        with ThreadPoolExecutor(max_workers=len(byte_ranges)) as executor:
+            list(executor.map(fetch_segment, byte_ranges))
+    except Exception:
+        seg_filename.unlink()
+        raise
+    os.replace(seg_filename, output_filename)
+
+
+def _probe_total_size(video_url):
+    """用 Range: bytes=0-0 探测文件总大小，服务器不支持 Range 时返回 None"""
+    rate_controller.acquire(CDN_HOST)
+    response = session_pool.get(video_url, headers={**headers, 'Range': 'bytes=0-0'})
+    record_response(response.status_code)
+    if response.status_code != 206:
+        return None
+    return _parse_content_range(response.headers.get('content-range'))[1]
 
 
-def download_video_by_id(video_id, prompt_content):
-    """根据视频 ID 下载视频，返回 (成功状态, 文件路径)"""
+def download_video_by_id(video_id, prompt_content, progress=None):
+    """根据视频 ID 下载视频，返回 (成功状态, 文件路径)
+
+    数据先写入 {video_id}.mp4.part，大小与服务器给出的总大小一致后才改名为 .mp4；
+    连接中断时保留 .part，本次调用内最多续传 MAX_RETRIES 次，仍失败时留给下一轮从已有字节处续传。
+    progress 为多个下载共用的 ProgressReporter，不传时单独显示本视频的进度。
+    """
+    own_progress = progress is None
+    if own_progress:
+        progress = ProgressReporter(total_files=1, interval=PROGRESS_INTERVAL)
+    success = None
+    try:
+        with metrics.timer("download"):
+            success, file_path = _download_video(video_id, prompt_content, progress)
+        return success, file_path
+    finally:
+        # 熔断时 success 仍为 None：不计入成功或失败
+        progress.finish(video_id, success)
+        if own_progress:
+            progress.close()
+
+
+def _download_video(video_id, prompt_content, progress):
+    """download_video_by_id 的实际实现"""
     video_url = f"https://cdn.midjourney.com/video/{video_id}/0.mp4"
     output_filename = Path(OUTPUT_DIR) / f"{video_id}.mp4"
+    part_filename = output_filename.with_name(output_filename.name + '.part')
     
     # 创建输出目录
     Path(OUTPUT_DIR).mkdir(exist_ok=True)
     
+    if output_filename.exists():
+        print(f"✅ 文件已存在，跳过下载: {output_filename.name}")
+        return True, str(output_filename)
+    
     print(f"🚀 正在使用 TLS 伪装 (Chrome) 下载视频 ID: {video_id}")
     print(f"📝 Prompt: {prompt_content[:100]}..." if len(prompt_content) > 100 else f"📝 Prompt: {prompt_content}")
     
     try:
-        # 使用 impersonate="chrome120" 来模拟真实浏览器的 TLS 指纹
-        response = requests.get(
-            video_url,
-            headers=headers,
-            impersonate="chrome120",
-            stream=True,
-            timeout=30
-        )
-
-        if response.status_code == 403:
-            print("❌ 403 Forbidden - 可能该链接已失效或触发了风控")
+        offset = part_filename.stat().st_size if part_filename.exists() else 0
+        if offset:
+            print(f"⏯️  发现未完成的下载，从 {offset / (1024 * 1024):.2f} MB 处继续")
+        elif SEGMENT_THRESHOLD > 0:
+            total_size = _probe_total_size(video_url)
+            if total_size and total_size >= SEGMENT_THRESHOLD:
+                _download_segmented(video_url, output_filename, total_size, progress)
+                print(f"🎉 下载完成: {output_filename.name}")
+                return True, str(output_filename)
+
+        # 响应体直接追加到 .part 末尾（即续传起点），状态码在传输结束后再核对
+        def on_start(status, content_length):
+            if status == 206:
+                writer.preallocate(content_length)
+                progress.set_total(video_id, offset + content_length)
+            elif status == 200:
+                progress.set_total(video_id, content_length)
+
+        def on_chunk(chunk):
+            writer.write(chunk)
+            progress.update(video_id, len(chunk))
+            metrics.inc("bytes", len(chunk))
+
+        # 遇到 403/429/5xx 时按限流器给出的退避时间重试；连接中断时从 .part 当前大小处续传
+        for attempt in range(MAX_RETRIES + 1):
+            rate_controller.acquire(CDN_HOST)
+            progress.start(video_id, done=offset)
+            try:
+                with StreamWriter(part_filename, offset, WRITE_BUFFER_SIZE) as writer:
+                    range_headers = {**headers, 'Range': f'bytes={offset}-'}
+                    response = session_pool.fetch('GET', video_url, on_chunk, on_start, headers=range_headers)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                # 已收到的字节在 StreamWriter 退出时落盘，下次从这里续传
+                offset = part_filename.stat().st_size if part_filename.exists() else 0
+                delay = RESUME_BACKOFF * 2 ** attempt
+                metrics.inc("retries")
+                print(f"\n⏯️  {video_id} 连接中断 ({e})，{delay:.1f} 秒后从 {offset / (1024 * 1024):.2f} MB 处续传 "
+                      f"({attempt + 1}/{MAX_RETRIES})")
+                time.sleep(delay)
+                continue
+
+            delay = record_response(response.status_code, _retry_after(response))
+            if delay is None or attempt == MAX_RETRIES:
+                break
+            metrics.inc("retries")
+            _truncate(part_filename, offset)
+            print(f"⏳ {video_id} 返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt + 1}/{MAX_RETRIES})")
+            time.sleep(delay)
+
+        status = response.status_code
+        start, total_size = _parse_content_range(response.headers.get('content-range'))
+
+        if status == 416 and offset and total_size == offset:
+            # 续传起点正好是文件末尾：.part 早已完整，只差改名
+            _truncate(part_filename, offset)
+        elif status == 206 and start == offset:
+            pass
+        elif status == 200:
+            # 服务器忽略了 Range，返回的是完整文件：丢掉旧数据，只保留这次的响应体
+            _drop_prefix(part_filename, offset)
+            total_size = int(response.headers.get('content-length', 0)) or None
+        else:
+            # 错误响应的响应体不属于视频数据，截回续传起点
+            _truncate(part_filename, offset)
+            if status == 403:
+                print("❌ 403 Forbidden - 可能该链接已失效或触发了风控")
+            elif status == 404:
+                print("❌ 404 Not Found - 视频不存在")
+            elif status == 416:
+                print("⚠️  未完成的文件与服务器不一致，已删除，下次将重新下载")
+                if part_filename.exists():
+                    part_filename.unlink()
+            else:
+                print(f"❌ 服务器返回异常状态码: {status}")
             return False, None
-        
-        if response.status_code == 404:
-            print("❌ 404 Not Found - 视频不存在")
+
+        actual_size = part_filename.stat().st_size
+        if total_size and actual_size != total_size:
+            print(f"\n⚠️  下载不完整 ({actual_size}/{total_size} 字节)，已保留 .part 文件以便续传")
             return False, None
+        os.replace(part_filename, output_filename)
 
-        response.raise_for_status()
-
-        total_size = int(response.headers.get('content-length', 0))
-        print(f"✅ 连接成功！文件大小: {total_size / (1024 * 1024):.2f} MB")
-
-        with open(output_filename, 'wb') as f:
-            downloaded = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        percent = int(50 * downloaded / total_size)
-                        sys.stdout.write(
-                            f"\r[{'=' * percent}{' ' * (50 - percent)}] {int(downloaded / total_size * 100)}%")
-                        sys.stdout.flush()
-
-        print(f"\n🎉 下载完成!")
-        print(f"📁 文件名: {output_filename.name}")
+        print(f"🎉 下载完成: {video_id}")
+        print(f"📁 文件名: {output_filename.name} ({actual_size / (1024 * 1024):.2f} MB)")
         print(f"📝 Prompt: {prompt_content}")
         print("-" * 80)
         return True, str(output_filename)
 
+    except CircuitOpenError:
+        # 熔断不算这个视频下载失败，交给调用方暂缓处理
+        raise
     except Exception as e:
         print(f"\n❌ 下载失败: {e}")
         return False, None
 
 
-def main():
-    """主函数 - 一次下载5个视频（按分类）"""
-    print("=" * 80)
-    print("🎬 Midjourney 视频批量下载器 (分类版)")
-    print("=" * 80)
-    
-    # 1. 初始化数据库
-    init_database()
-    
-    # 2. 初始化目标分类
-    init_category_if_not_exists(TARGET_CATEGORY)
-    print(f"🎯 目标分类: {TARGET_CATEGORY}")
-    
-    # 3. 加载指定分类的视频数据
-    video_data = load_video_data(TARGET_CATEGORY)
-    
-    # 4. 获取当前序列号和上次下载信息
-    current_index = get_current_sequence(TARGET_CATEGORY)
-    print(f"📊 当前序列号: {current_index}")
-    
-    # 显示上次下载的视频信息
-    last_info = get_last_downloaded_info(TARGET_CATEGORY)
+def _retry_after(response):
+    """读取 Retry-After 响应头（秒），没有或无法解析时返回 None"""
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _truncate(path, size):
+    """把文件截断到指定大小，截成 0 时直接删除"""
+    if size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+    else:
+        path.unlink()
+
+
+def _drop_prefix(path, size):
+    """丢弃文件开头的 size 个字节"""
+    if not size:
+        return
+    with open(path, 'r+b') as f:
+        f.seek(size)
+        data = f.read()
+        f.seek(0)
+        f.write(data)
+        f.truncate(len(data))
+
+
+def download_videos_concurrently(videos, max_workers=MAX_WORKERS):
+    """并发下载一组视频，按传入顺序逐个产出 (video_obj, 成功状态, 文件路径)
+
+    下载在线程池中同时进行，但结果严格按提交顺序返回，
+    这样调用方可以按顺序写库、推进序列号。
+    CDN 熔断期间未能下载的视频，成功状态为 None（表示暂缓，而不是失败）。
+    """
+    # 所有下载共用一条汇总进度
+    progress = ProgressReporter(total_files=len(videos), interval=PROGRESS_INTERVAL)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(
+                download_video_by_id,
+                video_obj.get('id'),
+                video_obj.get('content', 'No prompt'),
+                progress,
+            )
+            for video_obj in videos
+        ]
+        for video_obj, future in zip(videos, futures):
+            try:
+                success, file_path = future.result()
+            except CircuitOpenError:
+                success, file_path = None, None
+            yield video_obj, success, file_path
+    progress.close()
+
+
+def print_last_downloaded(store, category_name):
+    """显示指定分类上次下载的视频信息"""
+    current_index = store.get_current_sequence(category_name)
+    last_info = store.get_last_downloaded_info(category_name)
+    print(f"📊 '{category_name}' 当前序列号: {current_index}")
     if last_info and last_info['video_id'] and current_index > 0:
         print(f"📝 上次下载: {last_info['video_id']}")
         
@@ -329,79 +455,182 @@ def main():
         prompt_cn_preview = last_info['prompt_content_cn'][:60] + "..." if last_info.get('prompt_content_cn') and len(last_info['prompt_content_cn']) > 60 else last_info.get('prompt_content_cn')
         if prompt_cn_preview:
             print(f"   中文: {prompt_cn_preview}")
+
+
+def record_download(store, item, success, file_path, translator=None, duplicate_translation=None):
+    """
+    把一个视频的下载结果写入 store，返回 "success" / "failed" / "deferred"
+
+    下载的文件先用 probe() 检查，被截断或损坏时删除并按下载失败处理。
+    成功时保存下载记录与 MP4 元数据、归入该视频所属的全部分类并推进 item.source 的序列号，
+    中文 Prompt 依次取翻译缓存、duplicate_translation（同组近似重复视频的译文），
+    都没有时交给 translator 在后台翻译回填。
+    """
+    video_id = item.video_id
+    prompt_content = item.content
     
-    # 5. 检查是否已经下载完所有视频
-    if current_index >= len(video_data):
-        print(f"✅ '{TARGET_CATEGORY}' 分类的所有视频已下载完成! (共 {len(video_data)} 个)")
-        return
-    
-    # 6. 批量下载5个视频
-    batch_size = 20
-    total_videos = len(video_data)
-    videos_to_download = min(batch_size, total_videos - current_index)
+    if success is None:
+        # CDN 熔断，本视频未尝试下载，下一轮会重新取到
+        metrics.inc("videos", result="deferred")
+        return "deferred"
     
-    print(f"🎯 准备下载 {videos_to_download} 个视频 (从第 {current_index + 1} 到第 {current_index + videos_to_download})")
-    print("=" * 80)
+    if success:
+        # 只读几个 box 头和 moov，确认文件完整，并取得时长、分辨率、编码
+        info = probe(file_path)
+        if not info.complete:
+            # 被截断或损坏的文件不算下载成功。改名前大小已与服务器给出的总大小核对过，
+            # 续传只会得到 416 和同样的字节，所以直接删除，下一轮重新下载
+            print(f"⚠️  {video_id} 文件不完整: {info.error}，已删除")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            success = False
     
-    success_count = 0
-    failed_count = 0
+    if not success:
+        print(f"⚠️  {video_id} 下载失败，跳过该视频")
+        metrics.inc("videos", result="failed")
+        # 记录失败次数，达到 MAX_DOWNLOAD_FAILURES 后不再尝试
+        store.mark_failed(video_id)
+        return "failed"
     
-    for i in range(videos_to_download):
-        video_index = current_index + i
-        video_obj = video_data[video_index]
-        video_id = video_obj.get('id')
-        prompt_content = video_obj.get('content', 'No prompt')
+    # 下载成功，保存到数据库，Prompt 交给后台翻译
+    metrics.inc("videos", result="success")
+    with metrics.timer("save"):
+        # 命中翻译缓存时直接使用，否则先留空，由后台翻译完成后回填
+        cached = store.get_cached_translations([text_hash(prompt_content)])
+        prompt_content_cn = cached.get(text_hash(prompt_content)) or duplicate_translation
         
-        if not video_id:
-            print(f"❌ 无法获取视频 {video_index + 1} 的 ID，跳过")
-            failed_count += 1
-            continue
+        # 保存到 downloaded_videos 表，并归入该视频所属的所有分类
+        if not store.save_downloaded_video(video_id, item.source, prompt_content, prompt_content_cn, file_path):
+            print(f"⚠️  视频 {video_id} 已存在于数据库中")
+        store.save_video_metadata({video_id: info})
+        store.attribute_video(video_id, item.categories)
+        link_into_categories(file_path, item.categories)
         
-        print(f"\n📹 [{i + 1}/{videos_to_download}] 下载第 {video_index + 1}/{total_videos} 个视频")
-        print("=" * 80)
-        
-        # 下载视频
-        success, file_path = download_video_by_id(video_id, prompt_content)
-        
-        # 如果下载成功，翻译 Prompt 并保存到数据库
-        if success:
-            # 翻译 Prompt 为中文
-            # prompt_content_cn = translate_to_chinese(prompt_content)
+        # 更新序列号（记录最新下载的视频）
+        store.update_sequence(item.source, video_id, prompt_content, prompt_content_cn)
+    
+    if prompt_content_cn is None and translator is not None:
+        translator.submit(video_id, prompt_content)
+    
+    print(f"📹 {video_id} [{', '.join(item.categories)}] 中文 Prompt: {prompt_content_cn or '(后台翻译中)'}")
+    return "success"
 
-            prompt_content_cn = "skip"
-            
-            # 保存到 downloaded_videos 表
-            save_downloaded_video(video_id, TARGET_CATEGORY, prompt_content, prompt_content_cn, file_path)
-            
-            # 更新序列号（记录最新下载的视频）
-            update_sequence(TARGET_CATEGORY, video_id, prompt_content, prompt_content_cn)
-            
-            # 显示翻译后的中文 Prompt
-            print(f"📝 中文 Prompt: {prompt_content_cn}")
-            print("-" * 80)
-            
-            success_count += 1
-        else:
-            print("⚠️  下载失败，跳过该视频")
-            failed_count += 1
-            # 即使失败也更新序列号，避免重复尝试同一个视频
-            update_sequence(TARGET_CATEGORY, video_id, prompt_content, None)
+
+def download_categories(store, category_weights, translator=None):
+    """按权重从多个分类中取出本轮要下载的视频，去重后并发下载，并把结果写入 store
+
+    传入 translator (BackgroundTranslator) 时，新下载视频的 Prompt 交给它在后台翻译回填。
+    返回各结果（success / failed / deferred）的数量。
+    """
+    # 2. 初始化目标分类
+    for category_name in category_weights:
+        store.init_category_if_not_exists(category_name)
+    print(f"🎯 目标分类: {', '.join(f'{c} (权重 {w})' for c, w in category_weights.items())}")
+    
+    # 3. 检查分类结果
+    with metrics.timer("load"):
+        load_classification(store, list(category_weights))
+    
+    # 4. 显示上次下载信息；之前已下载、后来才归入目标分类的视频补充归属
+    for category_name in category_weights:
+        print_last_downloaded(store, category_name)
+        for video_id, file_path in store.attribute_downloaded(category_name):
+            link_into_categories(file_path, [category_name])
+    
+    # 5. 从各分类取出接下来未下载的视频，按权重生成去重后的工作队列
+    with metrics.timer("load"):
+        queue = build_work_queue(
+            lambda category, n: store.next_undownloaded(category, n, MAX_DOWNLOAD_FAILURES, NEAR_DUPLICATES),
+            category_weights,
+            BATCH_SIZE,
+        )
+    if not queue:
+        print("✅ 目标分类中没有待下载的视频（已全部下载，或失败次数已达上限）")
+        return Counter()
+    categories = store.get_item_categories([item.video_id for item in queue])
+    for item in queue:
+        item.categories = categories.get(item.video_id, item.categories)
+    # 近似重复的视频直接沿用同组已下载视频的中文 Prompt
+    duplicate_translations = store.get_duplicate_translations([item.video_id for item in queue])
+    tasks = [{'id': item.video_id, 'content': item.content} for item in queue]
     
-    # 7. 显示下载统计
+    print(f"🎯 准备下载 {len(tasks)} 个视频")
+    print(f"⚡ 并发数: {MAX_WORKERS}")
+    print("=" * 80)
+    
+    outcomes = Counter()
+    
+    # 6. 并发下载，结果按队列顺序返回
+    results = download_videos_concurrently(tasks, MAX_WORKERS)
+    for item, (_, success, file_path) in zip(queue, results):
+        outcome = record_download(store, item, success, file_path, translator,
+                                  duplicate_translations.get(item.video_id))
+        outcomes[outcome] += 1
+    
+    # 7. 提交本批写入并显示下载统计
+    with metrics.timer("save"):
+        store.flush()
     print("\n" + "=" * 80)
     print("📊 下载统计:")
-    print(f"   ✅ 成功: {success_count} 个")
-    print(f"   ❌ 失败: {failed_count} 个")
-    
-    new_index = get_current_sequence(TARGET_CATEGORY)
-    print(f"   📈 '{TARGET_CATEGORY}' 分类进度: {new_index}/{total_videos} ({int(new_index/total_videos*100)}%)")
+    print(f"   ✅ 成功: {outcomes['success']} 个")
+    print(f"   ❌ 失败: {outcomes['failed']} 个")
+    if outcomes['deferred']:
+        print(f"   🛑 CDN 熔断暂缓: {outcomes['deferred']} 个（下一轮重试）")
+    print(f"   🚦 {rate_controller.summary()}")
     
-    if new_index < total_videos:
-        print(f"   💡 还有 {total_videos - new_index} 个视频待下载")
-    else:
-        print(f"   🎉 '{TARGET_CATEGORY}' 分类所有视频已下载完成！")
+    counts = store.category_counts()
+    for category_name in category_weights:
+        total_videos, downloaded = counts.get(category_name, (0, 0))
+        percent = int(downloaded / total_videos * 100) if total_videos else 100
+        print(f"   📈 '{category_name}' 分类进度: {downloaded}/{total_videos} ({percent}%)")
+        if downloaded < total_videos:
+            print(f"   💡 还有 {total_videos - downloaded} 个视频待下载")
+        else:
+            print(f"   🎉 '{category_name}' 分类所有视频已下载完成！")
     print("=" * 80)
+    return outcomes
+
+
+def main():
+    """
+    主函数 - 一次并发下载 BATCH_SIZE 个视频（多个分类按权重分配）
+
+    CDN 熔断，或本轮有视频要下载却一个都没成功时返回 1，便于 cron 等发现问题。
+    """
+    print("=" * 80)
+    print("🎬 Midjourney 视频批量下载器 (分类版)")
+    print("=" * 80)
+    
+    try:
+        outcomes = run(TARGET_CATEGORIES)
+    finally:
+        write_report(metrics, METRICS_DIR)
+    if outcomes['deferred'] or (outcomes['failed'] and not outcomes['success']):
+        return 1
+    return 0
+
+
+def run(category_weights):
+    """打开数据库下载一轮，返回各结果的数量；开启翻译时同时在后台翻译新视频并补翻历史记录"""
+    # 1. 打开数据库（自动迁移到最新 schema）
+    with DownloadStore(DB_FILE) as store:
+        print("✅ 数据库初始化完成")
+        if not TRANSLATE_PROMPTS:
+            return download_categories(store, category_weights)
+        
+        with BackgroundTranslator(store, max_workers=TRANSLATION_WORKERS, metrics=metrics) as translator:
+            # 顺带补翻历史记录，与下载并行进行
+            backlog = store.get_untranslated(TRANSLATION_BACKFILL_LIMIT)
+            for video_id, prompt_content in backlog:
+                translator.submit(video_id, prompt_content)
+            if backlog:
+                print(f"🌐 后台补翻 {len(backlog)} 条历史 Prompt")
+            
+            outcomes = download_categories(store, category_weights, translator)
+            print("⏳ 等待后台翻译完成...")
+        print(f"🌐 本轮翻译回填 {translator.translated_count} 条 Prompt")
+    return outcomes
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    exit(main())
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+本地的 Gemini 替身，用于离线调试和测试分类流程
+
+FakeGemini 模仿 google.generativeai 模块的 GenerativeModel 接口（含 system_instruction
+与 caching.CachedContent 显式上下文缓存）：generate_content() 从提示词中取出输入 JSON，
+按关键词给每条数据归类，等待 latency 秒后返回与真实接口相同结构的 JSON 文本，
+并按估算的 token 数填写 usage_metadata（来自上下文缓存的部分计为缓存命中）。
+输入为 [[序号, 内容], ...] 时按紧凑协议返回 {序号: [分类代码]}，代码表取自提示词。
+同时统计调用次数和最大并发数，便于验证并发与限流设置。
+
+设置环境变量 GEMINI_FAKE=1 后 classify_prompts 会改用它，不需要 API key。
+"""
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from dynamic_image.batching import estimate_tokens
+
+
+# 分类关键词（摘自 prompt.md 的分类标准）
+FAKE_KEYWORDS: Dict[str, List[str]] = {
+    "日漫风格": ["anime", "manga", "cel shaded", "cartoon"],
+    "奇幻，异世界风格": ["magic", "dragon", "elf", "fantasy", "castle"],
+    "科幻风格": ["space", "alien", "spaceship", "futuristic", "robot"],
+    "赛博朋克风格": ["cyberpunk", "neon", "cyborg"],
+    "复古风格": ["retro", "vintage", "vhs", "film grain", "polaroid"],
+    "北欧风格": ["scandinavian", "nordic", "minimalism", "hygge"],
+    "美女": ["girl", "woman", "female", "lady"],
+    "帅哥": ["boy", " man", "male", "guy"],
+    "动物萌宠": ["cat", "dog", "animal", "pet", "bird", "horse"],
+    "情侣": ["couple", "lovers", "kiss", "wedding"],
+}
+
+_JSON_BLOCK = re.compile(r"```json\s*(.*?)```", re.S)
+# 紧凑协议的代码表行，例如 "- A: 日漫风格"
+_CODE_LINE = re.compile(r"^- ([A-Z]): (.+)$", re.M)
+
+
+class FakeResponse:
+    """模仿 GenerateContentResponse，只提供 text 和 usage_metadata"""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, cached_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            cached_content_token_count=cached_tokens,
+            candidates_token_count=estimate_tokens(text),
+        )
+
+
+class FakeGemini:
+    """
+    google.generativeai 的替身
+
+    - latency: 每次调用的模拟耗时（秒）
+    - max_items: 单次调用最多能完整输出的条目数，超出时返回被截断的 JSON（模拟输出 token 超限）
+    """
+
+    def __init__(self, latency: float = 0.5, max_items: Optional[int] = None):
+        self.latency = latency
+        self.max_items = max_items
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.models_created = 0
+        self.cached_contents: List["_FakeCachedContent"] = []
+        self._lock = threading.Lock()
+        # 与 genai.GenerativeModel / genai.caching.CachedContent 同样的调用方式
+        self.GenerativeModel = _FakeModelFactory(self)
+        self.caching = SimpleNamespace(CachedContent=SimpleNamespace(create=self._create_cached_content))
+
+    def configure(self, **kwargs):
+        """与 genai.configure 同名，替身不需要 API key"""
+
+    def _create_cached_content(self, model: str, system_instruction: str = "", **kwargs):
+        cached = _FakeCachedContent(model, system_instruction)
+        self.cached_contents.append(cached)
+        return cached
+
+    @staticmethod
+    def match(content: str) -> List[str]:
+        """按关键词匹配分类，最多 3 个，都不匹配时为 ["未分类"]"""
+        text = f" {content.lower()}"
+        matched = [c for c, words in FAKE_KEYWORDS.items() if any(w in text for w in words)]
+        return matched[:3] or ["未分类"]
+
+    def classify(self, items: List[Dict]) -> Dict[str, List[Dict]]:
+        """按原始协议分类，返回 {分类: [{id, content}]}"""
+        result: Dict[str, List[Dict]] = {category: [] for category in FAKE_KEYWORDS}
+        result["未分类"] = []
+        for item in items:
+            decoded = item.get("prompt", {}).get("decodedPrompt") or [{}]
+            content = decoded[0].get("content", "")
+            for category in self.match(content):
+                result[category].append({"id": item.get("id"), "content": content[:50]})
+        return result
+
+    def classify_compact(self, rows: List[List], codes: Dict[str, str]) -> Dict[str, List[str]]:
+        """按紧凑协议分类，返回 {序号: [分类代码]}"""
+        return {str(index): [codes[c] for c in self.match(content) if c in codes] for index, content in rows}
+
+    def _generate(self, prompt: str, cached_tokens: int = 0) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            # prompt.md 自带（未闭合的）示例代码块，输入数据在最后一个 json 代码块中
+            match = _JSON_BLOCK.search(prompt, prompt.rfind("```json"))
+            items = json.loads(match.group(1)) if match else []
+            if items and isinstance(items[0], list):
+                codes = {name: code for code, name in _CODE_LINE.findall(prompt)}
+                text = json.dumps(self.classify_compact(items, codes), separators=(",", ":"))
+            else:
+                text = json.dumps(self.classify(items), ensure_ascii=False)
+            if self.max_items is not None and len(items) > self.max_items:
+                text = text[:len(text) * self.max_items // len(items)]
+            return FakeResponse(text, estimate_tokens(prompt), cached_tokens)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class _FakeCachedContent:
+    def __init__(self, model: str, system_instruction: str):
+        self.model = model
+        self.system_instruction = system_instruction
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+
+class _FakeModelFactory:
+    """genai.GenerativeModel 的替身：可直接调用，也可 from_cached_content"""
+
+    def __init__(self, service: FakeGemini):
+        self.service = service
+
+    def __call__(self, model_name: str = "", generation_config=None, system_instruction: str = "", **kwargs):
+        with self.service._lock:
+            self.service.models_created += 1
+        return _FakeModel(self.service, model_name, generation_config or {}, system_instruction)
+
+    def from_cached_content(self, cached_content: _FakeCachedContent, generation_config=None, **kwargs):
+        model = self(cached_content.model, generation_config, cached_content.system_instruction)
+        model.cached = True
+        return model
+
+
+class _FakeModel:
+    def __init__(self, service: FakeGemini, model_name: str, generation_config: Dict, system_instruction: str = ""):
+        self.service = service
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        self.cached = False
+
+    def generate_content(self, prompt: str) -> FakeResponse:
+        cached_tokens = estimate_tokens(self.system_instruction) if self.cached else 0
+        return self.service._generate(f"{self.system_instruction}\n{prompt}", cached_tokens)
@@ -0,0 +1,148 @@
+"""
+长期复用的 Gemini 分类模型
+
+GeminiClassifier 在整个分类过程中只创建一次模型，prompt.md（分类标准）作为静态部分
+只交给模型一次，每次请求只发送本批的输入数据。静态部分的交付方式可以替换：
+
+- SystemInstructionPrompt: 作为 system_instruction。每次请求仍会计入输入 token，
+  但它是固定的前缀，支持隐式缓存的模型可以直接命中；
+- ContextCachePrompt: 放进 Gemini 显式上下文缓存（CachedContent），请求只引用缓存，
+  缓存部分按折扣计费。prompt 短于模型要求的最小缓存长度时创建会失败，自动退回 system_instruction。
+
+每次调用都按响应中的 usage_metadata 记录输入 / 缓存命中 / 输出 token 与耗时，summary() 汇总节省情况。
+"""
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+from dynamic_image.batching import estimate_tokens
+
+
+# 显式上下文缓存的有效期（秒）
+CONTEXT_CACHE_TTL = 3600
+
+
+class SystemInstructionPrompt:
+    """把静态 prompt 作为 system_instruction"""
+
+    name = "system_instruction"
+
+    def create_model(self, backend, model_name: str, generation_config: Dict, system_prompt: str):
+        return backend.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+            system_instruction=system_prompt,
+        )
+
+    def close(self):
+        pass
+
+
+class ContextCachePrompt:
+    """把静态 prompt 放进 Gemini 显式上下文缓存，close() 时删除缓存"""
+
+    name = "context_cache"
+
+    def __init__(self, ttl_seconds: int = CONTEXT_CACHE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self.cached_content = None
+
+    def create_model(self, backend, model_name: str, generation_config: Dict, system_prompt: str):
+        self.cached_content = backend.caching.CachedContent.create(
+            model=model_name,
+            system_instruction=system_prompt,
+            ttl=timedelta(seconds=self.ttl_seconds),
+        )
+        return backend.GenerativeModel.from_cached_content(
+            cached_content=self.cached_content,
+            generation_config=generation_config,
+        )
+
+    def close(self):
+        if self.cached_content is not None:
+            try:
+                self.cached_content.delete()
+            except Exception as e:
+                print(f"⚠️  删除 Gemini 上下文缓存失败: {e}")
+            self.cached_content = None
+
+
+PROMPT_STRATEGIES = {
+    SystemInstructionPrompt.name: SystemInstructionPrompt,
+    ContextCachePrompt.name: ContextCachePrompt,
+}
+
+
+class GeminiClassifier:
+    """
+    只创建一次模型的 Gemini 调用封装，可在多个线程中并发使用
+
+    - backend: google.generativeai 模块或 FakeGemini
+    - system_prompt: 每批相同的静态部分（prompt.md 与协议说明）
+    - prompt_strategy: 静态部分的交付方式，默认 SystemInstructionPrompt
+    """
+
+    def __init__(self, backend, system_prompt: str, model_name: str, generation_config: Dict,
+                 prompt_strategy=None):
+        self.model_name = model_name
+        self.strategy = prompt_strategy or SystemInstructionPrompt()
+        try:
+            self.model = self.strategy.create_model(backend, model_name, generation_config, system_prompt)
+        except Exception as e:
+            if isinstance(self.strategy, SystemInstructionPrompt):
+                raise
+            print(f"⚠️  无法使用 {self.strategy.name} ({e})，改用 system_instruction")
+            self.strategy = SystemInstructionPrompt()
+            self.model = self.strategy.create_model(backend, model_name, generation_config, system_prompt)
+        self.static_tokens = estimate_tokens(system_prompt)
+
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.total_latency = 0.0
+        self._lock = threading.Lock()
+
+    def generate(self, contents: str) -> str:
+        """发送一次请求（只含本批输入），返回模型输出的文本"""
+        started = time.monotonic()
+        response = self.model.generate_content(contents)
+        elapsed = time.monotonic() - started
+        usage = getattr(response, 'usage_metadata', None)
+        with self._lock:
+            self.calls += 1
+            self.total_latency += elapsed
+            if usage is not None:
+                self.prompt_tokens += getattr(usage, 'prompt_token_count', 0) or 0
+                self.cached_tokens += getattr(usage, 'cached_content_token_count', 0) or 0
+                self.output_tokens += getattr(usage, 'candidates_token_count', 0) or 0
+        return response.text
+
+    def summary(self) -> str:
+        """本次运行的调用统计"""
+        if not self.calls:
+            return f"Gemini ({self.strategy.name}) 未发出请求"
+        cached_share = self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        return (
+            f"Gemini ({self.strategy.name}) 模型创建 1 次、调用 {self.calls} 次，"
+            f"平均耗时 {self.total_latency / self.calls:.1f} 秒；"
+            f"输入 {self.prompt_tokens} token（缓存命中 {self.cached_tokens}，{cached_share:.0%}），"
+            f"输出 {self.output_tokens} token；静态 prompt 约 {self.static_tokens} token/次"
+        )
+
+    def close(self):
+        self.strategy.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def new_prompt_strategy(name: Optional[str]):
+    """按名称创建静态 prompt 的交付方式（system_instruction / context_cache）"""
+    if name not in PROMPT_STRATEGIES:
+        raise ValueError(f"未知的 prompt 交付方式: {name}，可选: {', '.join(PROMPT_STRATEGIES)}")
+    return PROMPT_STRATEGIES[name]()
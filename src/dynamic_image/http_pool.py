@@ -0,0 +1,181 @@
+"""
+共享的 HTTP 会话池
+
+download_vedio 和 search_player 都通过这里发请求，复用长连接（keep-alive，
+curl_cffi 下可走 HTTP/2），按主机限制同时占用的连接数，并统一超时配置。
+"""
+import threading
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+
+# 默认配置
+DEFAULT_IMPERSONATE = "chrome120"
+DEFAULT_MAX_PER_HOST = 6
+DEFAULT_TIMEOUT = (10, 30)  # (连接超时, 读取超时) 秒
+# requests backend 下 fetch 每次读取的块大小
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# 进程内共享的会话池，按 backend 区分
+_shared_pools: Dict[str, "SessionPool"] = {}
+_shared_lock = threading.Lock()
+
+
+class SessionPool:
+    """
+    可在多线程间共享的会话池
+
+    - backend="curl_cffi": 带浏览器 TLS 指纹伪装，每个线程持有一个 Session
+      （curl_cffi 的 Session 不是线程安全的），线程池复用时连接也随之复用；
+    - backend="requests": 所有线程共享一个 Session，底层 urllib3 连接池按主机复用。
+
+    每个主机同时进行中的请求数不超过 max_per_host，超出时阻塞等待。
+    """
+
+    def __init__(
+        self,
+        backend: str = "curl_cffi",
+        impersonate: Optional[str] = DEFAULT_IMPERSONATE,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        timeout=DEFAULT_TIMEOUT,
+        http2: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        if backend not in ("curl_cffi", "requests"):
+            raise ValueError(f"不支持的 backend: {backend}")
+        self.backend = backend
+        self.impersonate = impersonate
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.http2 = http2
+        self.chunk_size = chunk_size
+
+        self._local = threading.local()
+        self._shared_session = None
+        self._sessions = []
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        """按 backend 创建一个新的会话"""
+        if self.backend == "curl_cffi":
+            from curl_cffi import requests as curl_requests
+            from curl_cffi.const import CurlHttpVersion
+
+            options = {}
+            if self.impersonate:
+                options["impersonate"] = self.impersonate
+            if not self.http2:
+                options["http_version"] = CurlHttpVersion.V1_1
+            return curl_requests.Session(**options)
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.max_per_host)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _session(self):
+        """取得当前线程可用的会话，首次使用时创建"""
+        if self.backend == "requests":
+            with self._lock:
+                if self._shared_session is None:
+                    self._shared_session = self._create_session()
+                    self._sessions.append(self._shared_session)
+                return self._shared_session
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._create_session()
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        """取得目标主机的并发名额"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def fetch(self, method: str, url: str, on_chunk: Callable[[bytes], object],
+              on_start: Optional[Callable[[int, int], object]] = None, **kwargs):
+        """
+        发请求并把响应体逐块交给 on_chunk，返回不含响应体的 Response
+
+        curl_cffi 的 stream=True 会复制出新的 curl 句柄、每次都重新建连，
+        所以这里改用 content_callback 在会话自己的句柄上接收数据，连接得以复用。
+        on_start(状态码, content-length) 在第一块数据到达前调用（响应体为空时不调用），
+        可用于预分配空间、显示进度；调用方仍需在返回后检查完整的响应头。
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._slot(url):
+            session = self._session()
+            if self.backend == "curl_cffi":
+                callback = on_chunk
+                if on_start is not None:
+                    from curl_cffi.const import CurlInfo
+
+                    started = False
+
+                    def notify_start(chunk):
+                        nonlocal started
+                        if not started:
+                            started = True
+                            curl = session.curl
+                            on_start(
+                                curl.getinfo(CurlInfo.RESPONSE_CODE),
+                                max(0, int(curl.getinfo(CurlInfo.CONTENT_LENGTH_DOWNLOAD_T))),
+                            )
+                        on_chunk(chunk)
+
+                    callback = notify_start
+
+                return session.request(method, url, content_callback=callback, **kwargs)
+
+            response = session.request(method, url, stream=True, **kwargs)
+            try:
+                if on_start is not None:
+                    on_start(response.status_code, int(response.headers.get("content-length", 0)))
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        on_chunk(chunk)
+            finally:
+                response.close()
+            return response
+
+    def request(self, method: str, url: str, **kwargs):
+        """发送普通请求，返回已读完响应体的 Response"""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._slot(url):
+            return self._session().request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        """GET 请求的快捷方式"""
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        """关闭本池创建的所有会话"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self._shared_session = None
+        self._local = threading.local()
+        for session in sessions:
+            session.close()
+
+
+def get_session_pool(backend: str = "curl_cffi", **options) -> SessionPool:
+    """
+    获取进程内共享的会话池
+
+    同一个 backend 只会创建一次，options 仅在首次创建时生效。
+    """
+    with _shared_lock:
+        if backend not in _shared_pools:
+            _shared_pools[backend] = SessionPool(backend=backend, **options)
+        return _shared_pools[backend]
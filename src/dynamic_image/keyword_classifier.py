@@ -0,0 +1,80 @@
+"""
+本地关键词预分类
+
+prompt.md 为每个分类列出了明确的关键词和 "最多 3 个分类" 的优先级规则，
+大部分 prompt 只靠关键词就能确定分类。KeywordClassifier 把所有关键词编译成一个正则，
+一次扫描即可找出全部命中的分类；只有非英文、没有命中或有歧义的 prompt 才需要交给 Gemini。
+"""
+import re
+from typing import Dict, List, Optional
+
+
+# 各分类的关键词（摘自 prompt.md；bright、cozy、natural light 这类过于常见的词会造成误判，未收录）
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "日漫风格": ["anime", "manga", "2d", "cel shaded", "cel-shaded", "illustration", "cartoon"],
+    "奇幻，异世界风格": ["magic", "magical", "dragon", "elf", "elves", "fantasy", "isekai", "castle",
+                  "mystical", "surreal", "spirit world"],
+    "科幻风格": ["space", "alien", "spaceship", "futuristic", "tech", "robot"],
+    "赛博朋克风格": ["cyberpunk", "neon", "high tech low life", "cyborg", "mechanical limbs", "night city"],
+    "复古风格": ["retro", "vintage", "80s", "90s", "vhs", "cctv", "film grain", "polaroid",
+              "old footage", "analog", "analogue"],
+    "北欧风格": ["scandinavian", "nordic", "minimalism", "minimalist", "white interior", "clean lines",
+              "wood texture", "hygge", "beige tones"],
+    "美女": ["girl", "woman", "women", "female", "lady", "ladies", "beauty"],
+    "帅哥": ["boy", "man", "men", "male", "guy", "handsome", "gentleman", "gentlemen"],
+    "动物萌宠": ["cat", "kitten", "dog", "puppy", "lion", "animal", "pet", "creature", "bird", "horse",
+              "jellyfish"],
+    "情侣": ["couple", "lovers", "romantic", "relationship", "kiss", "kissing", "hugging", "wedding",
+           "dating", "intimate"],
+}
+
+# 超过 3 个分类时按此顺序保留：强烈的视觉风格 > 核心主体 > 次要元素。
+# "情侣" 排在性别标签之前，符合 prompt.md 中优先保留组合概念的示例。
+CATEGORY_PRIORITY: List[str] = [
+    "赛博朋克风格", "日漫风格", "北欧风格",
+    "情侣", "美女", "动物萌宠",
+    "奇幻，异世界风格", "科幻风格", "复古风格", "帅哥",
+]
+
+# 否定词会改变关键词的含义（"no people"、"without a cat"），这类 prompt 交给 Gemini
+NEGATION_PATTERN = re.compile(r"\b(?:no|not|without|never)\b", re.I)
+
+
+class KeywordClassifier:
+    """
+    关键词预分类器
+
+    classify() 返回命中的分类中优先级最高的 max_categories 个；
+    无法可靠判断时返回 None，表示应交给 Gemini：
+    - 含非英文字母（需要先翻译）；
+    - 没有命中任何关键词；
+    - 含否定词（关键词的含义需要结合上下文）。
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]] = CATEGORY_KEYWORDS,
+                 priority: List[str] = CATEGORY_PRIORITY, max_categories: int = 3):
+        self.max_categories = max_categories
+        self._rank = {category: i for i, category in enumerate(priority)}
+        # 每个分类一个命名分组，整体编译成一个正则；长关键词排在前面，优先匹配短语
+        self._groups: Dict[str, str] = {}
+        alternatives = []
+        for i, (category, words) in enumerate(keywords.items()):
+            group = f"c{i}"
+            self._groups[group] = category
+            words = sorted(words, key=len, reverse=True)
+            alternatives.append(f"(?P<{group}>{'|'.join(re.escape(w) for w in words)})")
+        self._pattern = re.compile(rf"\b(?:{'|'.join(alternatives)})(?:s|es)?\b", re.I)
+
+    def match(self, text: str) -> List[str]:
+        """返回命中的全部分类，按优先级排序"""
+        found = {self._groups[m.lastgroup] for m in self._pattern.finditer(text)}
+        return sorted(found, key=lambda c: self._rank.get(c, len(self._rank)))
+
+    def classify(self, text: str) -> Optional[List[str]]:
+        """返回本地确定的分类列表，需要交给 Gemini 时返回 None"""
+        if any(ch.isalpha() and not ch.isascii() for ch in text):
+            return None
+        categories = self.match(text)
+        if not categories or NEGATION_PATTERN.search(text):
+            return None
+        return categories[:self.max_categories]
@@ -0,0 +1,224 @@
+"""
+运行指标：分阶段计时、计数器与耗时直方图
+
+classify_prompts 与 download_vedio 各持有一个模块级的 Metrics，在各阶段埋点：
+- timer(阶段): 记录该阶段每次执行的耗时（直方图 stage_seconds{stage=...}）；
+- inc(名称, 值, 标签): 计数器，例如条目数、token 数、字节数、重试次数、HTTP 状态码；
+- observe(名称, 秒, 标签): 其他耗时直方图，例如单次 Gemini 请求、单个视频的下载。
+
+运行结束时 write() 输出两份文件：
+- {名称}_{时间戳}.json: 本次运行的汇总，便于比较不同运行之间的回归（只保留最近 METRICS_KEEP 份）；
+- {名称}.prom: Prometheus textfile collector 格式（node_exporter --collector.textfile.directory），
+  每次运行覆盖写入。
+
+所有方法都是线程安全的，可以在下载、分类的工作线程中直接调用。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+# 指标名前缀
+METRIC_PREFIX = "dynamic_image"
+# 耗时直方图的桶上界（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 每个名称保留的 JSON 汇总份数，更早的在写入新文件后删除
+METRICS_KEEP = 20
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """固定桶的直方图，bucket_counts[i] 为落在 (buckets[i-1], buckets[i]] 内的次数，最后一个为 +Inf"""
+
+    __slots__ = ("buckets", "bucket_counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """按桶估算分位数（取所在桶的上界），没有数据时为 0"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.bucket_counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """一次运行的指标集合"""
+
+    def __init__(self, name: str, clock=time.monotonic):
+        self.name = name
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器加上 value"""
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """记录一次耗时"""
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """统计 with 块的耗时，计入 stage_seconds{stage=...}（块内抛出异常也会计入）"""
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", self._clock() - started, stage=stage)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get((name, _labels(labels)), 0)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """各阶段累计耗时（秒）；并发执行的阶段按各线程耗时之和计"""
+        return {
+            dict(labels)["stage"]: histogram.sum
+            for (name, labels), histogram in self.histograms.items() if name == "stage_seconds"
+        }
+
+    # ---------- 输出 ----------
+
+    def to_dict(self) -> Dict:
+        """JSON 汇总：计数器、直方图（次数、总和、p50、p95）与总耗时"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "finished_at": datetime.now().isoformat(timespec='seconds'),
+                "wall_seconds": round(self._clock() - self._started, 3),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": h.count, "sum": round(h.sum, 6),
+                     "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                    for (name, labels), h in sorted(self.histograms.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            wall = self._clock() - self._started
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{self.name}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), histogram in histograms:
+            metric = f"{METRIC_PREFIX}_{self.name}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.bucket_counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else _format_value(bound)
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        metric = f"{METRIC_PREFIX}_{self.name}_last_run_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {_format_value(wall)}")
+        metric = f"{METRIC_PREFIX}_{self.name}_last_run_timestamp_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {int(time.time())}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, keep: int = METRICS_KEEP) -> Tuple[Path, Path]:
+        """写出本次运行的 JSON 汇总和 Prometheus textfile，返回两个文件的路径；JSON 汇总只保留最近 keep 份"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        json_file = directory / f"{self.name}_{timestamp}.json"
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        # 时间戳按字典序即时间顺序
+        history = sorted(directory.glob(f"{self.name}_????????_??????.json"))
+        for old in history[:-max(1, keep)]:
+            old.unlink(missing_ok=True)
+
+        # textfile collector 可能随时读取，先写临时文件再原子替换
+        prom_file = directory / f"{self.name}.prom"
+        tmp_file = prom_file.with_name(prom_file.name + '.tmp')
+        tmp_file.write_text(self.to_prometheus(), encoding='utf-8')
+        os.replace(tmp_file, prom_file)
+        return json_file, prom_file
+
+    def summary(self) -> str:
+        """各阶段耗时的一行摘要，按耗时从大到小"""
+        totals = sorted(self.stage_totals().items(), key=lambda kv: -kv[1])
+        stages = "，".join(f"{stage} {seconds:.1f}s" for stage, seconds in totals) or "无"
+        return f"总耗时 {self._clock() - self._started:.1f}s；各阶段: {stages}"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def write_report(metrics: Metrics, directory) -> None:
+    """打印各阶段耗时并写出指标文件；写入失败不影响主流程"""
+    print(f"⏱️  {metrics.summary()}")
+    try:
+        json_file, prom_file = metrics.write(directory)
+    except OSError as e:
+        print(f"⚠️  写入运行指标失败: {e}")
+        return
+    print(f"📈 运行指标已保存到: {json_file}（Prometheus: {prom_file}）")
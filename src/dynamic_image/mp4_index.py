@@ -0,0 +1,219 @@
+"""
+MP4 元数据索引
+
+不借助 ffprobe、不读取媒体数据，直接解析 MP4 (ISO-BMFF) 的 box 结构：
+- 用 mmap 映射文件，顶层只读取每个 box 的 8 / 16 字节头并跳过内容（mdat 不会被读入内存）；
+- 只解析 moov 中需要的部分：mvhd（时长）、tkhd（分辨率）、hdlr（轨道类型）、stsd（编码）；
+- faststart: moov 是否位于 mdat 之前（浏览器边下边播需要）；
+- complete: 所有顶层 box 都在文件范围内、有 moov 和 mdat。下载被截断时最后一个 box 会越过文件末尾，
+  或者 moov（非 faststart 文件位于末尾）缺失，只需读几个 box 头就能发现。
+
+scan_downloads() 用进程池批量扫描 downloaded_videos 中的文件，把结果写入数据库中带索引的列，
+之后按时长、分辨率、编码筛选视频只需查询数据库：
+    python src/dynamic_image/mp4_index.py
+"""
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# 扫描用的进程数，None 表示 CPU 核数
+SCAN_WORKERS: Optional[int] = None
+# 每个进程一次领取的文件数
+SCAN_CHUNK_SIZE = 16
+
+
+class Mp4Info:
+    """一个 MP4 文件的元数据；无法解析时 error 为原因，其余字段可能为 None"""
+
+    __slots__ = ("file_size", "duration", "width", "height", "codec", "faststart", "complete", "error")
+
+    def __init__(self, file_size: int = 0, duration: Optional[float] = None, width: Optional[int] = None,
+                 height: Optional[int] = None, codec: Optional[str] = None, faststart: bool = False,
+                 complete: bool = False, error: Optional[str] = None):
+        self.file_size = file_size
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.codec = codec
+        self.faststart = faststart
+        self.complete = complete
+        self.error = error
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Mp4Info({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+
+def iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """
+    遍历 [start, end) 范围内的 box，产出 (类型, box 起点, 内容起点, box 终点)
+
+    box 终点可能超过 end（文件被截断），由调用方判断；头部本身不完整时停止遍历。
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", buf, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset, offset + header, offset + size
+        offset += size
+
+
+def _find(buf, start: int, end: int, path: List[bytes]) -> Optional[Tuple[int, int]]:
+    """按路径查找第一个匹配的子 box，返回其内容范围"""
+    for box_type, _, body, box_end in iter_boxes(buf, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return body, min(box_end, end)
+            return _find(buf, body, min(box_end, end), path[1:])
+    return None
+
+
+def _parse_mvhd(buf, body: int) -> Optional[float]:
+    version = buf[body]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, body + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, body + 12)
+    return duration / timescale if timescale else None
+
+
+def _parse_tkhd(buf, body: int) -> Tuple[int, int]:
+    """tkhd 中的宽高（16.16 定点数）"""
+    version = buf[body]
+    # version/flags 4 + 时间与 track_id 等（v0: 20 字节，v1: 32 字节）+ reserved 8 + layer/alternate/volume/reserved 8 + matrix 36
+    offset = body + 4 + (32 if version == 1 else 20) + 8 + 8 + 36
+    width, height = struct.unpack_from(">II", buf, offset)
+    return width >> 16, height >> 16
+
+
+def _parse_trak(buf, body: int, end: int) -> Tuple[Optional[bytes], Optional[str], int, int]:
+    """返回 (轨道类型, 编码, 宽, 高)"""
+    width = height = 0
+    tkhd = _find(buf, body, end, [b"tkhd"])
+    if tkhd:
+        width, height = _parse_tkhd(buf, tkhd[0])
+    handler = None
+    hdlr = _find(buf, body, end, [b"mdia", b"hdlr"])
+    if hdlr:
+        handler = bytes(buf[hdlr[0] + 8:hdlr[0] + 12])
+    codec = None
+    stsd = _find(buf, body, end, [b"mdia", b"minf", b"stbl", b"stsd"])
+    if stsd:
+        # version/flags 4 + entry_count 4，之后第一个条目的类型即编码
+        for entry_type, _, _, _ in iter_boxes(buf, stsd[0] + 8, stsd[1]):
+            codec = entry_type.decode("latin-1")
+            break
+    return handler, codec, width, height
+
+
+def _parse_moov(info: Mp4Info, buf, body: int, end: int):
+    mvhd = _find(buf, body, end, [b"mvhd"])
+    if mvhd:
+        info.duration = _parse_mvhd(buf, mvhd[0])
+    for box_type, _, trak_body, trak_end in iter_boxes(buf, body, end):
+        if box_type != b"trak":
+            continue
+        handler, codec, width, height = _parse_trak(buf, trak_body, min(trak_end, end))
+        if handler == b"vide" or (handler is None and width and info.width is None):
+            info.width, info.height, info.codec = width or None, height or None, codec
+            if handler == b"vide":
+                break
+
+
+def probe(path: str) -> Mp4Info:
+    """解析一个 MP4 文件；文件不存在、不是 MP4 或被截断时 complete 为 False"""
+    try:
+        file_size = os.path.getsize(path)
+    except OSError as e:
+        return Mp4Info(error=f"无法读取文件: {e}")
+    info = Mp4Info(file_size=file_size)
+    if file_size < 8:
+        info.error = "文件为空或过短"
+        return info
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            _probe_buffer(info, buf, file_size)
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        info.complete = False
+        info.error = f"解析失败: {e}"
+    return info
+
+
+def _probe_buffer(info: Mp4Info, buf, file_size: int):
+    seen = []
+    truncated = False
+    end = 0
+    for box_type, _, body, box_end in iter_boxes(buf, 0, file_size):
+        seen.append(box_type)
+        end = box_end
+        if box_end > file_size:
+            truncated = True
+            break
+        if box_type == b"moov":
+            _parse_moov(info, buf, body, box_end)
+    if not seen or seen[0] != b"ftyp":
+        info.error = "不是 MP4 文件（缺少 ftyp）"
+        return
+    has_moov, has_mdat = b"moov" in seen, b"mdat" in seen
+    info.faststart = has_moov and has_mdat and seen.index(b"moov") < seen.index(b"mdat")
+    if truncated:
+        info.error = f"文件被截断（需要 {end} 字节，实际 {file_size} 字节）"
+    elif end != file_size:
+        info.error = "文件末尾有不完整的 box"
+    elif not has_moov:
+        info.error = "缺少 moov"
+    elif not has_mdat:
+        info.error = "缺少 mdat"
+    info.complete = info.error is None
+
+
+def scan_files(paths: List[str], workers: Optional[int] = SCAN_WORKERS) -> List[Mp4Info]:
+    """用进程池解析多个文件，结果与 paths 一一对应；文件较少时直接在当前进程解析"""
+    if len(paths) <= SCAN_CHUNK_SIZE or workers == 1:
+        return [probe(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(probe, paths, chunksize=SCAN_CHUNK_SIZE))
+
+
+def scan_downloads(store, rescan: bool = False, workers: Optional[int] = SCAN_WORKERS) -> Dict[str, int]:
+    """扫描 downloaded_videos 中尚未扫描（rescan 时为全部）的文件并写入元数据，返回统计"""
+    files = store.get_files_to_scan(rescan)
+    results = scan_files([file_path for _, file_path in files], workers)
+    store.save_video_metadata({video_id: info for (video_id, _), info in zip(files, results)})
+    store.flush()
+    incomplete = [(video_id, info) for (video_id, _), info in zip(files, results) if not info.complete]
+    for video_id, info in incomplete:
+        print(f"⚠️  {video_id}: {info.error}")
+    return {"scanned": len(files), "incomplete": len(incomplete)}
+
+
+def main():
+    """扫描下载目录中全部视频的元数据"""
+    from dynamic_image.download_store import DownloadStore
+    from dynamic_image.download_vedio import DB_FILE
+
+    print("=" * 80)
+    print("🎞️  扫描已下载视频的 MP4 元数据")
+    print("=" * 80)
+    with DownloadStore(DB_FILE) as store:
+        stats = scan_downloads(store)
+    print(f"✅ 扫描 {stats['scanned']} 个文件，不完整 {stats['incomplete']} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,93 @@
+"""
+近似重复 prompt 检测（SimHash + 分段索引）
+
+Midjourney 的 feed 里有大量几乎相同的 prompt（重新生成、只改了几个词）。
+每条 prompt 取单词集合的 64 位 SimHash 指纹，两条 prompt 指纹的汉明距离
+不超过 max_distance 即视为近似重复。
+
+查找不需要两两比较：把指纹切成 max_distance + 1 段，距离不超过 max_distance 的两个指纹
+至少有一段完全相同（抽屉原理），因此只需和每段相同的已有指纹比较。
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+
+# 指纹位数
+FINGERPRINT_BITS = 64
+# 汉明距离不超过该值视为近似重复；越大召回越多，但分段越短、每次查找要比较的候选越多。
+# 在 images/source.json 上，改动一个词的 prompt 距离中位数约为 4，不相关的 prompt 距离在 9 以上
+DEFAULT_MAX_DISTANCE = 4
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    """计算文本的 64 位 SimHash 指纹（特征为去重后的小写单词，等权）"""
+    features = set(_TOKEN.findall(text.lower()))
+    if not features:
+        return 0
+    # 每一位取多数：把所有特征哈希写成二进制串，按列统计 1 的个数
+    columns = zip(*(format(_feature_hash(f), '064b') for f in features))
+    half = len(features) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in columns), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateIndex:
+    """
+    近似重复索引
+
+    add() 逐条加入 (id, 文本)：与已有条目重复（文本相同或指纹足够接近）时返回该组最早的 id，
+    并记入 duplicates；否则该条成为新的一组，返回 None。
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        # 各段的 (起始位, 掩码)，位数尽量均分
+        bounds = [FINGERPRINT_BITS * i // self.bands for i in range(self.bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        # 每段一个 {段的值: [(指纹, 代表 id)]}
+        self._buckets: List[Dict[int, List]] = [{} for _ in range(self.bands)]
+        # {文本摘要: 代表 id}，文本完全相同时不必再算指纹
+        self._by_text: Dict[bytes, str] = {}
+        # {重复条目的 id: 所在组代表的 id}
+        self.duplicates: Dict[str, str] = {}
+
+    def _bands_of(self, fingerprint: int):
+        for band, (start, mask) in enumerate(self._bands):
+            yield band, (fingerprint >> start) & mask
+
+    def find(self, fingerprint: int) -> Optional[str]:
+        """返回指纹距离最近（且不超过 max_distance）的代表 id"""
+        best, best_distance = None, self.max_distance + 1
+        for band, value in self._bands_of(fingerprint):
+            for other, representative in self._buckets[band].get(value, ()):
+                distance = hamming_distance(fingerprint, other)
+                if distance < best_distance:
+                    best, best_distance = representative, distance
+        return best
+
+    def add(self, item_id: str, text: str) -> Optional[str]:
+        """加入一条 prompt，返回它所属组的代表 id；它自己成为新组时返回 None"""
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        representative = self._by_text.get(key)
+        if representative is None:
+            fingerprint = simhash(text)
+            representative = self.find(fingerprint)
+            if representative is None:
+                for band, value in self._bands_of(fingerprint):
+                    self._buckets[band].setdefault(value, []).append((fingerprint, item_id))
+            self._by_text[key] = representative or item_id
+        if representative is None or representative == item_id:
+            return None
+        self.duplicates[item_id] = representative
+        return representative
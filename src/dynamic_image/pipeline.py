@@ -0,0 +1,250 @@
+"""
+分类—下载流水线
+
+classify_prompts 与 download_vedio 分开运行时，必须等全部数据分类完、写出结果文件后才能开始下载。
+流水线把两者连起来：每条数据一确定分类（本地规则 / 缓存 / 模型立即确定，Gemini 每返回一个批次），
+属于目标分类的视频就进入下载队列，由下载线程并发下载，新视频的 Prompt 同时在后台翻译。
+
+下载队列有长度上限：下载跟不上时分类暂停读取和发请求，内存占用不随数据量增长；
+总耗时接近较慢的那个阶段，而不是两者之和。
+
+配置沿用 classify_prompts.py（分类）与 download_vedio.py（目标分类、并发数、失败次数等）：
+    python src/dynamic_image/pipeline.py
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Callable, Container, Dict, List, Optional, Tuple
+
+from dynamic_image import classify_prompts, download_vedio
+from dynamic_image.classification_cache import ClassificationCache, content_hash
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.metrics import write_report
+from dynamic_image.near_duplicate import NearDuplicateIndex
+from dynamic_image.rate_limit import CircuitOpenError
+from dynamic_image.scheduler import WorkItem
+from dynamic_image.transfer import ProgressReporter
+from dynamic_image.translation import BackgroundTranslator
+
+
+# 分类与下载之间的队列长度：队列满时分类暂停，等待下载腾出位置
+PIPELINE_QUEUE_SIZE = 50
+# 本次最多下载的视频数，None 表示不限（分类仍会处理全部数据）
+PIPELINE_MAX_DOWNLOADS: Optional[int] = None
+
+_STOP = object()
+
+
+class DownloadStage:
+    """
+    下载阶段：workers 个线程从有界队列中取视频，下载后写库
+
+    - download_fn(video_id, content, progress) -> (成功状态, 文件路径)
+    - record_fn(item, 成功状态, 文件路径) -> "success" / "failed" / "deferred"
+    - max_downloads: 最多接收的视频数，达到后 submit() 返回 False
+
+    同一 id 只接收一次（源数据中有重复 id），重复提交直接忽略、不计入 max_downloads。
+    submit() 在队列满时阻塞，这就是对上游（分类）的背压。
+    """
+
+    def __init__(self, download_fn: Callable, record_fn: Callable, workers: int = 4,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, max_downloads: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.download_fn = download_fn
+        self.record_fn = record_fn
+        self.max_downloads = max_downloads
+        self.submitted = 0
+        self.scheduled = set()
+        self.outcomes: Counter = Counter()
+        self.first_success_after: Optional[float] = None
+        self.progress = ProgressReporter(interval=download_vedio.PROGRESS_INTERVAL)
+        self._clock = clock
+        self._started = clock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"pipeline-download-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def full(self) -> bool:
+        return self.max_downloads is not None and self.submitted >= self.max_downloads
+
+    def submit(self, item: WorkItem) -> bool:
+        """把视频放进下载队列（队列满时阻塞）；已达到 max_downloads 时返回 False"""
+        if item.video_id in self.scheduled:
+            return True
+        if self.full:
+            return False
+        self.scheduled.add(item.video_id)
+        self.submitted += 1
+        self._queue.put(item)
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                success, file_path = self.download_fn(item.video_id, item.content, self.progress)
+            except CircuitOpenError:
+                success, file_path = None, None
+            except Exception as e:
+                print(f"\n❌ {item.video_id} 下载异常: {e}")
+                success, file_path = False, None
+            try:
+                outcome = self.record_fn(item, success, file_path)
+            except Exception as e:
+                print(f"\n❌ {item.video_id} 写入下载记录失败: {e}")
+                outcome = "failed"
+            with self._lock:
+                self.outcomes[outcome] += 1
+                if outcome == "success" and self.first_success_after is None:
+                    self.first_success_after = self._clock() - self._started
+
+    def close(self) -> Counter:
+        """等待队列中的视频全部下载完，返回各结果的数量"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self.progress.close()
+        return self.outcomes
+
+
+def select_downloads(
+    rows: List[Tuple[str, str, List[str]]],
+    targets: Dict[str, int],
+    skip: Container[str] = (),
+) -> List[WorkItem]:
+    """
+    从刚确定分类的 [(id, 内容, 分类)] 中选出属于目标分类的视频
+
+    source 取该视频所属目标分类中权重最大的一个（用于推进该分类的下载序列号）；
+    skip 中的 id（如近似重复）不下载。
+    """
+    selected = []
+    for video_id, content, categories in rows:
+        matched = [c for c in categories if c in targets]
+        if not matched or video_id in skip:
+            continue
+        source = max(matched, key=lambda c: targets[c])
+        selected.append(WorkItem(video_id, content or 'No prompt', source, list(categories)))
+    return selected
+
+
+def snippet_result(rows: List[Tuple[str, str, List[str]]]) -> Dict[str, List[Dict]]:
+    """把 [(id, 内容, 分类)] 转成 {分类: [{id, content}]}（content 取前 50 个字符，与结果文件一致）"""
+    result: Dict[str, List[Dict]] = {}
+    for video_id, content, categories in rows:
+        for category in categories:
+            result.setdefault(category, []).append({"id": video_id, "content": (content or '')[:50]})
+    return result
+
+
+def run_pipeline(category_weights: Dict[str, int], max_downloads: Optional[int] = None) -> Counter:
+    """
+    分类全部数据，同时下载其中属于 category_weights 的视频；返回下载结果计数
+
+    max_downloads 省略时取调用时的 PIPELINE_MAX_DOWNLOADS（cli 的 --max-downloads 会修改它）。
+    """
+    if max_downloads is None:
+        max_downloads = PIPELINE_MAX_DOWNLOADS
+    print("\n🔑 步骤 1: 初始化 Gemini API 与分类提示词")
+    classify_prompts.init_gemini_api(api_key=os.getenv("GEMINI_API_KEY"))
+    classification_prompt = classify_prompts.load_classification_prompt()
+    source_data = classify_prompts.load_source_data()
+    classify_prompts.RESULT_DIR.mkdir(exist_ok=True)
+    cache = ClassificationCache(
+        str(classify_prompts.CACHE_DB), content_hash(classification_prompt),
+        classify_prompts.GEMINI_MODEL, classify_prompts.GEMINI_TEMPERATURE,
+    )
+    local_model = classify_prompts.load_local_model()
+    distance = classify_prompts.NEAR_DUPLICATE_DISTANCE
+    near_duplicates = NearDuplicateIndex(distance) if distance is not None else None
+    skip_duplicates = near_duplicates is not None and download_vedio.NEAR_DUPLICATES == "skip"
+
+    print(f"\n🎯 步骤 2: 边分类边下载，目标分类: {', '.join(category_weights)}")
+    with DownloadStore(str(classify_prompts.DOWNLOAD_DB)) as store, \
+            BackgroundTranslator(store, max_workers=download_vedio.TRANSLATION_WORKERS,
+                                 metrics=download_vedio.metrics) as translator:
+        for category_name in category_weights:
+            store.init_category_if_not_exists(category_name)
+        stage = DownloadStage(
+            download_vedio.download_video_by_id,
+            lambda item, success, file_path: download_vedio.record_download(
+                store, item, success, file_path, translator
+            ),
+            workers=download_vedio.MAX_WORKERS,
+            max_downloads=max_downloads,
+        )
+
+        def on_classified(rows: List[Tuple[str, str, List[str]]]):
+            # 分类结果先入库，下载记录、失败次数与分类进度都依赖 item 表
+            store.merge_classification(snippet_result(rows))
+            if stage.full:
+                return
+            skip = near_duplicates.duplicates if skip_duplicates else ()
+            items = select_downloads(rows, category_weights, skip)
+            wanted = set(store.filter_undownloaded([item.video_id for item in items],
+                                                   download_vedio.MAX_DOWNLOAD_FAILURES))
+            for item in items:
+                if item.video_id in wanted and not stage.submit(item):
+                    break
+
+        try:
+            with cache:
+                final_result = classify_prompts.classify_incrementally(
+                    classification_prompt, source_data, cache,
+                    local_model=local_model, near_duplicates=near_duplicates, on_classified=on_classified,
+                )
+        finally:
+            print("⏳ 分类完成，等待下载队列清空...")
+            outcomes = stage.close()
+
+        if near_duplicates is not None:
+            store.mark_duplicates(near_duplicates.duplicates)
+        print("⏳ 等待后台翻译完成...")
+
+    print("\n💾 步骤 3: 保存分类结果")
+    classify_prompts.save_result(final_result)
+
+    print("\n" + "=" * 80)
+    print("📊 流水线统计:")
+    print(f"   ✅ 下载成功: {outcomes['success']} 个，❌ 失败: {outcomes['failed']} 个"
+          + (f"，🛑 CDN 熔断暂缓: {outcomes['deferred']} 个" if outcomes['deferred'] else ""))
+    if stage.first_success_after is not None:
+        print(f"   ⏱️  第一个视频在开始后 {stage.first_success_after:.1f} 秒下载完成")
+    print(f"   🌐 翻译回填 {translator.translated_count} 条 Prompt")
+    print(f"   🚦 Gemini: {classify_prompts.gemini_limiter.summary()}")
+    print(f"   🚦 CDN: {download_vedio.rate_controller.summary()}")
+    print("=" * 80)
+    return outcomes
+
+
+def main():
+    """主函数"""
+    print("=" * 80)
+    print("🚀 Midjourney 分类—下载流水线")
+    print("=" * 80)
+    try:
+        run_pipeline(download_vedio.TARGET_CATEGORIES)
+    except Exception as e:
+        print(f"\n❌ 程序执行失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        write_report(classify_prompts.metrics, classify_prompts.METRICS_DIR)
+        write_report(download_vedio.metrics, classify_prompts.METRICS_DIR)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,171 @@
+"""
+本地球员索引
+
+用以往查询得到的球员数据（PlayerCache 中的 display_result JSON）建立内存索引，
+已查过的球员不再请求 Worker：
+
+- normalize_key: NFKC（全角 / 半角、兼容汉字）、去空白与间隔号、片假名转平假名、
+  简体 / 旧字体统一为日文新字体（織/织、宮/宫、塁/壘 等常见异体字）、字母转小写；
+- 罗马字写法的名字合并长音（ou / oo / oh → o，uu → u），"Ohtani" 与 "Otani" 是同一个键。
+  Worker（get-player-id.js）只返回 name（即查询时的写法）、source、url、original_url，没有读音，
+  所以汉字名与假名 / 罗马字写法之间无法互查；
+- lookup(): 只认规范化后完全一致的名字。只差一个字的往往是另一名球员（山田哲人 / 山田哲也），
+  所以不在本地把相近的名字当作答案；
+- search(): 前缀匹配 + 二元组（bigram）相似度排序，只用于给查询结果提示相近的名字。
+
+名字通常只有 2~4 个汉字，三元组在这个长度下一个错字就几乎不剩公共片段，所以模糊匹配用带边界的二元组。
+"""
+import bisect
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# 数据中作为名字建索引的字段
+NAME_FIELDS = ("name",)
+# search() 返回的候选数上限
+SEARCH_LIMIT = 5
+# search() 中二元组相似度（Dice 系数）的下限
+MIN_SIMILARITY = 0.4
+
+# 异体字 → 日文新字体（每对中前一个字替换为后一个字）
+_KANJI_VARIANT_PAIRS = (
+    "织織宫宮泽沢澤沢边辺邊辺邉辺壘塁垒塁齐斉齊斉桥橋岛島嶋島滨浜濱浜龙竜龍竜國国广広廣広"
+    "荣栄榮栄长長东東马馬鸟鳥樱桜櫻桜惠恵关関關関冈岡阳陽顺順贵貴树樹纪紀红紅绿緑铃鈴间間"
+    "开開门門远遠达達辉輝亚亜亞亜铁鉄鐵鉄义義丰豊豐豊实実實実渊淵凉涼涛濤絲糸丝糸"
+    "兰蘭乐楽樂楽叶葉佛仏拔抜杨楊钱銭錢銭刘劉张張陈陳吴呉赵趙孙孫冯馮"
+)
+_KANJI_VARIANTS = str.maketrans({
+    _KANJI_VARIANT_PAIRS[i]: _KANJI_VARIANT_PAIRS[i + 1]
+    for i in range(0, len(_KANJI_VARIANT_PAIRS), 2)
+})
+# 片假名 → 平假名（ァ..ヶ 与 ぁ..ゖ 相差 0x60）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+# 名字中常见的分隔符
+_SEPARATORS = str.maketrans("", "", " \t・·.-_'")
+
+
+def normalize_key(name: str) -> str:
+    """索引与查询共用的规范化"""
+    text = unicodedata.normalize("NFKC", name).casefold().translate(_SEPARATORS)
+    text = text.translate(_KATAKANA_TO_HIRAGANA).translate(_KANJI_VARIANTS)
+    if text.isascii():
+        text = fold_romaji(text)
+    return text
+
+
+def fold_romaji(text: str) -> str:
+    """合并罗马字的长音写法：ou / oo / oh → o，uu → u（oh 后面接元音时保留 h，如 "ohashi"）"""
+    out: List[str] = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        nxt = text[i + 1] if i + 1 < len(text) else ""
+        if ch == "o" and nxt in ("u", "o"):
+            out.append("o")
+            i += 2
+            continue
+        if ch == "o" and nxt == "h" and (i + 2 >= len(text) or text[i + 2] not in "aeiou"):
+            out.append("o")
+            i += 2
+            continue
+        if ch == "u" and nxt == "u":
+            out.append("u")
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _bigrams(key: str) -> Set[str]:
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class PlayerIndex:
+    """球员数据的内存索引，键为 normalize_key 后的名字"""
+
+    def __init__(self):
+        self._players: Dict[str, Dict] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        self._sorted_keys: List[str] = []
+        self._dirty = False
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> "PlayerIndex":
+        index = cls()
+        for data in entries:
+            index.add(data)
+        return index
+
+    def __len__(self) -> int:
+        return len({id(data) for data in self._players.values()})
+
+    def keys_for(self, data: Dict) -> List[str]:
+        """一条球员数据的全部索引键"""
+        raw = [data.get(field) for field in NAME_FIELDS]
+        keys = (normalize_key(value) for value in raw if isinstance(value, str) and value.strip())
+        return list(dict.fromkeys(key for key in keys if key))
+
+    def add(self, data: Dict):
+        """加入一条球员数据（Worker 返回的 JSON）；同一个键以最后加入的为准"""
+        for key in self.keys_for(data):
+            if key not in self._players:
+                grams = _bigrams(key)
+                for gram in grams:
+                    self._grams.setdefault(gram, set()).add(key)
+                self._gram_counts[key] = len(grams)
+                self._dirty = True
+            self._players[key] = data
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """规范化后完全一致时返回球员数据，否则返回 None（应向 Worker 查询，相近的名字见 search()）"""
+        key = normalize_key(name)
+        return self._players.get(key) if key else None
+
+    def prefix(self, name: str, limit: int = SEARCH_LIMIT) -> List[str]:
+        """以 name 开头的索引键"""
+        key = normalize_key(name)
+        if not key:
+            return []
+        if self._dirty:
+            self._sorted_keys = sorted(self._players)
+            self._dirty = False
+        start = bisect.bisect_left(self._sorted_keys, key)
+        found = []
+        for candidate in self._sorted_keys[start:]:
+            if not candidate.startswith(key) or len(found) >= limit:
+                break
+            found.append(candidate)
+        return found
+
+    def search(self, name: str, limit: int = SEARCH_LIMIT) -> List[Tuple[Dict, float]]:
+        """前缀匹配与相似名字，按相似度从高到低返回 [(球员数据, 相似度)]，同一球员只出现一次"""
+        key = normalize_key(name)
+        if not key:
+            return []
+        scored = dict(self._similar(key, MIN_SIMILARITY))
+        for candidate in self.prefix(key, limit):
+            scored[candidate] = max(scored.get(candidate, 0.0), len(key) / len(candidate))
+        results: Dict[int, Tuple[Dict, float]] = {}
+        for candidate, score in sorted(scored.items(), key=lambda kv: -kv[1]):
+            data = self._players[candidate]
+            if id(data) not in results:
+                results[id(data)] = (data, score)
+        return list(results.values())[:limit]
+
+    def _similar(self, key: str, min_score: float) -> List[Tuple[str, float]]:
+        """二元组 Dice 系数不低于 min_score 的索引键"""
+        grams = _bigrams(key)
+        overlap: Counter = Counter()
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                overlap[candidate] += 1
+        scored = []
+        for candidate, shared in overlap.items():
+            score = 2 * shared / (len(grams) + self._gram_counts[candidate])
+            if score >= min_score:
+                scored.append((candidate, score))
+        return sorted(scored, key=lambda kv: -kv[1])
@@ -0,0 +1,185 @@
+"""
+按主机的自适应限流、退避与熔断
+
+- 每个主机一个令牌桶，请求前 acquire() 取令牌；
+- record() 反馈响应状态：成功时缓慢提速（加法增长），遇到 retryable_status 中的状态码时
+  降速（乘法减半），并返回带抖动的指数退避时间供调用方重试前等待；
+- 403 可重试时（默认，CDN 的防爬拦截会返回 403），连续出现 breaker_threshold 次后熔断该主机
+  breaker_cooldown 秒，期间 acquire() 直接抛出 CircuitOpenError，避免继续消耗队列或被封禁。
+  对 403 表示无权限的 API（如 Gemini），创建限流器时传入不含 403 的 retryable_status。
+
+current_rate() 给出当前可持续的请求速率（请求/秒）。
+"""
+import random
+import threading
+import time
+from typing import AbstractSet, Callable, Dict, Optional
+
+
+# 默认需要退避重试的状态码（CDN：403 是防爬拦截）
+RETRYABLE_STATUS = frozenset({403, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """主机处于熔断状态，暂停请求"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} 已熔断，{retry_in:.0f} 秒后恢复")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒的速度补充令牌，最多存 capacity 个"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """尝试取一个令牌，成功返回 0，否则返回还需等待的秒数"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _HostState:
+    """单个主机的限流状态"""
+
+    def __init__(self, rate: float, burst: float, clock):
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.failures = 0
+        self.consecutive_403 = 0
+        self.open_until = 0.0
+        self.successes = 0
+        self.throttled = 0
+
+
+class RateController:
+    """
+    多主机共享的限流器，线程安全
+
+    - initial_rate / min_rate / max_rate: 每主机请求速率（请求/秒）的初值与上下限
+    - burst: 令牌桶容量，允许的瞬时突发请求数
+    - increase: 每次成功后速率增加的量
+    - base_backoff / max_backoff: 指数退避的基数与上限（秒）
+    - breaker_threshold / breaker_cooldown: 连续 403 多少次后熔断，熔断持续秒数
+    - retryable_status: 需要降速并退避重试的状态码，其余状态码视为成功
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = 2.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        burst: float = 4.0,
+        increase: float = 0.1,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        retryable_status: AbstractSet[int] = RETRYABLE_STATUS,
+    ):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.retryable_status = frozenset(retryable_status)
+        self._clock = clock
+        self._sleep = sleep
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.initial_rate, self.burst, self._clock)
+        return self._hosts[host]
+
+    def acquire(self, host: str):
+        """阻塞直到拿到该主机的一个令牌；主机熔断时抛出 CircuitOpenError"""
+        while True:
+            with self._lock:
+                state = self._state(host)
+                now = self._clock()
+                if state.open_until > now:
+                    raise CircuitOpenError(host, state.open_until - now)
+                wait = state.bucket.try_acquire()
+            if wait <= 0:
+                return
+            self._sleep(wait)
+
+    def record(self, host: str, status: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        反馈一次请求的结果
+
+        返回 None 表示无需重试；否则返回重试前建议等待的秒数
+        （带抖动的指数退避，服务器给了 Retry-After 时取两者较大值）。
+        """
+        with self._lock:
+            state = self._state(host)
+            bucket = state.bucket
+
+            if status not in self.retryable_status:
+                state.failures = 0
+                state.consecutive_403 = 0
+                state.successes += 1
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+                return None
+
+            state.throttled += 1
+            state.failures += 1
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            # 清空令牌，避免降速前攒下的令牌立刻被用掉
+            bucket.tokens = min(bucket.tokens, 0)
+
+            if status == 403:
+                state.consecutive_403 += 1
+                if state.consecutive_403 >= self.breaker_threshold:
+                    state.open_until = self._clock() + self.breaker_cooldown
+                    state.consecutive_403 = 0
+                    print(f"🛑 {host} 连续 {self.breaker_threshold} 次 403，熔断 {self.breaker_cooldown:.0f} 秒")
+
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (state.failures - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            if retry_after:
+                delay = max(delay, retry_after)
+            return delay
+
+    def is_open(self, host: str) -> bool:
+        """主机当前是否处于熔断状态"""
+        with self._lock:
+            return self._state(host).open_until > self._clock()
+
+    def current_rate(self, host: str) -> float:
+        """当前对该主机可持续的请求速率（请求/秒）"""
+        with self._lock:
+            return self._state(host).bucket.rate
+
+    def summary(self) -> str:
+        """各主机限流状态的简要报告"""
+        with self._lock:
+            lines = []
+            for host, state in self._hosts.items():
+                status = "熔断中" if state.open_until > self._clock() else "正常"
+                lines.append(
+                    f"{host}: {state.bucket.rate:.2f} 请求/秒 "
+                    f"(成功 {state.successes}, 限流 {state.throttled}, {status})"
+                )
+            return "\n".join(lines)
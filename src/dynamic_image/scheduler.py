@@ -0,0 +1,70 @@
+"""
+多分类下载调度
+
+按权重在多个分类之间交替取视频，合并成一个去重后的工作队列：
+同一个视频即使出现在多个分类里，也只会下载一次。
+"""
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+
+class WorkItem:
+    """
+    调度队列中的一项
+
+    source 是取出该项的分类；categories 是该视频在分类结果中所属的全部分类，下载后按它们归档。
+    """
+
+    __slots__ = ("video_id", "content", "source", "categories")
+
+    def __init__(self, video_id: str, content: str, source: str, categories: List[str]):
+        self.video_id = video_id
+        self.content = content
+        self.source = source
+        self.categories = categories
+
+    def __repr__(self):
+        return f"WorkItem({self.video_id!r}, source={self.source!r})"
+
+
+def build_work_queue(
+    fetch_next: Callable[[str, int], List[Tuple[str, str]]],
+    weights: Dict[str, int],
+    limit: int,
+) -> List[WorkItem]:
+    """
+    生成本轮的工作队列
+
+    - fetch_next(分类, n): 返回该分类接下来 n 个未下载的视频 [(id, content)]
+    - weights: 参与本轮的分类及其权重，权重越大取到的视频越多（平滑加权轮询）
+    - limit: 本轮最多下载的视频数
+
+    每个分类最多取 limit 个候选；被其他分类先排进队列的视频跳过，不会重复下载。
+    """
+    active = [c for c, w in weights.items() if w > 0]
+    candidates = {c: deque(fetch_next(c, limit)) for c in active}
+    current = {c: 0 for c in active}
+
+    queue: List[WorkItem] = []
+    scheduled = set()
+
+    while active and len(queue) < limit:
+        # 平滑加权轮询：每轮所有分类加上自身权重，取最大者，再减去总权重
+        total = sum(weights[c] for c in active)
+        for c in active:
+            current[c] += weights[c]
+        category = max(active, key=lambda c: current[c])
+        current[category] -= total
+
+        pending = candidates[category]
+        while pending and pending[0][0] in scheduled:
+            pending.popleft()
+        if not pending:
+            active.remove(category)
+            continue
+
+        video_id, content = pending.popleft()
+        scheduled.add(video_id)
+        queue.append(WorkItem(video_id, content or 'No prompt', category, [category]))
+
+    return queue
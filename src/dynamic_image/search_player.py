@@ -1,25 +1,195 @@
-import requests
+"""
+球员查询
+
+search_player(name) 查询单个球员并打印结果；search_players(names) 批量查询：
+- 名字按 normalize_name 规范化后去重（全角 / 半角、多余空格不会产生重复请求）；
+- 未缓存的名字并发请求 Worker，同时进行的请求数不超过 SEARCH_CONCURRENCY；
+- 结果保存在本地 SQLite 缓存中，查到的保存 FOUND_TTL 秒，查不到的（404）保存 MISS_TTL 秒，
+  有效期内重复查询不再请求 Worker。网络错误和其他状态码不缓存；
+- 以往查到的球员建成本地索引（player_index.PlayerIndex），异体字、全角 / 半角、罗马字长音写法
+  在本地直接命中；相近但不一致的名字仍请求 Worker，本地索引只用来提示候选。
+
+命令行：
+    python src/dynamic_image/search_player.py 宗山塁 横山悠
+    python src/dynamic_image/search_player.py -f names.txt   # 每行一个名字
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dynamic_image import PROJECT_ROOT
+from dynamic_image.http_pool import get_session_pool
+from dynamic_image.player_index import PlayerIndex
 
 # 你的 Worker 地址
 WORKER_API = "https://search.yingjie.icu"  # 确保这里不需要加 /proxy 等路径，直接根路径即可
 
+# 批量查询时同时进行的请求数上限
+SEARCH_CONCURRENCY = 16
+# 查询结果缓存
+PLAYER_CACHE_DB = PROJECT_ROOT / "result" / "player_cache.db"
+# 查到的球员缓存 7 天，查不到的缓存 1 天
+FOUND_TTL = 7 * 24 * 3600
+MISS_TTL = 24 * 3600
 
-def search_player(name):
-    print(f"[*] 正在请求云端 API 查询: {name} ...")
+# 与下载器共用的会话池层，重复查询时复用到 Worker 的连接
+session_pool = get_session_pool("requests", max_per_host=SEARCH_CONCURRENCY)
 
-    try:
-        # 极简调用：直接传参
-        response = requests.get(WORKER_API, params={"name": name}, timeout=30)
 
-        if response.status_code == 200:
-            data = response.json()
-            display_result(data)
-        else:
-            print(f"[!] API 错误: {response.status_code}")
-            print(f"    信息: {response.text}")
+class PlayerLookupError(Exception):
+    """查询失败（网络错误或非 200/404 的响应），结果不缓存"""
+
+
+def normalize_name(name: str) -> str:
+    """缓存和去重用的名字：NFKC 规范化（全角转半角等）并合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", name).split())
+
+
+class PlayerCache:
+    """
+    球员查询结果的本地缓存（SQLite）
+
+    data 为 None 表示 Worker 查不到该球员（负缓存）；过期的条目视为未缓存。
+    """
+
+    def __init__(self, db_file: str, found_ttl: float = FOUND_TTL, miss_ttl: float = MISS_TTL,
+                 clock: Callable[[], float] = time.time):
+        self.found_ttl = found_ttl
+        self.miss_ttl = miss_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS player_cache (
+                name TEXT PRIMARY KEY,
+                data TEXT,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """返回未过期的 {名字: 数据或 None}，未缓存或已过期的名字不在结果中"""
+        names = list(names)
+        now = self._clock()
+        found: Dict[str, Optional[Dict]] = {}
+        with self._lock:
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = self._conn.execute(
+                    f'SELECT name, data, fetched_at FROM player_cache '
+                    f'WHERE name IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                for name, data, fetched_at in rows:
+                    ttl = self.found_ttl if data is not None else self.miss_ttl
+                    if now - fetched_at < ttl:
+                        found[name] = json.loads(data) if data is not None else None
+        return found
+
+    def found_entries(self) -> List[Dict]:
+        """未过期的已查到球员数据，用于建立本地索引（过期的球员重新向 Worker 查询）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM player_cache WHERE data IS NOT NULL AND fetched_at > ?',
+                (self._clock() - self.found_ttl,)
+            ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def put(self, name: str, data: Optional[Dict]):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO player_cache (name, data, fetched_at) VALUES (?, ?, ?)',
+                (name, json.dumps(data, ensure_ascii=False) if data is not None else None, self._clock())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
+
+def fetch_player(name: str) -> Optional[Dict]:
+    """请求 Worker 查询一个球员：200 返回数据，404 返回 None，其他情况抛出 PlayerLookupError"""
+    try:
+        response = session_pool.get(WORKER_API, params={"name": name}, timeout=30)
     except Exception as e:
-        print(f"[!] 网络请求失败: {e}")
+        raise PlayerLookupError(f"网络请求失败: {e}") from e
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code == 404:
+        return None
+    raise PlayerLookupError(f"API 错误: {response.status_code} {response.text}")
+
+
+def search_players(
+    names: Iterable[str],
+    cache: Optional[PlayerCache] = None,
+    fetch_fn: Callable[[str], Optional[Dict]] = fetch_player,
+    max_workers: int = SEARCH_CONCURRENCY,
+    index: Optional[PlayerIndex] = None,
+) -> Dict[str, Tuple[str, object]]:
+    """
+    批量查询球员
+
+    返回 {规范化后的名字: (状态, 数据)}，状态为 "found" / "missing" / "error"（error 时数据为错误信息）。
+    cache 中未过期的名字不再请求，其次 index 中能找到的名字直接返回（index 应只包含未过期的数据，
+    见 PlayerCache.found_entries），其余的并发请求后写入 cache 和 index。
+    """
+    unique: List[str] = list(dict.fromkeys(n for n in map(normalize_name, names) if n))
+    results: Dict[str, Tuple[str, object]] = {}
+    cached = cache.get_many(unique) if cache is not None else {}
+    for name, data in cached.items():
+        results[name] = ("found", data) if data is not None else ("missing", None)
+    if index is not None:
+        for name in unique:
+            data = index.lookup(name) if name not in results else None
+            if data is not None:
+                results[name] = ("found", data)
+
+    def lookup(name: str):
+        try:
+            data = fetch_fn(name)
+        except PlayerLookupError as e:
+            return name, ("error", str(e))
+        if cache is not None:
+            cache.put(name, data)
+        return name, ("found", data) if data is not None else ("missing", None)
+
+    pending = [name for name in unique if name not in results]
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            for name, outcome in executor.map(lookup, pending):
+                results[name] = outcome
+                if index is not None and outcome[0] == "found":
+                    index.add(outcome[1])
+    return {name: results[name] for name in unique}
+
+
+def search_player(name):
+    print(f"[*] 正在请求云端 API 查询: {name} ...")
+
+    try:
+        data = fetch_player(name)
+    except PlayerLookupError as e:
+        print(f"[!] {e}")
+        return
+    if data is None:
+        print(f"[!] 查无此人: {name}")
+        return
+    display_result(data)
 
 
 def display_result(data):
@@ -35,11 +205,45 @@ def display_result(data):
     print(data)
 
 
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="批量查询球员")
+    parser.add_argument("names", nargs="*", help="球员名字")
+    parser.add_argument("-f", "--file", help="名字列表文件，每行一个")
+    parser.add_argument("--no-cache", action="store_true", help="不使用本地缓存和索引")
+    args = parser.parse_args(argv)
+
+    names = list(args.names)
+    if args.file:
+        names += Path(args.file).read_text(encoding="utf-8").splitlines()
+    if not names:
+        parser.error("请提供球员名字或 --file")
+
+    started = time.monotonic()
+    index = None
+    if args.no_cache:
+        results = search_players(names)
+    else:
+        PLAYER_CACHE_DB.parent.mkdir(exist_ok=True)
+        with PlayerCache(str(PLAYER_CACHE_DB)) as cache:
+            index = PlayerIndex.from_entries(cache.found_entries())
+            print(f"📇 本地索引: {len(index)} 名球员")
+            results = search_players(names, cache, index=index)
+
+    for name, (status, data) in results.items():
+        if status == "found":
+            display_result(data)
+        elif status == "missing":
+            print(f"[!] 查无此人: {name}")
+        else:
+            print(f"[!] {name} 查询失败: {data}")
+        if status != "found" and index is not None:
+            suggestions = index.search(name)
+            if suggestions:
+                print(f"    相近的名字: {', '.join(str(d.get('name')) for d, _ in suggestions)}")
+    found = sum(1 for status, _ in results.values() if status == "found")
+    print(f"\n✅ 共 {len(results)} 个名字，查到 {found} 个，耗时 {time.monotonic() - started:.1f} 秒")
+    return 0 if all(status != "error" for status, _ in results.values()) else 1
+
+
 if __name__ == "__main__":
-    search_player("箱山遥人")
-    # search_player("清宫幸太郎")
-    # search_player("末吉良丞")
-    # search_player("宗山塁")
-    # search_player("横山悠")
-    # search_player("织田翔希")
-    # search_player("石田雄星")
\ No newline at end of file
+    exit(main())
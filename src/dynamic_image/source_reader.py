@@ -0,0 +1,114 @@
+"""
+流式读取源数据
+
+源数据可以是一个 JSON 数组（images/source.json），也可以是 JSONL（每行一条记录）。
+文件按块读取，每解析出一条记录就立即产出，只保留 PromptRecord 中的字段
+（owner_profile、items、prompt.params 等嵌套结构随即丢弃），内存占用只与单条记录的大小有关，与文件大小无关。
+"""
+import json
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+
+
+# 每次从文件读取的字符数
+READ_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_json_records(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    从文件对象中逐条解析记录
+
+    第一个非空白字符为 '[' 时按 JSON 数组解析，否则按 JSONL / 连续 JSON 对象解析。
+    """
+    buffer = ''
+    position = 0
+    eof = False
+    in_array: Optional[bool] = None
+
+    while True:
+        # 跳过空白和数组分隔符
+        while position < len(buffer) and buffer[position] in _WHITESPACE + ',':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                return
+            buffer, position = f.read(chunk_size), 0
+            eof = not buffer
+            continue
+
+        if in_array is None:
+            in_array = buffer[position] == '['
+            if in_array:
+                position += 1
+                continue
+        if in_array and buffer[position] == ']':
+            return
+
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # 记录还没读完整：丢掉已解析的部分，再读一块继续
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        yield record
+
+
+class PromptRecord:
+    """
+    一条源数据中各模块用到的字段
+
+    content 为 prompt.decodedPrompt[0].content；video_segments 为各视频片段的长度（帧数）。
+    """
+
+    __slots__ = ("id", "content", "width", "height", "enqueue_time", "parent_id", "video_segments")
+
+    def __init__(self, id: str, content: str, width: Optional[int] = None, height: Optional[int] = None,
+                 enqueue_time: Optional[int] = None, parent_id: Optional[str] = None,
+                 video_segments: Tuple[int, ...] = ()):
+        self.id = id
+        self.content = content
+        self.width = width
+        self.height = height
+        self.enqueue_time = enqueue_time
+        self.parent_id = parent_id
+        self.video_segments = video_segments
+
+    @classmethod
+    def from_source(cls, record: Dict) -> Optional["PromptRecord"]:
+        """从原始记录中取出所需字段，没有 prompt 文本时返回 None"""
+        decoded_prompts = (record.get('prompt') or {}).get('decodedPrompt') or []
+        if not decoded_prompts:
+            return None
+        return cls(
+            record.get('id'),
+            decoded_prompts[0].get('content', ''),
+            record.get('width'),
+            record.get('height'),
+            record.get('enqueue_time'),
+            record.get('parent_id'),
+            tuple(record.get('video_segments') or ()),
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, PromptRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PromptRecord(id={self.id!r}, content={self.content[:30]!r})"
+
+
+def iter_prompt_records(path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[PromptRecord]:
+    """流式读取源数据文件，逐条产出 PromptRecord（没有 prompt 文本的记录跳过）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for record in iter_json_records(f, chunk_size):
+            trimmed = PromptRecord.from_source(record)
+            if trimmed is not None:
+                yield trimmed
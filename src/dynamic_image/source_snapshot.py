@@ -0,0 +1,123 @@
+"""
+源数据的二进制快照
+
+images/source.json 每次运行都要完整解析一遍 JSON（含 owner_profile、items、prompt 参数等用不到的字段）。
+快照把 PromptRecord 的字段存进一个 SQLite 文件（默认与源文件同目录，如 images/source.snapshot.db），
+之后的运行直接按行读取，不再解析 JSON：
+- 快照中记录源文件的大小和修改时间，两者任一变化（或快照格式升级）时自动重新生成；
+- 生成时先写临时文件再原子替换，中途失败不会留下不完整的快照；
+- 快照不可用（只读目录等）时退回直接流式解析源文件。
+"""
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from dynamic_image.source_reader import PromptRecord, iter_prompt_records
+
+
+# 快照格式版本，字段变化时加一，旧快照会被重新生成
+SNAPSHOT_VERSION = 1
+# 生成快照时每次写入的行数
+WRITE_BATCH_SIZE = 1000
+
+_INSERT_RECORD = (
+    'INSERT INTO record (id, content, width, height, enqueue_time, parent_id, video_segments) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+
+
+def snapshot_path(source) -> Path:
+    """源文件对应的默认快照路径"""
+    source = Path(source)
+    return source.with_name(source.stem + ".snapshot.db")
+
+
+def _fingerprint(source) -> Tuple[int, int]:
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _is_fresh(snapshot: Path, fingerprint: Tuple[int, int]) -> bool:
+    if not snapshot.exists():
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+        try:
+            row = conn.execute('SELECT version, source_size, source_mtime_ns FROM meta').fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return row == (SNAPSHOT_VERSION, *fingerprint)
+
+
+def build_snapshot(source, snapshot=None) -> int:
+    """流式解析源文件并写出快照，返回记录数"""
+    snapshot = Path(snapshot) if snapshot is not None else snapshot_path(source)
+    fingerprint = _fingerprint(source)
+    tmp_file = snapshot.with_name(snapshot.name + '.tmp')
+    if tmp_file.exists():
+        tmp_file.unlink()
+
+    conn = sqlite3.connect(tmp_file)
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE meta (version INTEGER, source_size INTEGER, source_mtime_ns INTEGER)')
+        conn.execute('''
+            CREATE TABLE record (
+                seq INTEGER PRIMARY KEY,
+                id TEXT,
+                content TEXT,
+                width INTEGER,
+                height INTEGER,
+                enqueue_time INTEGER,
+                parent_id TEXT,
+                video_segments TEXT
+            )
+        ''')
+        count = 0
+        batch = []
+        for record in iter_prompt_records(source):
+            batch.append((record.id, record.content, record.width, record.height, record.enqueue_time,
+                          record.parent_id, ','.join(map(str, record.video_segments))))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                conn.executemany(_INSERT_RECORD, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(_INSERT_RECORD, batch)
+            count += len(batch)
+        conn.execute('INSERT INTO meta VALUES (?, ?, ?)', (SNAPSHOT_VERSION, *fingerprint))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_file, snapshot)
+    return count
+
+
+def iter_snapshot(snapshot) -> Iterator[PromptRecord]:
+    """按源文件中的顺序逐条读取快照"""
+    conn = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute('SELECT id, content, width, height, enqueue_time, parent_id, video_segments '
+                              'FROM record ORDER BY seq')
+        for id_, content, width, height, enqueue_time, parent_id, segments in cursor:
+            yield PromptRecord(id_, content, width, height, enqueue_time, parent_id,
+                               tuple(map(int, segments.split(','))) if segments else ())
+    finally:
+        conn.close()
+
+
+def load_prompt_records(source, snapshot=None) -> Iterator[PromptRecord]:
+    """读取源数据：快照是最新的就直接读取快照，否则先重新生成快照"""
+    snapshot = Path(snapshot) if snapshot is not None else snapshot_path(source)
+    if not _is_fresh(snapshot, _fingerprint(source)):
+        try:
+            count = build_snapshot(source, snapshot)
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️  无法生成源数据快照 ({e})，直接解析 {source}")
+            return iter_prompt_records(source)
+        print(f"🗜️  已生成源数据快照: {snapshot} ({count} 条)")
+    return iter_snapshot(snapshot)
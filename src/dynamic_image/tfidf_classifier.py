@@ -0,0 +1,292 @@
+"""
+离线 TF-IDF 分类器：用以往 Gemini 的分类结果训练，在本地批量打分
+
+- 特征：小写单词与相邻双词组，经 CRC32 哈希到 N_FEATURES 维，TF 取 1 + log(次数)，乘以 IDF 后做 L2 归一化；
+- 模型：每个分类一个质心（该分类样本向量的均值，再归一化），得分即与质心的余弦相似度；
+- 判定：每个分类有各自的阈值（训练时按 F1 最优选取），得分高于阈值即归入该分类，最多 3 个，
+  都未过阈值时为 "未分类"；有分类的得分离阈值不到 margin（按阈值的比例计）时视为没有把握，
+  返回 None 交给 Gemini。
+
+模型只有几个 float32 数组，保存为 .npz。依赖 NumPy（可选依赖：pip install -e '.[ml]'）。
+
+训练并报告与 Gemini 标注的一致率：
+    python src/dynamic_image/tfidf_classifier.py
+    dynamic-image train-tfidf [--evaluate-only]
+"""
+import glob
+import json
+import random
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装可选依赖时只是不能使用本模块
+    np = None
+
+from dynamic_image import PROJECT_ROOT
+from dynamic_image.source_snapshot import load_prompt_records
+
+
+RESULT_DIR = PROJECT_ROOT / "result"
+SOURCE_JSON = PROJECT_ROOT / "images" / "source.json"
+MODEL_FILE = RESULT_DIR / "tfidf_model.npz"
+
+# 哈希特征维数
+N_FEATURES = 2 ** 15
+# 得分距阈值小于 "阈值 × 该比例" 的分类视为没有把握（越大越保守，交给 Gemini 的越多）
+DEFAULT_MARGIN = 0.3
+# 训练时留出多少比例的样本评估一致率
+HOLDOUT_RATIO = 0.2
+# "未分类" 表示不属于其他任何分类，不单独训练质心：所有分类都未过阈值时即为该分类
+FALLBACK_CATEGORY = "未分类"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("TF-IDF 分类器需要 NumPy，请运行: pip install -e '.[ml]'")
+
+
+def extract_features(text: str, n_features: int = N_FEATURES) -> Counter:
+    """单词与双词组哈希后的词频 {特征下标: 次数}"""
+    words = _TOKEN.findall(text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return Counter(zlib.crc32(gram.encode('utf-8')) % n_features for gram in grams)
+
+
+def vectorize(texts: Sequence[str], idf, n_features: int = N_FEATURES):
+    """把一批文本转成稀疏的 TF-IDF 矩阵 (行号, 特征下标, 值)，每行已 L2 归一化"""
+    rows: List[int] = []
+    cols: List[int] = []
+    counts: List[int] = []
+    for i, text in enumerate(texts):
+        for feature, count in extract_features(text, n_features).items():
+            rows.append(i)
+            cols.append(feature)
+            counts.append(count)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = (1.0 + np.log(np.asarray(counts, dtype=np.float32))) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+    values = values / np.where(norms > 0, norms, 1.0)[rows]
+    return rows, cols, values.astype(np.float32)
+
+
+class TfidfModel:
+    """按分类质心打分的 TF-IDF 模型"""
+
+    def __init__(self, categories: List[str], idf, centroids, thresholds,
+                 margin: float = DEFAULT_MARGIN, max_categories: int = 3):
+        self.categories = list(categories)
+        self.idf = idf                  # (n_features,)
+        self.centroids = centroids      # (n_features, n_categories)
+        self.thresholds = thresholds    # (n_categories,)
+        self.margin = margin
+        self.max_categories = max_categories
+
+    @property
+    def n_features(self) -> int:
+        return len(self.idf)
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[Sequence[str]],
+              n_features: int = N_FEATURES, margin: float = DEFAULT_MARGIN) -> "TfidfModel":
+        """用 (文本, 分类列表) 训练模型"""
+        _require_numpy()
+        categories = sorted({c for cats in labels for c in cats} - {FALLBACK_CATEGORY})
+        index = {c: i for i, c in enumerate(categories)}
+
+        # IDF：平滑后的 log((1 + N) / (1 + df)) + 1
+        df = np.zeros(n_features, dtype=np.float32)
+        for text in texts:
+            df[list(extract_features(text, n_features))] += 1
+        idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+        rows, cols, values = vectorize(texts, idf, n_features)
+        label_matrix = np.zeros((len(texts), len(categories)), dtype=np.float32)
+        for i, cats in enumerate(labels):
+            label_matrix[i, [index[c] for c in cats if c in index]] = 1
+
+        # 质心 = 该分类所有样本向量之和（再归一化）：稀疏矩阵的转置乘以标注矩阵
+        centroids = np.zeros((n_features, len(categories)), dtype=np.float32)
+        np.add.at(centroids, cols, values[:, None] * label_matrix[rows])
+        norms = np.linalg.norm(centroids, axis=0)
+        centroids /= np.where(norms > 0, norms, 1.0)
+
+        model = cls(categories, idf, centroids, np.zeros(len(categories), dtype=np.float32), margin)
+        scores = model._score_sparse(rows, cols, values, len(texts))
+        model.thresholds = np.array(
+            [_best_threshold(scores[:, j], label_matrix[:, j]) for j in range(len(categories))],
+            dtype=np.float32,
+        )
+        return model
+
+    def _score_sparse(self, rows, cols, values, n_rows: int):
+        scores = np.zeros((n_rows, len(self.categories)), dtype=np.float32)
+        weighted = values[:, None] * self.centroids[cols]
+        for j in range(len(self.categories)):
+            scores[:, j] = np.bincount(rows, weights=weighted[:, j], minlength=n_rows)
+        return scores
+
+    def scores(self, texts: Sequence[str]):
+        """一批文本对各分类的余弦得分，形状 (len(texts), len(categories))"""
+        rows, cols, values = vectorize(texts, self.idf, self.n_features)
+        return self._score_sparse(rows, cols, values, len(texts))
+
+    def predict(self, texts: Sequence[str], confident_only: bool = True) -> List[Optional[List[str]]]:
+        """
+        批量预测分类（按得分从高到低，最多 max_categories 个）
+
+        confident_only 为 True 时，没有把握的条目（有得分离阈值不到 margin × 阈值）为 None。
+        """
+        if not texts:
+            return []
+        scores = self.scores(texts)
+        above = scores >= self.thresholds
+        uncertain = (np.abs(scores - self.thresholds) < self.margin * self.thresholds).any(axis=1)
+        predictions: List[Optional[List[str]]] = []
+        for i in range(len(texts)):
+            if confident_only and uncertain[i]:
+                predictions.append(None)
+                continue
+            order = np.argsort(-scores[i])
+            categories = [self.categories[j] for j in order if above[i, j]][:self.max_categories]
+            predictions.append(categories or [FALLBACK_CATEGORY])
+        return predictions
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            categories=np.array(self.categories),
+            idf=self.idf,
+            centroids=self.centroids,
+            thresholds=self.thresholds,
+            margin=np.float32(self.margin),
+        )
+
+    @classmethod
+    def load(cls, path) -> "TfidfModel":
+        _require_numpy()
+        with np.load(path) as data:
+            return cls([str(c) for c in data['categories']], data['idf'], data['centroids'],
+                       data['thresholds'], float(data['margin']))
+
+
+def _best_threshold(scores, truth) -> float:
+    """在训练得分上选取 F1 最高的阈值"""
+    positives = truth.sum()
+    if positives == 0:
+        return float('inf')
+    order = np.argsort(-scores)
+    hits = np.cumsum(truth[order])
+    predicted = np.arange(1, len(scores) + 1)
+    f1 = 2 * hits / (predicted + positives)
+    best = int(np.argmax(f1))
+    # 取最佳位置与下一个得分的中点，避免阈值正好压在样本上
+    upper = scores[order[best]]
+    lower = scores[order[best + 1]] if best + 1 < len(scores) else upper
+    return float((upper + lower) / 2)
+
+
+def load_model(path=MODEL_FILE) -> Optional[TfidfModel]:
+    """加载已训练的模型；文件不存在或未安装 NumPy 时返回 None"""
+    if not Path(path).exists():
+        return None
+    if np is None:
+        print("⚠️  未安装 NumPy，跳过本地 TF-IDF 模型 (pip install -e '.[ml]')")
+        return None
+    model = TfidfModel.load(path)
+    print(f"✅ 已加载本地 TF-IDF 模型: {path} ({len(model.categories)} 个分类)")
+    return model
+
+
+def evaluate(model: TfidfModel, texts: Sequence[str], labels: Sequence[Sequence[str]]) -> Dict[str, float]:
+    """
+    与 Gemini 标注比较
+
+    - exact_match: 全部条目中预测分类集合与标注完全一致的比例（不考虑置信度）
+    - coverage: 模型有把握、可以不发给 Gemini 的比例
+    - confident_exact_match / precision / recall: 在有把握的条目上的一致率与逐分类的精确率、召回率
+    """
+    forced = model.predict(texts, confident_only=False)
+    confident = model.predict(texts)
+    pairs = [(set(p), set(l)) for p, l in zip(confident, labels) if p is not None]
+    true_positive = sum(len(p & l) for p, l in pairs)
+    return {
+        'exact_match': sum(set(p) == set(l) for p, l in zip(forced, labels)) / max(len(texts), 1),
+        'coverage': len(pairs) / max(len(texts), 1),
+        'confident_exact_match': sum(p == l for p, l in pairs) / max(len(pairs), 1),
+        'precision': true_positive / max(sum(len(p) for p, _ in pairs), 1),
+        'recall': true_positive / max(sum(len(l) for _, l in pairs), 1),
+    }
+
+
+def load_training_data(result_dir=RESULT_DIR, source_json=SOURCE_JSON) -> Tuple[List[str], List[List[str]]]:
+    """
+    从 result 目录下的分类结果与源数据中取出训练样本 (完整 prompt 文本, 分类列表)
+
+    分类结果中的 content 只是前 50 个字符，完整文本按 id 从源数据中取；
+    同一个 id 出现在多个结果文件中时以最新的文件为准。
+    """
+    labels: Dict[str, List[str]] = {}
+    files = sorted(glob.glob(f"{result_dir}/classification_result_*.json"), key=lambda f: Path(f).stat().st_mtime)
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        file_labels: Dict[str, List[str]] = {}
+        for category, entries in result.items():
+            for entry in entries:
+                if isinstance(entry, dict) and entry.get('id'):
+                    file_labels.setdefault(entry['id'], []).append(category)
+        labels.update(file_labels)
+
+    texts, targets = [], []
+    for record in load_prompt_records(source_json):
+        if record.id in labels and record.content:
+            texts.append(record.content)
+            targets.append(labels[record.id])
+    return texts, targets
+
+
+def main(save: bool = True):
+    """训练模型，先用留出集报告与 Gemini 标注的一致率，再用全部样本训练并保存（save 为 False 时只评估）"""
+    print("=" * 80)
+    print("🧮 训练本地 TF-IDF 分类模型")
+    print("=" * 80)
+    _require_numpy()
+
+    texts, labels = load_training_data()
+    if not texts:
+        print(f"❌ 在 {RESULT_DIR} 中找不到可与源数据对应的分类结果")
+        return 1
+    print(f"✅ 训练样本: {len(texts)} 条")
+
+    samples = list(zip(texts, labels))
+    random.Random(0).shuffle(samples)
+    split = int(len(samples) * (1 - HOLDOUT_RATIO))
+    train, holdout = samples[:split], samples[split:]
+    if holdout:
+        model = TfidfModel.train([t for t, _ in train], [l for _, l in train])
+        metrics = evaluate(model, [t for t, _ in holdout], [l for _, l in holdout])
+        print(f"\n📊 留出集 ({len(holdout)} 条) 与 Gemini 标注的一致率:")
+        print(f"   完全一致: {metrics['exact_match']:.1%}")
+        print(f"   有把握的比例: {metrics['coverage']:.1%}（这部分不再调用 Gemini）")
+        print(f"   有把握部分完全一致: {metrics['confident_exact_match']:.1%}，"
+              f"精确率 {metrics['precision']:.1%}，召回率 {metrics['recall']:.1%}")
+    if not save:
+        return 0
+
+    model = TfidfModel.train(texts, labels)
+    RESULT_DIR.mkdir(exist_ok=True)
+    model.save(MODEL_FILE)
+    print(f"\n💾 模型已保存到: {MODEL_FILE} ({MODEL_FILE.stat().st_size / 1024:.0f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
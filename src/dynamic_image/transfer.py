@@ -0,0 +1,196 @@
+"""
+下载写盘与进度显示
+
+- StreamWriter: 把响应体的小块攒够 buffer_size 后用一次 os.writev 写入，
+  不做拼接拷贝，也不逐块发起系统调用；可按 content-length 预先分配磁盘空间。
+- ProgressReporter: 多个并发下载共用一条汇总进度，按固定时间间隔重绘。
+"""
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+# 默认写缓冲大小
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+# 单次 writev 的最大块数（Linux 的 IOV_MAX 为 1024）
+_MAX_IOV = 512
+# Linux fallocate(2) 的 FALLOC_FL_KEEP_SIZE：只分配空间，不改变文件大小
+_FALLOC_FL_KEEP_SIZE = 0x01
+
+_libc = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def preallocate(fd: int, offset: int, length: int, keep_size: bool = True) -> bool:
+    """
+    预先为文件分配 [offset, offset + length) 的磁盘空间，返回是否成功
+
+    keep_size=True 时不改变文件大小：.part 文件的大小就是已下载的字节数，
+    若被 posix_fallocate 撑到完整大小，中断后续传会误判为已下载完。
+    这种模式依赖 Linux 的 fallocate(FALLOC_FL_KEEP_SIZE)，其他平台直接跳过。
+    """
+    if length <= 0:
+        return False
+    try:
+        if not keep_size:
+            os.posix_fallocate(fd, offset, length)
+            return True
+        if _libc is not None:
+            return _libc.fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) == 0
+    except (OSError, AttributeError):
+        pass
+    return False
+
+
+class StreamWriter:
+    """
+    从 offset 处开始顺序写入文件的缓冲写入器
+
+    write() 只保存块的引用，累计达到 buffer_size 后一次 writev 落盘。
+    退出 with 块（包括异常时）会写出剩余数据，已收到的字节不会丢失。
+    """
+
+    def __init__(self, path, offset: int = 0, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.offset = offset
+        self.buffer_size = buffer_size
+        self.written = 0
+        self._chunks: List[bytes] = []
+        self._buffered = 0
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        os.lseek(self._fd, offset, os.SEEK_SET)
+
+    def preallocate(self, length: int) -> bool:
+        """为即将写入的 length 字节预分配空间（不改变文件大小）"""
+        return preallocate(self._fd, self.offset, length)
+
+    def write(self, chunk: bytes):
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        self.written += len(chunk)
+        if self._buffered >= self.buffer_size or len(self._chunks) >= _MAX_IOV:
+            self.flush()
+
+    def flush(self):
+        """把缓冲中的块写入文件"""
+        if not self._chunks:
+            return
+        chunks, self._chunks, self._buffered = self._chunks, [], 0
+        if hasattr(os, 'writev'):
+            done = os.writev(self._fd, chunks)
+            total = sum(len(c) for c in chunks)
+            if done == total:
+                return
+            # 部分写入：剩余数据拼起来继续写
+            remaining = memoryview(b''.join(chunks))[done:]
+        else:
+            remaining = memoryview(b''.join(chunks))
+        while remaining:
+            remaining = remaining[os.write(self._fd, remaining):]
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self.flush()
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ProgressReporter:
+    """
+    并发下载的汇总进度
+
+    各下载线程调用 start / set_total / update / finish 上报，
+    最多每 interval 秒重绘一次，显示进行中数量、完成数、总字节与速度。
+    """
+
+    def __init__(self, total_files: int = 0, interval: float = 0.5,
+                 stream=None, clock: Callable[[], float] = time.monotonic):
+        self.total_files = total_files
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._done: Dict[str, int] = {}
+        self._totals: Dict[str, int] = {}
+        self._received = 0
+        self._finished = 0
+        self._failed = 0
+        self._started_at = clock()
+        self._last_render = 0.0
+        self._rendered = False
+
+    def start(self, key: str, done: int = 0, total: Optional[int] = None):
+        """开始（或重新开始）一个下载，done 为已有的字节数（续传时）"""
+        with self._lock:
+            self._done[key] = done
+            if total:
+                self._totals[key] = total
+
+    def set_total(self, key: str, total: int):
+        with self._lock:
+            if total:
+                self._totals[key] = total
+
+    def update(self, key: str, n: int):
+        with self._lock:
+            self._done[key] = self._done.get(key, 0) + n
+            self._received += n
+            self._render()
+
+    def finish(self, key: str, success: Optional[bool] = True):
+        """结束一个下载，success 为 None 表示未完成也不算失败（如被暂缓）"""
+        with self._lock:
+            self._done.pop(key, None)
+            self._totals.pop(key, None)
+            if success:
+                self._finished += 1
+            elif success is not None:
+                self._failed += 1
+            self._render()
+
+    def close(self):
+        """最后重绘一次并换行"""
+        with self._lock:
+            if self._rendered:
+                self._render(force=True)
+                self.stream.write("\n")
+                self.stream.flush()
+
+    def _render(self, force: bool = False):
+        now = self._clock()
+        if not force and now - self._last_render < self.interval:
+            return
+        self._last_render = now
+        self._rendered = True
+
+        active_done = sum(self._done.values())
+        active_total = sum(self._totals.get(k, 0) for k in self._done)
+        elapsed = max(now - self._started_at, 1e-6)
+        files = f"{self._finished}/{self.total_files}" if self.total_files else str(self._finished)
+        line = (
+            f"\r⬇️  进行中 {len(self._done)} | 完成 {files}"
+            + (f" | 失败 {self._failed}" if self._failed else "")
+            + f" | 当前 {active_done / 1048576:.1f}"
+            + (f"/{active_total / 1048576:.1f}" if active_total else "")
+            + f" MB | {self._received / 1048576 / elapsed:.2f} MB/s"
+        )
+        self.stream.write(line.ljust(80))
+        self.stream.flush()
@@ -0,0 +1,194 @@
+"""
+Prompt 翻译：批量翻译、持久化缓存、后台翻译线程池
+
+- 多条 prompt 按换行拼成一个请求（不超过单次字符上限），一次往返翻译多条；
+- 译文以原文哈希为键缓存在 SQLite (translation_cache 表)，相同文本永远只翻译一次；
+- BackgroundTranslator 在后台线程池中翻译，完成后回填 downloaded_videos.prompt_content_cn，
+  下载流程不必等待翻译。
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+
+# Google 翻译单次请求的字符上限（留出余量）
+MAX_REQUEST_LENGTH = 4500
+# 拼接多条 prompt 时使用的分隔符，译文按它拆回多条
+BATCH_SEPARATOR = "\n"
+
+_local = threading.local()
+
+
+def text_hash(text: str) -> str:
+    """翻译缓存的键：原文的 SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _google_translate(text: str) -> str:
+    """用当前线程复用的 GoogleTranslator 翻译一段文本（英文 -> 简体中文）"""
+    translator = getattr(_local, 'translator', None)
+    if translator is None:
+        # deep_translator 导入较慢，只在真正需要翻译时导入
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source='en', target='zh-CN')
+        _local.translator = translator
+    return translator.translate(text)
+
+
+def split_long_text(text: str, max_length: int = MAX_REQUEST_LENGTH) -> List[str]:
+    """按句子把超长文本切成不超过 max_length 的若干段"""
+    if len(text) <= max_length:
+        return [text]
+
+    segments = []
+    current_segment = ""
+    for sentence in text.split('. '):
+        if len(current_segment) + len(sentence) + 2 <= max_length:
+            current_segment += sentence + '. '
+        else:
+            if current_segment:
+                segments.append(current_segment.strip())
+            current_segment = sentence + '. '
+    if current_segment:
+        segments.append(current_segment.strip())
+    return segments
+
+
+def translate_text(text: str, translate_fn: Callable[[str], str] = _google_translate) -> str:
+    """翻译单条文本，超长时分段翻译后拼接"""
+    return ' '.join(translate_fn(segment) for segment in split_long_text(text))
+
+
+def translate_batch(
+    texts: List[str],
+    translate_fn: Callable[[str], str] = _google_translate,
+    max_length: int = MAX_REQUEST_LENGTH,
+) -> List[Optional[str]]:
+    """
+    批量翻译，返回与 texts 一一对应的译文，翻译失败的位置为 None
+
+    短文本按换行拼接成不超过 max_length 的请求；若译文行数对不上
+    （翻译服务合并或拆分了行），该组退回逐条翻译。
+    """
+    results: List[Optional[str]] = [None] * len(texts)
+
+    def flush(group: List[int]):
+        if not group:
+            return
+        if len(group) > 1:
+            joined = BATCH_SEPARATOR.join(texts[i] for i in group)
+            try:
+                lines = translate_fn(joined).split(BATCH_SEPARATOR)
+            except Exception as e:
+                print(f"⚠️  批量翻译失败，改为逐条翻译: {e}")
+                lines = []
+            if len(lines) == len(group):
+                for i, line in zip(group, lines):
+                    results[i] = line.strip()
+                return
+        for i in group:
+            try:
+                results[i] = translate_text(texts[i], translate_fn)
+            except Exception as e:
+                print(f"⚠️  翻译失败: {e}")
+
+    group: List[int] = []
+    group_length = 0
+    for i, text in enumerate(texts):
+        if BATCH_SEPARATOR in text or len(text) > max_length:
+            # 自带换行或超长的文本无法安全拼接，单独翻译
+            flush([i])
+            continue
+        if group and group_length + len(text) + len(BATCH_SEPARATOR) > max_length:
+            flush(group)
+            group, group_length = [], 0
+        group.append(i)
+        group_length += len(text) + len(BATCH_SEPARATOR)
+    flush(group)
+    return results
+
+
+def translate_with_cache(
+    store,
+    texts: List[str],
+    translate_fn: Callable[[str], str] = _google_translate,
+) -> Dict[str, str]:
+    """翻译一组文本，先查缓存，只把未缓存的文本送去翻译；返回 {原文: 译文}"""
+    unique = list(dict.fromkeys(t for t in texts if t))
+    cached = store.get_cached_translations([text_hash(t) for t in unique])
+    translations = {t: cached[text_hash(t)] for t in unique if text_hash(t) in cached}
+
+    missing = [t for t in unique if t not in translations]
+    if missing:
+        new_entries = {}
+        for text, translated in zip(missing, translate_batch(missing, translate_fn)):
+            if translated is not None:
+                translations[text] = translated
+                new_entries[text_hash(text)] = (text, translated)
+        store.cache_translations(new_entries)
+    return translations
+
+
+class BackgroundTranslator:
+    """
+    后台翻译 prompt 并回填到下载记录
+
+    submit() 只是登记，攒满 batch_size 条后交给线程池批量翻译；
+    close() 提交剩余任务并等待全部完成。传入 metrics (Metrics) 时记录翻译耗时与回填条数。
+    """
+
+    def __init__(self, store, max_workers: int = 2, batch_size: int = 20,
+                 translate_fn: Callable[[str], str] = _google_translate, metrics=None):
+        self.store = store
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.translate_fn = translate_fn
+        self.translated_count = 0
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+
+    def submit(self, video_id: str, text: str):
+        """登记一条需要翻译并回填的 prompt"""
+        with self._lock:
+            self._pending.append((video_id, text))
+            if len(self._pending) >= self.batch_size:
+                self._dispatch()
+
+    def _dispatch(self):
+        batch, self._pending = self._pending, []
+        if batch:
+            self._futures.append(self._executor.submit(self._translate_and_fill, batch))
+
+    def _translate_and_fill(self, batch: List[tuple]):
+        timer = self.metrics.timer("translate") if self.metrics is not None else nullcontext()
+        with timer:
+            translations = translate_with_cache(self.store, [text for _, text in batch], self.translate_fn)
+        for video_id, text in batch:
+            if text in translations:
+                self.store.update_translation(video_id, translations[text])
+                with self._lock:
+                    self.translated_count += 1
+                if self.metrics is not None:
+                    self.metrics.inc("translations")
+
+    def close(self):
+        """提交剩余任务并等待所有翻译完成"""
+        with self._lock:
+            self._dispatch()
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"⚠️  后台翻译任务失败: {e}")
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
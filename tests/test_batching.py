@@ -0,0 +1,38 @@
+"""Tests for token-budget adaptive batching."""
+
+from collections import deque
+
+from dynamic_image.batching import AdaptiveBatcher, bisect, estimate_tokens
+
+
+def test_take_respects_size_and_token_budgets():
+    batcher = AdaptiveBatcher(initial_size=10, input_budget=25, output_budget=1000,
+                              output_tokens_per_item=10)
+    pending = deque(range(20))
+
+    # Each item costs 10 input tokens, so only two fit the input budget.
+    assert batcher.take(pending, lambda item: 10) == [0, 1]
+    # The output budget (1000 / 10 per item = 100) does not bind, the size does.
+    assert batcher.take(pending, lambda item: 1) == list(range(2, 12))
+
+    batcher.output_tokens_per_item = 250
+    assert batcher.take(pending, lambda item: 1) == [12, 13, 14, 15]
+
+
+def test_batch_size_adapts_to_results():
+    batcher = AdaptiveBatcher(initial_size=100, increase=10, output_budget=10**6)
+    batcher.record_success(100, 8000)
+    assert batcher.size == 110
+    assert 60 < batcher.output_tokens_per_item
+
+    batcher.record_truncated(80)
+    assert batcher.size == 60
+    # A smaller-than-target success does not grow the size.
+    batcher.record_success(30, 1800)
+    assert batcher.size == 60
+
+
+def test_bisect_and_estimate():
+    assert bisect([1, 2, 3]) == [[1], [2, 3]]
+    assert bisect([1]) == []
+    assert estimate_tokens("a" * 40) == 11
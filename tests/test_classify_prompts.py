@@ -0,0 +1,303 @@
+"""Tests for the Gemini classification pipeline, run against the local fake."""
+
+import pytest
+
+from dynamic_image import classify_prompts
+from dynamic_image.batching import AdaptiveBatcher
+from dynamic_image.fake_gemini import FakeGemini
+from dynamic_image.rate_limit import RateController
+
+
+def make_item(video_id, content):
+    return {"id": video_id, "prompt": {"decodedPrompt": [{"content": content}]}}
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch, tmp_path):
+    fake = FakeGemini(latency=0.05)
+    monkeypatch.setattr(classify_prompts, "genai_backend", fake)
+    monkeypatch.setattr(classify_prompts, "RESULT_DIR", tmp_path)
+    monkeypatch.setattr(
+        classify_prompts,
+        "gemini_limiter",
+        RateController(initial_rate=1000, max_rate=1000, burst=100),
+    )
+    return fake
+
+
+def test_classify_items_runs_batches_concurrently(fake_gemini):
+    contents = ["an anime girl", "a cat on a sofa", "a plain rock"]
+    items = [make_item(f"v{i}", contents[i % 3]) for i in range(24)]
+    batcher = AdaptiveBatcher(initial_size=2, max_size=2)
+    results = []
+
+    lost = classify_prompts.classify_items(
+        "prompt", items, batcher, max_in_flight=3, on_result=lambda batch, result: results.append(result)
+    )
+
+    assert lost == []
+    assert fake_gemini.calls == len(results) == 12
+    assert 1 < fake_gemini.peak_in_flight <= 3
+    categories = {}
+    for result in results:
+        for video_id, names in classify_prompts.invert_result(result).items():
+            categories[video_id] = names
+    assert categories == {f"v{i}": [["日漫风格", "美女"], ["动物萌宠"], ["未分类"]][i % 3] for i in range(24)}
+
+
+def test_failed_batch_only_loses_its_own_items(fake_gemini, monkeypatch):
+    def flaky(classifier, input_data):
+        if '"v1"' in input_data:
+            raise ConnectionError("network down")
+        return {"未分类": [{"id": video_id} for video_id in ("v0", "v2") if f'"{video_id}"' in input_data]}
+
+    monkeypatch.setattr(classify_prompts, "classify_with_retry", flaky)
+    items = [make_item("v0", "x"), make_item("v1", "y"), make_item("v2", "z")]
+    results = []
+
+    lost = classify_prompts.classify_items(
+        "prompt", items, AdaptiveBatcher(initial_size=1, max_size=1), max_in_flight=2, compact=False,
+        on_result=lambda batch, result: results.append(result),
+    )
+
+    assert lost == [items[1]]
+    assert sorted(r["未分类"][0]["id"] for r in results) == ["v0", "v2"]
+
+
+def test_incremental_run_only_sends_new_or_changed_items(fake_gemini, tmp_path, monkeypatch):
+    from dynamic_image.classification_cache import ClassificationCache
+
+    source = [make_item("a", "an anime girl"), make_item("b", "a cat"), make_item("c", "a rock")]
+    with ClassificationCache(str(tmp_path / "cache.db"), "p1", "model", 0.1) as cache:
+        first = classify_prompts.classify_incrementally("prompt", source, cache, preclassify=False)
+    assert fake_gemini.calls == 1
+
+    # "b" changes, "d" is new and "e" duplicates the content of "a".
+    source[1] = make_item("b", "a dog")
+    source += [make_item("d", "neon cyberpunk city"), make_item("e", "an anime girl")]
+    sent = []
+    original = classify_prompts.classify_items
+
+    def spy(prompt, items, **kwargs):
+        items = list(items)
+        sent.extend(item["id"] for item in items)
+        return original(prompt, items, **kwargs)
+
+    monkeypatch.setattr(classify_prompts, "classify_items", spy)
+
+    with ClassificationCache(str(tmp_path / "cache.db"), "p1", "model", 0.1) as cache:
+        second = classify_prompts.classify_incrementally("prompt", source, cache, preclassify=False)
+
+    assert sorted(sent) == ["b", "d"]
+    assert second["美女"] == first["美女"] + [{"id": "e", "content": "an anime girl"}]
+    assert [e["id"] for e in second["动物萌宠"]] == ["b"]
+    assert [e["id"] for e in second["赛博朋克风格"]] == ["d"]
+
+    # A different prompt.md hash invalidates every entry.
+    with ClassificationCache(str(tmp_path / "cache.db"), "p2", "model", 0.1) as cache:
+        assert cache.get_many(["x"]) == {}
+        classify_prompts.classify_incrementally("prompt", source, cache, preclassify=False)
+    assert sorted(sent) == ["a", "b", "b", "c", "d", "d"]
+
+
+def test_truncated_batches_are_bisected_without_losing_items(fake_gemini):
+    fake_gemini.max_items = 7
+    items = [make_item(f"v{i}", "an anime girl" if i % 2 else "a cat") for i in range(40)]
+    batcher = classify_prompts.new_batcher()
+    batcher.size = 20
+    seen = []
+
+    lost = classify_prompts.classify_items(
+        "prompt", items, batcher, max_in_flight=2,
+        on_result=lambda batch, result: seen.extend(classify_prompts.invert_result(result)),
+    )
+
+    assert lost == []
+    assert sorted(seen) == sorted(f"v{i}" for i in range(40))
+    assert batcher.truncations > 0
+    assert batcher.size <= 7 * 3 // 4 + batcher.increase
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_only_unparsable_output_is_bisected(fake_gemini, monkeypatch):
+    calls = []
+
+    def failing(classifier, input_data):
+        calls.append(input_data)
+        raise StatusError(429)
+
+    monkeypatch.setattr(classify_prompts, "classify_with_retry", failing)
+    items = [make_item(f"v{i}", "a cat") for i in range(8)]
+    batcher = classify_prompts.new_batcher()
+    batcher.size = 8
+
+    lost = classify_prompts.classify_items("prompt", items, batcher, max_in_flight=1)
+
+    # An exhausted transient error drops the batch; splitting would not help.
+    assert len(calls) == 1
+    assert lost == items
+
+
+def test_non_object_reply_is_bisected_instead_of_aborting(fake_gemini, monkeypatch):
+    calls = []
+
+    def list_reply(classifier, input_data):
+        calls.append(input_data)
+        return [{"id": "v0"}]
+
+    monkeypatch.setattr(classify_prompts, "classify_with_retry", list_reply)
+    items = [make_item(f"v{i}", "a cat") for i in range(4)]
+    batcher = classify_prompts.new_batcher(compact=False)
+    batcher.size = 4
+
+    lost = classify_prompts.classify_items("prompt", items, batcher, max_in_flight=1, compact=False)
+
+    assert len(calls) == 7
+    assert lost == items
+
+
+def test_fatal_gemini_error_aborts_the_run(fake_gemini, monkeypatch):
+    calls = []
+
+    def forbidden(classifier, input_data):
+        calls.append(input_data)
+        raise StatusError(403)
+
+    monkeypatch.setattr(classify_prompts, "classify_with_retry", forbidden)
+    items = [make_item(f"v{i}", "a cat") for i in range(40)]
+    batcher = classify_prompts.new_batcher()
+    batcher.size = 10
+
+    with pytest.raises(StatusError):
+        classify_prompts.classify_items("prompt", items, batcher, max_in_flight=2)
+    assert len(calls) <= 2
+
+
+def test_gemini_403_is_not_retried(fake_gemini, monkeypatch):
+    calls = []
+
+    def forbidden(classifier, input_data):
+        calls.append(input_data)
+        raise StatusError(403)
+
+    monkeypatch.setattr(classify_prompts, "classify_with_gemini", forbidden)
+    limiter = classify_prompts.gemini_limiter
+
+    with pytest.raises(StatusError):
+        classify_prompts.classify_with_retry(None, "[]")
+    assert len(calls) == 1
+    assert not limiter.is_open(classify_prompts.GEMINI_HOST)
+    assert limiter.summary().endswith("(成功 0, 限流 0, 正常)")
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_both_wire_formats_expand_to_the_same_result(fake_gemini, compact):
+    items = [make_item("a", "an anime girl with a cat"), make_item("b", "a rock")]
+    results = []
+
+    lost = classify_prompts.classify_items(
+        "prompt", items, compact=compact, on_result=lambda batch, result: results.append(result)
+    )
+
+    assert lost == []
+    # The verbose format also lists empty categories; compare non-empty ones.
+    assert [{k: v for k, v in result.items() if v} for result in results] == [{
+        "日漫风格": [{"id": "a", "content": "an anime girl with a cat"}],
+        "美女": [{"id": "a", "content": "an anime girl with a cat"}],
+        "动物萌宠": [{"id": "a", "content": "an anime girl with a cat"}],
+        "未分类": [{"id": "b", "content": "a rock"}],
+    }]
+
+
+def test_compact_input_and_expansion():
+    items = [make_item("uuid-1", "a cat"), make_item("uuid-2", "neon girl")]
+
+    assert classify_prompts.prepare_compact_input(items) == '[[0,"a cat"],[1,"neon girl"]]'
+    expanded = classify_prompts.expand_compact_result({"0": ["I"], "1": ["D", "G", "Z"]}, items)
+    assert expanded == {
+        "动物萌宠": [{"id": "uuid-1", "content": "a cat"}],
+        "赛博朋克风格": [{"id": "uuid-2", "content": "neon girl"}],
+        "美女": [{"id": "uuid-2", "content": "neon girl"}],
+    }
+    for bad_key in ["7", "2", "-1", "x"]:
+        with pytest.raises(classify_prompts.MalformedResponseError):
+            classify_prompts.expand_compact_result({"0": ["I"], bad_key: ["A"]}, items)
+
+
+def test_keyword_matches_skip_gemini(fake_gemini, tmp_path, capsys):
+    from dynamic_image.classification_cache import ClassificationCache
+
+    source = [
+        make_item("a", "a neon cyberpunk girl"),
+        make_item("b", "a room with no cat"),
+        make_item("c", "一只猫"),
+        make_item("d", "a rock"),
+    ]
+    with ClassificationCache(str(tmp_path / "cache.db"), "p", "model", 0.1) as cache:
+        result = classify_prompts.classify_incrementally("prompt", source, cache)
+
+    assert fake_gemini.calls == 1
+    assert [e["id"] for e in result["赛博朋克风格"]] == ["a"]
+    assert "1/4 条 (25%)" in capsys.readouterr().out
+
+
+def test_cached_gemini_labels_win_over_keywords(fake_gemini, tmp_path):
+    from dynamic_image.classification_cache import ClassificationCache, content_hash
+
+    source = [make_item("a", "a neon cyberpunk girl")]
+    with ClassificationCache(str(tmp_path / "cache.db"), "p", "model", 0.1) as cache:
+        cache.put_many({content_hash("a neon cyberpunk girl"): ["美女"]})
+        result = classify_prompts.classify_incrementally("prompt", source, cache)
+
+    assert fake_gemini.calls == 0
+    assert result == {"美女": [{"id": "a", "content": "a neon cyberpunk girl"}]}
+
+
+def test_local_model_answers_before_gemini(fake_gemini, tmp_path):
+    from dynamic_image.classification_cache import ClassificationCache
+
+    class StubModel:
+        def __init__(self):
+            self.batches = []
+
+        def predict(self, texts):
+            self.batches.append(list(texts))
+            return [["北欧风格"] if "oak" in text else None for text in texts]
+
+    model = StubModel()
+    source = [make_item("a", "a white oak shelf"), make_item("b", "a plain rock")]
+    with ClassificationCache(str(tmp_path / "cache.db"), "p", "model", 0.1) as cache:
+        result = classify_prompts.classify_incrementally(
+            "prompt", source, cache, preclassify=False, local_model=model
+        )
+
+    assert model.batches == [["a white oak shelf", "a plain rock"]]
+    assert fake_gemini.calls == 1
+    assert [e["id"] for e in result["北欧风格"]] == ["a"]
+
+
+def test_near_duplicates_reuse_the_first_classification(fake_gemini, tmp_path):
+    from dynamic_image.classification_cache import ClassificationCache
+    from dynamic_image.near_duplicate import NearDuplicateIndex
+
+    base = "a long exposure photo of a quiet harbour at dawn with fishing boats and soft mist over the water"
+    source = [
+        make_item("a", base),
+        make_item("b", base.replace("long exposure", "short exposure")),
+        make_item("c", "an anime girl"),
+    ]
+    index = NearDuplicateIndex()
+    with ClassificationCache(str(tmp_path / "cache.db"), "p", "model", 0.1) as cache:
+        result = classify_prompts.classify_incrementally(
+            "prompt", source, cache, preclassify=False, near_duplicates=index
+        )
+
+    assert index.duplicates == {"b": "a"}
+    assert fake_gemini.calls == 1
+    by_id = {e["id"]: category for category, entries in result.items() for e in entries}
+    assert by_id["b"] == by_id["a"]
@@ -0,0 +1,74 @@
+"""Tests for the unified command line entry point."""
+
+import subprocess
+import sys
+
+import dynamic_image
+from dynamic_image import cli
+from dynamic_image.download_store import DownloadStore
+
+
+def test_light_commands_do_not_import_heavy_sdks():
+    code = (
+        "import sys; import dynamic_image.cli, dynamic_image.download_vedio, dynamic_image.search_player; "
+        "print(','.join(m for m in ('google.generativeai', 'deep_translator', 'curl_cffi') if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == ""
+
+
+def test_classify_and_pipeline_do_not_import_numpy():
+    code = (
+        "import sys; import dynamic_image.classify_prompts, dynamic_image.pipeline; "
+        "print('numpy' in sys.modules)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "False"
+
+
+def test_import_time_benchmark_reports_milliseconds():
+    assert 0 < cli.import_time("dynamic_image.download_store", repeat=1) < 10_000
+
+
+def test_category_weights_and_stats_under_root(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("DYNAMIC_IMAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(dynamic_image, "PROJECT_ROOT", tmp_path)
+    with DownloadStore(str(tmp_path / "video_download.db")) as store:
+        store.merge_classification({"美女": [{"id": "a", "content": "x"}, {"id": "b", "content": "y"}]})
+
+    assert cli.main(["--root", str(tmp_path), "stats"]) == 0
+    assert "美女: 0/2 (0%)" in capsys.readouterr().out
+    assert cli.category_weight("美女=2") == ("美女", 2)
+    assert cli.category_weight("动物萌宠") == ("动物萌宠", 1)
+
+
+def test_stats_is_read_only_and_refuses_old_schemas(tmp_path, monkeypatch, capsys):
+    import sqlite3
+
+    monkeypatch.setattr(dynamic_image, "PROJECT_ROOT", tmp_path)
+    db_file = tmp_path / "video_download.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE video_sequence (id INTEGER PRIMARY KEY, current_index INTEGER)")
+    conn.commit()
+    conn.close()
+    before = db_file.read_bytes()
+
+    assert cli.main(["--root", str(tmp_path), "stats"]) == 1
+    assert "schema 为 v0" in capsys.readouterr().out
+    assert db_file.read_bytes() == before
+
+
+def test_download_exit_code_reports_failures(tmp_path, monkeypatch):
+    from collections import Counter
+
+    from dynamic_image import download_vedio
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dynamic_image, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(download_vedio, "METRICS_DIR", tmp_path / "metrics")
+    for outcomes, code in [(Counter(success=1, failed=2), 0), (Counter(failed=3), 1),
+                           (Counter(success=1, deferred=1), 1), (Counter(), 0)]:
+        monkeypatch.setattr(download_vedio, "run", lambda categories, outcomes=outcomes: outcomes)
+        assert cli.main(["--root", str(tmp_path), "download"]) == code
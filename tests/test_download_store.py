@@ -0,0 +1,111 @@
+"""Tests for the SQLite download store."""
+
+import sqlite3
+import threading
+
+import pytest
+
+from dynamic_image.download_store import MIGRATIONS, DownloadStore
+
+
+def test_migrates_legacy_database(tmp_path):
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        "CREATE TABLE video_sequence (id INTEGER PRIMARY KEY, current_index INTEGER)"
+    )
+    conn.execute("INSERT INTO video_sequence VALUES (1, 37)")
+    conn.execute(
+        "CREATE TABLE downloaded_videos (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " video_id TEXT NOT NULL UNIQUE, prompt_content TEXT,"
+        " prompt_content_cn TEXT, download_time TIMESTAMP, file_path TEXT)"
+    )
+    conn.commit()
+    conn.close()
+
+    DownloadStore(str(db_file)).close()
+
+    conn = sqlite3.connect(db_file)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "legacy_video_sequence" in tables and "video_sequence" not in tables
+    assert "idx_downloaded_videos_category" in tables
+    assert "idx_downloaded_videos_video_id" not in tables
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(downloaded_videos)")]
+    assert "category_name" in columns
+
+
+def test_batched_writes_from_worker_threads(tmp_path):
+    db_file = str(tmp_path / "store.db")
+    store = DownloadStore(db_file, batch_size=1000)
+    store.init_category_if_not_exists("美女")
+
+    def worker(offset):
+        for i in range(50):
+            video_id = f"v{offset + i}"
+            store.save_downloaded_video(video_id, "美女", "prompt", None, f"{video_id}.mp4")
+            store.update_sequence("美女", video_id, "prompt", None)
+
+    threads = [threading.Thread(target=worker, args=(n * 50,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Visible on the store's own connection before the batch is committed.
+    assert store.get_current_sequence("美女") == 200
+    assert not store.save_downloaded_video("v0", "美女", "prompt", None, "v0.mp4")
+    other = sqlite3.connect(db_file)
+    assert other.execute("SELECT COUNT(*) FROM downloaded_videos").fetchone()[0] == 0
+
+    store.close()
+    assert other.execute("SELECT COUNT(*) FROM downloaded_videos").fetchone()[0] == 200
+
+
+def test_classification_store_queries(tmp_path):
+    store = DownloadStore(str(tmp_path / "store.db"))
+    store.merge_classification({
+        "美女": [{"id": "a", "content": "girl"}, {"id": "b", "content": "woman"},
+               {"id": "c", "content": "lady"}],
+        "情侣": [{"id": "b", "content": "woman"}],
+    })
+    store.save_downloaded_video("a", "美女", "girl", None, "a.mp4")
+    store.mark_failed("b")
+
+    assert store.next_undownloaded("美女", 10) == [("c", "lady")]
+    assert store.next_undownloaded("美女", 10, max_failures=2) == [("b", "woman"), ("c", "lady")]
+    assert store.get_item_categories(["b", "z"]) == {"b": ["美女", "情侣"]}
+    assert store.category_counts() == {"美女": (3, 1), "情侣": (1, 0)}
+
+    # A later run re-classifies b and adds d; existing order is kept.
+    store.merge_classification({"日漫风格": [{"id": "b", "content": "anime woman"},
+                                          {"id": "d", "content": "anime"}],
+                                "美女": [{"id": "a", "content": "girl"}]})
+    assert store.get_item_categories(["a", "b"]) == {"a": ["美女"], "b": ["日漫风格"]}
+    assert store.next_undownloaded("日漫风格", 10, max_failures=2) == [
+        ("b", "anime woman"), ("d", "anime")
+    ]
+    assert store.count_items() == 4
+
+    # a, already downloaded, is newly classified as 日漫风格: attributed once.
+    store.merge_classification({"日漫风格": [{"id": "a", "content": "girl"}]})
+    assert store.attribute_downloaded("日漫风格") == [("a", "a.mp4")]
+    assert store.attribute_downloaded("日漫风格") == []
+    store.close()
+
+
+def test_near_duplicates_are_deprioritized_or_skipped(tmp_path):
+    store = DownloadStore(str(tmp_path / "store.db"))
+    store.merge_classification({"美女": [{"id": i, "content": i} for i in ("a", "b", "c")]})
+    store.mark_duplicates({"b": "a"})
+    store.save_downloaded_video("a", "美女", "a", "中文", "a.mp4")
+
+    assert store.next_undownloaded("美女", 10) == [("b", "b"), ("c", "c")]
+    assert store.next_undownloaded("美女", 10, duplicates="deprioritize") == [("c", "c"), ("b", "b")]
+    assert store.next_undownloaded("美女", 1, duplicates="deprioritize") == [("c", "c")]
+    assert store.next_undownloaded("美女", 10, duplicates="skip") == [("c", "c")]
+    assert store.get_duplicate_translations(["b", "c"]) == {"b": "中文"}
+    with pytest.raises(ValueError):
+        store.next_undownloaded("美女", 10, duplicates="drop")
+    store.close()
@@ -0,0 +1,124 @@
+"""Tests for the video download helpers."""
+
+import random
+import threading
+import time
+
+from collections import Counter
+
+from dynamic_image import download_vedio
+from dynamic_image.download_store import DownloadStore
+from tests.test_mp4_index import make_mp4
+
+
+def test_concurrent_download_keeps_order(monkeypatch):
+    """Results come back in submission order while downloads overlap."""
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_download(video_id, prompt_content, progress=None):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(random.uniform(0.01, 0.05))
+        with lock:
+            active -= 1
+        return video_id != "v3", f"{video_id}.mp4"
+
+    monkeypatch.setattr(download_vedio, "download_video_by_id", fake_download)
+    videos = [{"id": f"v{i}", "content": f"prompt {i}"} for i in range(10)]
+
+    results = list(download_vedio.download_videos_concurrently(videos, max_workers=4))
+
+    assert [video["id"] for video, _, _ in results] == [v["id"] for v in videos]
+    assert [success for _, success, _ in results].count(False) == 1
+    assert 1 < peak <= 4
+
+
+class FakeRangeResponse:
+    """Minimal streaming response that honours a ``Range: bytes=N-`` header."""
+
+    def __init__(self, payload, range_header, cut_after=None):
+        start = int(range_header[len("bytes="):].split("-")[0])
+        self.body = payload[start:cut_after]
+        self.status_code = 206 if start < len(payload) else 416
+        self.headers = {
+            "content-range": f"bytes {start}-{len(payload) - 1}/{len(payload)}"
+            if self.status_code == 206
+            else f"bytes */{len(payload)}",
+            "content-length": str(len(payload) - start),
+        }
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+def test_parse_content_range():
+    assert download_vedio._parse_content_range("bytes 100-199/1000") == (100, 1000)
+    assert download_vedio._parse_content_range("bytes */1000") == (None, 1000)
+    assert download_vedio._parse_content_range("garbage") == (None, None)
+
+
+def test_download_resumes_within_one_call(monkeypatch, tmp_path):
+    payload = bytes(range(256)) * 100
+    requested = []
+
+    class FakePool:
+        def fetch(self, method, url, on_chunk, on_start=None, headers=None, **kwargs):
+            requested.append(headers["Range"])
+            cut_after = len(payload) // 2 if len(requested) == 1 else None
+            response = FakeRangeResponse(payload, headers["Range"], cut_after)
+            if on_start and response.body:
+                on_start(response.status_code, int(response.headers["content-length"]))
+            for chunk in response.iter_content(1000):
+                on_chunk(chunk)
+            if cut_after:
+                raise ConnectionError("connection reset")
+            return response
+
+    monkeypatch.setattr(download_vedio, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(download_vedio, "session_pool", FakePool())
+    monkeypatch.setattr(download_vedio, "RESUME_BACKOFF", 0)
+
+    # The first request is cut off half way; the retry only asks for the missing bytes.
+    success, path = download_vedio.download_video_by_id("vid", "prompt")
+    assert success
+    assert requested == ["bytes=0-", f"bytes={len(payload) // 2}-"]
+    assert (tmp_path / "vid.mp4").read_bytes() == payload
+    assert not (tmp_path / "vid.mp4.part").exists()
+
+
+def test_interrupted_download_resumes_in_the_next_round(monkeypatch, tmp_path):
+    payload = make_mp4(media=50_000)
+    requested = []
+
+    class FlakyPool:
+        def fetch(self, method, url, on_chunk, on_start=None, headers=None, **kwargs):
+            requested.append(headers["Range"])
+            cut_after = len(payload) // 2 if len(requested) == 1 else None
+            response = FakeRangeResponse(payload, headers["Range"], cut_after)
+            for chunk in response.iter_content(1000):
+                on_chunk(chunk)
+            if cut_after:
+                raise ConnectionError("connection reset")
+            return response
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(download_vedio, "OUTPUT_DIR", str(tmp_path / "videos"))
+    monkeypatch.setattr(download_vedio, "session_pool", FlakyPool())
+    monkeypatch.setattr(download_vedio, "MAX_RETRIES", 0)
+
+    with DownloadStore(str(tmp_path / "download.db")) as store:
+        store.merge_classification({"美女": [{"id": "vid", "content": "a girl"}]})
+
+        # Round one gives up after the connection drops, keeping the .part file.
+        assert download_vedio.download_categories(store, {"美女": 1}) == Counter(failed=1)
+        assert (tmp_path / "videos" / "vid.mp4.part").stat().st_size == len(payload) // 2
+
+        # Round two queues the video again and resumes from the .part file.
+        assert download_vedio.download_categories(store, {"美女": 1}) == Counter(success=1)
+    assert requested == ["bytes=0-", f"bytes={len(payload) // 2}-"]
+    assert (tmp_path / "videos" / "vid.mp4").read_bytes() == payload
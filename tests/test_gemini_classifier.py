@@ -0,0 +1,45 @@
+"""Tests for the long-lived Gemini classifier and its prompt delivery strategies."""
+
+import json
+
+from dynamic_image.fake_gemini import FakeGemini
+from dynamic_image.gemini_classifier import ContextCachePrompt, GeminiClassifier
+
+
+SYSTEM_PROMPT = "Classify prompts.\n- A: 日漫风格\n- G: 美女\n"
+BATCH = '```json\n[[0,"an anime girl"]]\n```'
+
+
+def test_model_is_created_once_and_usage_is_recorded():
+    fake = FakeGemini(latency=0)
+    classifier = GeminiClassifier(fake, SYSTEM_PROMPT, "model", {})
+
+    for _ in range(3):
+        assert json.loads(classifier.generate(BATCH)) == {"0": ["A", "G"]}
+
+    assert fake.models_created == 1
+    assert classifier.calls == 3
+    assert classifier.prompt_tokens > 0 and classifier.cached_tokens == 0
+    assert "system_instruction" in classifier.summary()
+
+
+def test_context_cache_counts_cached_tokens_and_is_deleted():
+    fake = FakeGemini(latency=0)
+    with GeminiClassifier(fake, SYSTEM_PROMPT, "model", {}, ContextCachePrompt()) as classifier:
+        classifier.generate(BATCH)
+        assert classifier.cached_tokens == classifier.static_tokens
+
+    assert fake.cached_contents[0].deleted
+
+
+def test_context_cache_falls_back_to_system_instruction():
+    fake = FakeGemini(latency=0)
+
+    def too_short(**kwargs):
+        raise ValueError("Cached content is too small")
+
+    fake.caching.CachedContent.create = too_short
+    classifier = GeminiClassifier(fake, SYSTEM_PROMPT, "model", {}, ContextCachePrompt())
+
+    assert classifier.strategy.name == "system_instruction"
+    assert json.loads(classifier.generate(BATCH)) == {"0": ["A", "G"]}
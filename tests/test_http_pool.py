@@ -0,0 +1,79 @@
+"""Tests for the shared HTTP session pool against a local server."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dynamic_image.http_pool import SessionPool
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """Keep-alive handler that records which client connection served each request."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(server.delay)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = set()
+    server.active = 0
+    server.peak = 0
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("backend", ["requests", "curl_cffi"])
+def test_connection_is_reused(local_server, backend):
+    pool = SessionPool(backend=backend, impersonate=None)
+    url = f"http://127.0.0.1:{local_server.server_port}/"
+
+    for _ in range(10):
+        assert pool.get(url).status_code == 200
+    chunks = []
+    assert pool.fetch("GET", url, chunks.append).status_code == 200
+    assert b"".join(chunks) == b"ok"
+    pool.close()
+
+    assert len(local_server.connections) == 1
+
+
+@pytest.mark.parametrize("backend", ["requests", "curl_cffi"])
+def test_per_host_cap(local_server, backend):
+    local_server.delay = 0.05
+    pool = SessionPool(backend=backend, impersonate=None, max_per_host=2)
+    url = f"http://127.0.0.1:{local_server.server_port}/"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(lambda _: pool.get(url).status_code, range(16)))
+    pool.close()
+
+    assert statuses == [200] * 16
+    assert local_server.peak <= 2
@@ -0,0 +1,28 @@
+"""Tests for the local keyword pre-classifier."""
+
+from dynamic_image.keyword_classifier import KeywordClassifier
+
+
+def test_priority_cap_prefers_style_and_couple():
+    classifier = KeywordClassifier()
+    text = "A retro VHS shot of a couple kissing, a handsome man and a beautiful woman"
+
+    assert classifier.match(text) == ["情侣", "美女", "复古风格", "帅哥"]
+    assert classifier.classify(text) == ["情侣", "美女", "复古风格"]
+
+
+def test_word_boundaries_plurals_and_phrases():
+    classifier = KeywordClassifier()
+
+    assert classifier.classify("Two women and their kittens") == ["美女", "动物萌宠"]
+    # "woman" must not also count as "man"; "catwalk" is not a cat.
+    assert classifier.classify("a woman on the catwalk") == ["美女"]
+    assert classifier.classify("high tech low life alley") == ["赛博朋克风格"]
+
+
+def test_uncertain_prompts_are_forwarded():
+    classifier = KeywordClassifier()
+
+    assert classifier.classify("a quiet lake at dawn") is None
+    assert classifier.classify("一个女孩在雨中") is None
+    assert classifier.classify("an empty street, no people, without a dog") is None
@@ -0,0 +1,71 @@
+"""Tests for the per-run metrics layer."""
+
+import json
+
+from dynamic_image.metrics import Histogram, Metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_timers_counters_and_summary():
+    clock = FakeClock()
+    metrics = Metrics("download", clock=clock)
+
+    with metrics.timer("download"):
+        clock.now += 2.0
+    with metrics.timer("save"):
+        clock.now += 0.5
+    metrics.inc("http_responses", status=403)
+    metrics.inc("http_responses", status=403)
+    metrics.inc("bytes", 1024)
+
+    assert metrics.stage_totals() == {"download": 2.0, "save": 0.5}
+    assert metrics.counter("http_responses", status="403") == 2
+    assert metrics.summary() == "总耗时 2.5s；各阶段: download 2.0s，save 0.5s"
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+
+    assert histogram.bucket_counts == [1, 2, 1]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_write_json_and_prometheus_textfile(tmp_path):
+    clock = FakeClock()
+    metrics = Metrics("classify", clock=clock)
+    metrics.inc("items", 3, source="cache")
+    metrics.inc("gemini_tokens", 120, kind="input")
+    metrics.observe("stage_seconds", 0.2, stage="api")
+
+    json_file, prom_file = metrics.write(tmp_path)
+
+    summary = json.loads(json_file.read_text(encoding="utf-8"))
+    assert {"name": "items", "labels": {"source": "cache"}, "value": 3} in summary["counters"]
+    text = prom_file.read_text(encoding="utf-8")
+    assert "# TYPE dynamic_image_classify_items_total counter" in text
+    assert 'dynamic_image_classify_items_total{source="cache"} 3' in text
+    assert 'dynamic_image_classify_stage_seconds_bucket{stage="api",le="0.25"} 1' in text
+    assert 'dynamic_image_classify_stage_seconds_count{stage="api"} 1' in text
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_write_keeps_only_the_latest_json_summaries(tmp_path):
+    for stamp in ["20250101_000000", "20250102_000000", "20250103_000000"]:
+        (tmp_path / f"classify_{stamp}.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "download_20250101_000000.json").write_text("{}", encoding="utf-8")
+
+    json_file, _ = Metrics("classify").write(tmp_path, keep=2)
+
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == [
+        "classify_20250103_000000.json", json_file.name, "download_20250101_000000.json",
+    ]
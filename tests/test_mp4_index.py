@@ -0,0 +1,90 @@
+"""Tests for the MP4 box parser and the metadata index."""
+
+import struct
+
+from dynamic_image import download_vedio
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.mp4_index import probe, scan_downloads, scan_files
+from dynamic_image.scheduler import WorkItem
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def make_mp4(faststart=True, width=1280, height=720, codec=b"avc1", seconds=5.0, media=4096) -> bytes:
+    mvhd = box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, int(seconds * 1000)) + bytes(80))
+    tkhd = box(b"tkhd", bytes(4) + bytes(20) + bytes(8) + bytes(8) + bytes(36)
+               + struct.pack(">II", width << 16, height << 16))
+    hdlr = box(b"hdlr", bytes(4) + bytes(4) + b"vide" + bytes(12) + b"VideoHandler\0")
+    stsd = box(b"stsd", bytes(4) + struct.pack(">I", 1) + box(codec, bytes(78)))
+    trak = box(b"trak", tkhd + box(b"mdia", hdlr + box(b"minf", box(b"stbl", stsd))))
+    moov = box(b"moov", mvhd + trak)
+    ftyp = box(b"ftyp", b"isom" + bytes(4) + b"isomavc1")
+    mdat = box(b"mdat", bytes(media))
+    return ftyp + (moov + mdat if faststart else mdat + moov)
+
+
+def test_probe_reads_metadata_and_faststart(tmp_path):
+    fast = tmp_path / "fast.mp4"
+    fast.write_bytes(make_mp4())
+    slow = tmp_path / "slow.mp4"
+    slow.write_bytes(make_mp4(faststart=False, width=720, height=1280, codec=b"hvc1"))
+
+    info = probe(str(fast))
+    assert (info.duration, info.width, info.height, info.codec) == (5.0, 1280, 720, "avc1")
+    assert info.faststart and info.complete and info.error is None
+
+    info = probe(str(slow))
+    assert (info.width, info.height, info.codec, info.faststart, info.complete) == (720, 1280, "hvc1", False, True)
+
+
+def test_probe_detects_truncated_and_invalid_files(tmp_path):
+    data = make_mp4()
+    truncated = tmp_path / "truncated.mp4"
+    truncated.write_bytes(data[:-100])
+    moov_missing = tmp_path / "moov_missing.mp4"
+    moov_missing.write_bytes(make_mp4(faststart=False)[:-50])
+    garbage = tmp_path / "garbage.mp4"
+    garbage.write_bytes(b"<html>403 Forbidden</html>")
+
+    for path in (truncated, moov_missing, garbage, tmp_path / "missing.mp4"):
+        info = probe(str(path))
+        assert not info.complete and info.error
+    assert "截断" in probe(str(truncated)).error
+
+
+def test_bulk_scan_on_process_pool_fills_indexed_columns(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"v{i}.mp4"
+        data = make_mp4(seconds=i)
+        path.write_bytes(data if i != 3 else data[:-10])
+        paths.append(str(path))
+
+    assert [info.duration for info in scan_files(paths, workers=2)][:3] == [0.0, 1.0, 2.0]
+
+    with DownloadStore(str(tmp_path / "download.db")) as store:
+        for i, path in enumerate(paths):
+            store.save_downloaded_video(f"v{i}", "美女", "prompt", None, path)
+        assert scan_downloads(store, workers=2) == {"scanned": 20, "incomplete": 1}
+        assert store.get_files_to_scan() == []
+        assert [video_id for video_id, _ in store.find_videos(min_duration=18)] == ["v18", "v19"]
+        assert [video_id for video_id, _ in store.find_videos(complete=False)] == ["v3"]
+
+
+def test_truncated_download_is_recorded_as_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_vedio, "OUTPUT_DIR", str(tmp_path))
+    good, bad = tmp_path / "good.mp4", tmp_path / "bad.mp4"
+    good.write_bytes(make_mp4())
+    bad.write_bytes(make_mp4()[:-100])
+
+    with DownloadStore(str(tmp_path / "download.db")) as store:
+        store.merge_classification({"美女": [{"id": "good"}, {"id": "bad"}]})
+        assert download_vedio.record_download(store, WorkItem("good", "p", "美女", ["美女"]), True, str(good)) == "success"
+        assert download_vedio.record_download(store, WorkItem("bad", "p", "美女", ["美女"]), True, str(bad)) == "failed"
+
+        assert [video_id for video_id, _ in store.find_videos()] == ["good"]
+        assert store.filter_undownloaded(["good", "bad"], max_failures=2) == ["bad"]
+    assert not bad.exists() and not (tmp_path / "bad.mp4.part").exists()
+    assert not (tmp_path / download_vedio.CATEGORY_VIEW_DIR / "美女" / "bad.mp4").exists()
@@ -0,0 +1,27 @@
+"""Tests for SimHash near-duplicate detection."""
+
+from dynamic_image.near_duplicate import DEFAULT_MAX_DISTANCE, NearDuplicateIndex, hamming_distance, simhash
+
+
+BASE = ("detailed pencil drawing of a jellyfish with alien geometry, on a white background "
+        "with notes and diagrams, in the style of albrecht durer, ink on paper")
+
+
+def test_small_edits_keep_fingerprints_close():
+    edited = BASE.replace("white background", "black background")
+    unrelated = "a neon cyberpunk street at night with rain and flying cars"
+
+    assert hamming_distance(simhash(BASE), simhash(edited)) <= DEFAULT_MAX_DISTANCE
+    assert hamming_distance(simhash(BASE), simhash(unrelated)) > 10
+    assert simhash("") == 0
+
+
+def test_index_groups_duplicates_under_first_id():
+    index = NearDuplicateIndex()
+
+    assert index.add("a", BASE) is None
+    assert index.add("b", BASE.replace("white background", "black background")) == "a"
+    assert index.add("c", BASE) == "a"
+    assert index.add("d", "a cat sleeping on a sunny windowsill") is None
+    assert index.add("a", BASE) is None
+    assert index.duplicates == {"b": "a", "c": "a"}
@@ -0,0 +1,110 @@
+"""Tests for the streaming classify-to-download pipeline."""
+
+import threading
+import time
+
+from dynamic_image import classify_prompts, download_vedio, pipeline
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.fake_gemini import FakeGemini
+from dynamic_image.rate_limit import RateController
+from dynamic_image.scheduler import WorkItem
+from tests.test_mp4_index import make_mp4
+
+
+def test_download_stage_blocks_producer_when_queue_is_full():
+    gate = threading.Event()
+
+    def download(video_id, content, progress):
+        gate.wait(5)
+        return True, f"{video_id}.mp4"
+
+    stage = pipeline.DownloadStage(download, lambda item, ok, path: "success", workers=1, queue_size=1)
+    stage.submit(WorkItem("a", "", "美女", ["美女"]))  # taken by the worker
+    time.sleep(0.05)
+    stage.submit(WorkItem("b", "", "美女", ["美女"]))  # fills the queue
+
+    producer = threading.Thread(target=stage.submit, args=(WorkItem("c", "", "美女", ["美女"]),))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+
+    gate.set()
+    producer.join(5)
+    assert stage.close() == {"success": 3}
+
+
+def test_download_stage_skips_repeated_ids():
+    downloaded = []
+    stage = pipeline.DownloadStage(
+        lambda video_id, content, progress: (downloaded.append(video_id), (True, None))[1],
+        lambda item, success, file_path: "success",
+        workers=2, max_downloads=2,
+    )
+    items = [WorkItem(video_id, "", "美女", ["美女"]) for video_id in ["x", "x", "y", "x"]]
+
+    assert all(stage.submit(item) for item in items)
+    assert stage.close() == {"success": 2}
+    assert sorted(downloaded) == ["x", "y"]
+
+
+def test_select_downloads_uses_heaviest_target_as_source():
+    rows = [
+        ("a", "girl and cat", ["美女", "动物萌宠"]),
+        ("b", "rock", ["未分类"]),
+        ("c", "cat", ["动物萌宠"]),
+    ]
+    items = pipeline.select_downloads(rows, {"美女": 1, "动物萌宠": 3}, skip={"c"})
+
+    assert [(i.video_id, i.source, i.categories) for i in items] == [("a", "动物萌宠", ["美女", "动物萌宠"])]
+
+
+def fake_pipeline(tmp_path, monkeypatch, texts):
+    """用本地 Gemini 替身和假下载函数准备流水线，返回记录下载 id 的列表"""
+    monkeypatch.setattr(classify_prompts, "genai_backend", FakeGemini(latency=0.05))
+    monkeypatch.setattr(classify_prompts, "gemini_limiter",
+                        RateController(initial_rate=1000, max_rate=1000, burst=100))
+    monkeypatch.setattr(classify_prompts, "RESULT_DIR", tmp_path)
+    monkeypatch.setattr(classify_prompts, "CACHE_DB", tmp_path / "cache.db")
+    monkeypatch.setattr(classify_prompts, "DOWNLOAD_DB", tmp_path / "download.db")
+    monkeypatch.setattr(classify_prompts, "USE_TFIDF_MODEL", False)
+    monkeypatch.setattr(download_vedio, "OUTPUT_DIR", str(tmp_path / "videos"))
+    monkeypatch.setattr(download_vedio, "TRANSLATE_PROMPTS", False)
+    records = [{"id": f"v{i}", "content": text} for i, text in enumerate(texts)]
+    monkeypatch.setattr(classify_prompts, "load_source_data", lambda: iter(records))
+
+    downloaded = []
+
+    def fake_download(video_id, content, progress):
+        path = tmp_path / f"{video_id}.mp4"
+        path.write_bytes(make_mp4())
+        downloaded.append(video_id)
+        return True, str(path)
+
+    monkeypatch.setattr(download_vedio, "download_video_by_id", fake_download)
+    return downloaded
+
+
+def test_pipeline_downloads_target_categories_while_classifying(tmp_path, monkeypatch):
+    downloaded = fake_pipeline(tmp_path, monkeypatch,
+                               ["a girl in the rain", "a quiet lake", "一个女孩", "a woman reading"])
+
+    outcomes = pipeline.run_pipeline({"美女": 1})
+
+    assert sorted(downloaded) == ["v0", "v3"]
+    assert outcomes == {"success": 2}
+    with DownloadStore(str(tmp_path / "download.db")) as store:
+        assert store.category_counts()["美女"] == (2, 2)
+        assert store.count_items() == 4
+
+
+def test_cli_max_downloads_caps_the_pipeline(tmp_path, monkeypatch):
+    from dynamic_image import cli
+
+    downloaded = fake_pipeline(tmp_path, monkeypatch, ["a girl in the rain", "一个女孩", "a woman reading"])
+    monkeypatch.setattr(classify_prompts, "METRICS_DIR", tmp_path / "metrics")
+    monkeypatch.setattr(pipeline, "PIPELINE_MAX_DOWNLOADS", None)
+    monkeypatch.setattr(download_vedio, "TARGET_CATEGORIES", download_vedio.TARGET_CATEGORIES)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+
+    assert cli.main(["--root", str(tmp_path), "pipeline", "--max-downloads", "1", "--category", "美女"]) == 0
+    assert len(downloaded) == 1
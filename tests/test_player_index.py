@@ -0,0 +1,40 @@
+"""Tests for the offline player index."""
+
+from dynamic_image.player_index import PlayerIndex, normalize_key
+
+
+# the Worker echoes the queried name, so a player may be indexed under any spelling
+PLAYERS = [
+    {"name": "宗山塁"},
+    {"name": "清宮幸太郎"},
+    {"name": "Ohtani Shohei"},
+    {"name": "横山悠人"},
+    {"name": "織田翔希"},
+]
+
+
+def test_normalization():
+    assert normalize_key("ｷﾖﾐﾔ") == normalize_key("きよみや")
+    assert normalize_key("织田翔希") == normalize_key("織田翔希")
+    assert normalize_key("Ohtani") == normalize_key("otani")
+    assert normalize_key("Ohashi") == "ohashi"
+
+
+def test_lookup_matches_variants_but_not_similar_names():
+    index = PlayerIndex.from_entries(PLAYERS)
+
+    assert len(index) == 5
+    assert index.lookup("宗山壘")["name"] == "宗山塁"
+    assert index.lookup("清宫幸太郎")["name"] == "清宮幸太郎"
+    assert index.lookup("ＯＴＡＮＩ　shohei")["name"] == "Ohtani Shohei"
+    # one kanji apart is usually another player: only a suggestion, never an answer
+    assert index.lookup("宗山累") is None
+    assert [data["name"] for data, _ in index.search("宗山累")] == ["宗山塁"]
+    assert index.lookup("横山悠") is None
+
+
+def test_search_ranks_prefix_and_similar_names():
+    index = PlayerIndex.from_entries(PLAYERS)
+
+    assert index.prefix("ota") == ["otanishohei"]
+    assert [data["name"] for data, _ in index.search("横山悠")] == ["横山悠人"]
@@ -0,0 +1,70 @@
+"""Tests for the per-host rate controller."""
+
+import pytest
+
+from dynamic_image.rate_limit import CircuitOpenError, RateController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_controller(**options):
+    clock = FakeClock()
+    controller = RateController(clock=clock, sleep=clock.sleep, **options)
+    return controller, clock
+
+
+def test_token_bucket_paces_requests():
+    controller, clock = make_controller(initial_rate=2.0, burst=1)
+
+    for _ in range(5):
+        controller.acquire("cdn")
+
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_rate_adapts_and_backoff_grows():
+    controller, _ = make_controller(initial_rate=4.0, min_rate=0.5, increase=0.5)
+
+    assert controller.record("cdn", 200) is None
+    assert controller.current_rate("cdn") == pytest.approx(4.5)
+
+    delays = [controller.record("cdn", 429) for _ in range(3)]
+    assert controller.current_rate("cdn") == pytest.approx(0.5625)
+    assert 0.5 <= delays[0] <= 1.0 and 2.0 <= delays[2] <= 4.0
+    assert controller.record("cdn", 503, retry_after=30) >= 30
+
+    # Other hosts are unaffected.
+    assert controller.current_rate("gemini") == pytest.approx(4.0)
+
+
+def test_repeated_403_opens_the_circuit():
+    controller, clock = make_controller(breaker_threshold=3, breaker_cooldown=60)
+
+    for _ in range(3):
+        controller.record("cdn", 403)
+
+    assert controller.is_open("cdn")
+    with pytest.raises(CircuitOpenError):
+        controller.acquire("cdn")
+
+    clock.now += 61
+    assert not controller.is_open("cdn")
+    controller.acquire("cdn")
+
+
+def test_retryable_statuses_are_per_controller():
+    controller, _ = make_controller(breaker_threshold=2, retryable_status={429, 503})
+
+    for _ in range(3):
+        assert controller.record("gemini", 403) is None
+    assert not controller.is_open("gemini")
+    assert controller.record("gemini", 429) is not None
@@ -0,0 +1,37 @@
+"""Tests for the multi-category download scheduler."""
+
+from dynamic_image.scheduler import build_work_queue
+
+
+CANDIDATES = {
+    "美女": [("a", "girl"), ("b", "woman"), ("c", "lady"), ("d", "model")],
+    "情侣": [("b", "woman"), ("e", "couple")],
+    "日漫风格": [("f", "anime")],
+}
+
+
+def fetch_next(category, n):
+    return CANDIDATES[category][:n]
+
+
+def test_each_video_is_downloaded_once():
+    queue = build_work_queue(fetch_next, {"美女": 1, "情侣": 1}, limit=10)
+
+    # b is also the next candidate of 美女 once 情侣 has taken it: it is skipped.
+    assert [(item.video_id, item.source) for item in queue] == [
+        ("a", "美女"),
+        ("b", "情侣"),
+        ("c", "美女"),
+        ("e", "情侣"),
+        ("d", "美女"),
+    ]
+
+
+def test_weights_and_limit():
+    queue = build_work_queue(fetch_next, {"美女": 3, "情侣": 1, "日漫风格": 0}, limit=3)
+
+    assert [(item.video_id, item.source) for item in queue] == [
+        ("a", "美女"),
+        ("b", "美女"),
+        ("e", "情侣"),
+    ]
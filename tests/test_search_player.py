@@ -0,0 +1,97 @@
+"""Tests for batch player lookup and its TTL cache."""
+
+import threading
+import time
+
+from dynamic_image.player_index import PlayerIndex
+from dynamic_image.search_player import PlayerCache, PlayerLookupError, search_players
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_batch_lookup_dedups_and_runs_concurrently():
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(name):
+        with lock:
+            calls.append(name)
+        time.sleep(0.1)
+        return {"name": name}
+
+    names = [f"選手{i}" for i in range(20)] + ["選手１", " 選手1 "]
+    started = time.monotonic()
+    results = search_players(names, fetch_fn=fetch, max_workers=20)
+
+    assert time.monotonic() - started < 1.0
+    assert sorted(calls) == sorted(f"選手{i}" for i in range(20))
+    assert list(results) == [f"選手{i}" for i in range(20)]
+    assert results["選手1"] == ("found", {"name": "選手1"})
+
+
+def test_cache_serves_hits_and_misses_until_they_expire(tmp_path):
+    clock = FakeClock()
+    calls = []
+
+    def fetch(name):
+        calls.append(name)
+        if name == "nobody":
+            return None
+        if name == "flaky":
+            raise PlayerLookupError("API 错误: 502")
+        return {"name": name}
+
+    with PlayerCache(str(tmp_path / "players.db"), found_ttl=100, miss_ttl=10, clock=clock) as cache:
+        first = search_players(["宗山塁", "nobody", "flaky"], cache, fetch)
+        assert first == {"宗山塁": ("found", {"name": "宗山塁"}), "nobody": ("missing", None),
+                         "flaky": ("error", "API 错误: 502")}
+
+        calls.clear()
+        assert search_players(["宗山塁", "nobody", "flaky"], cache, fetch) == first
+        assert calls == ["flaky"]
+
+        calls.clear()
+        clock.now += 50
+        search_players(["宗山塁", "nobody"], cache, fetch)
+        assert calls == ["nobody"]
+
+
+def test_index_answers_known_players_without_requests():
+    calls = []
+
+    def fetch(name):
+        calls.append(name)
+        return {"name": name}
+
+    index = PlayerIndex.from_entries([{"name": "宗山塁"}, {"name": "山田哲人"}])
+    results = search_players(["宗山壘", "横山悠", "山田哲也"], fetch_fn=fetch, index=index)
+
+    assert calls == ["横山悠", "山田哲也"]
+    assert results["宗山壘"] == ("found", {"name": "宗山塁"})
+    assert results["山田哲也"] == ("found", {"name": "山田哲也"})
+    assert index.lookup("横山悠") == {"name": "横山悠"}
+
+
+def test_expired_players_are_not_answered_from_the_index(tmp_path):
+    clock = FakeClock()
+    calls = []
+
+    def fetch(name):
+        calls.append(name)
+        return {"name": name, "url": f"new/{len(calls)}"}
+
+    with PlayerCache(str(tmp_path / "players.db"), found_ttl=100, clock=clock) as cache:
+        search_players(["宗山塁"], cache, fetch)
+        assert len(PlayerIndex.from_entries(cache.found_entries())) == 1
+
+        clock.now += 200
+        assert cache.found_entries() == []
+        results = search_players(["宗山塁"], cache, fetch, index=PlayerIndex.from_entries(cache.found_entries()))
+        assert calls == ["宗山塁", "宗山塁"]
+        assert results["宗山塁"] == ("found", {"name": "宗山塁", "url": "new/2"})
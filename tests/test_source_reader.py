@@ -0,0 +1,47 @@
+"""Tests for the streaming source reader."""
+
+import io
+import json
+
+import pytest
+
+from dynamic_image.source_reader import PromptRecord, iter_json_records, iter_prompt_records
+
+
+def make_record(i):
+    return {
+        "id": f"id-{i}",
+        "owner_profile": {"bio": "x" * 300},
+        "prompt": {"decodedPrompt": [{"content": f'prompt {i}, with [brackets] and "quotes"'}]},
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 4096])
+def test_json_array_is_parsed_across_chunk_boundaries(chunk_size):
+    records = [make_record(i) for i in range(20)]
+    text = json.dumps(records, indent=2)
+
+    assert list(iter_json_records(io.StringIO(text), chunk_size)) == records
+
+
+def test_jsonl_and_empty_inputs():
+    records = [make_record(i) for i in range(5)]
+    text = "\n".join(json.dumps(r) for r in records) + "\n\n"
+
+    assert list(iter_json_records(io.StringIO(text), 16)) == records
+    assert list(iter_json_records(io.StringIO("  [ ]  "))) == []
+    assert list(iter_json_records(io.StringIO(""))) == []
+
+
+def test_truncated_input_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(io.StringIO('[{"id": "a"}, {"id": '), 8))
+
+
+def test_prompt_records_are_trimmed(tmp_path):
+    path = tmp_path / "feed.json"
+    path.write_text(json.dumps([make_record(0), {"id": "no-prompt", "prompt": {}}]), encoding="utf-8")
+
+    assert list(iter_prompt_records(path)) == [
+        PromptRecord("id-0", 'prompt 0, with [brackets] and "quotes"')
+    ]
@@ -0,0 +1,51 @@
+"""Tests for the binary source snapshot."""
+
+import json
+
+from dynamic_image import source_snapshot
+from dynamic_image.source_reader import PromptRecord, iter_prompt_records
+from dynamic_image.source_snapshot import load_prompt_records, snapshot_path
+
+
+def write_source(path, count):
+    records = [
+        {
+            "id": f"id-{i}",
+            "width": 784,
+            "height": 1168,
+            "enqueue_time": 1763617146725 + i,
+            "parent_id": f"parent-{i}",
+            "owner_profile": {"bio": "x" * 200},
+            "items": [{"filtered": False}],
+            "prompt": {"params": None, "decodedPrompt": [{"content": f"prompt {i}", "weight": 1}]},
+            "video_segments": [125, 250] if i % 2 else [],
+        }
+        for i in range(count)
+    ]
+    path.write_text(json.dumps(records), encoding="utf-8")
+
+
+def test_snapshot_matches_source_and_is_reused(tmp_path, monkeypatch):
+    source = tmp_path / "source.json"
+    write_source(source, 5)
+
+    records = list(load_prompt_records(source))
+    assert records == list(iter_prompt_records(source))
+    assert records[1] == PromptRecord("id-1", "prompt 1", 784, 1168, 1763617146726, "parent-1", (125, 250))
+    assert snapshot_path(source).exists()
+
+    def fail(*args):
+        raise AssertionError("snapshot rebuilt although the source did not change")
+
+    monkeypatch.setattr(source_snapshot, "build_snapshot", fail)
+    assert list(load_prompt_records(source)) == records
+
+
+def test_snapshot_is_rebuilt_when_source_changes(tmp_path):
+    source = tmp_path / "source.json"
+    write_source(source, 3)
+    assert len(list(load_prompt_records(source))) == 3
+
+    write_source(source, 8)
+    assert [r.id for r in load_prompt_records(source)] == [f"id-{i}" for i in range(8)]
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,73 @@
+"""Tests for the offline TF-IDF classifier."""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from dynamic_image.tfidf_classifier import TfidfModel, evaluate, load_model
+
+
+TOPICS = {
+    "动物萌宠": ["fluffy kitten", "golden retriever puppy", "sleepy cat", "playful dog"],
+    "赛博朋克风格": ["neon alley", "cyberpunk skyline", "rainy megacity", "holographic signs"],
+    "北欧风格": ["scandinavian living room", "white oak table", "hygge corner", "linen sofa"],
+}
+
+
+def _samples():
+    texts, labels = [], []
+    for category, phrases in TOPICS.items():
+        for i, phrase in enumerate(phrases):
+            for other in phrases[i + 1:] + phrases[:i]:
+                texts.append(f"a photo of {phrase} next to {other}")
+                labels.append([category])
+    texts += ["a blank page", "an empty frame", "nothing in particular"]
+    labels += [["未分类"]] * 3
+    return texts, labels
+
+
+def test_predicts_trained_topics():
+    texts, labels = _samples()
+    model = TfidfModel.train(texts, labels, n_features=2 ** 12)
+
+    assert "未分类" not in model.categories
+    predictions = model.predict([
+        "a photo of sleepy cat next to fluffy kitten and playful dog",
+        "a photo of neon alley next to holographic signs in cyberpunk skyline",
+    ])
+    assert predictions == [["动物萌宠"], ["赛博朋克风格"]]
+    assert evaluate(model, texts, labels)["exact_match"] == 1.0
+
+
+def test_unrelated_text_is_fallback_or_uncertain():
+    texts, labels = _samples()
+    model = TfidfModel.train(texts, labels, n_features=2 ** 12)
+
+    assert model.predict(["quantum chromodynamics lecture"], confident_only=False) == [["未分类"]]
+    assert model.predict([]) == []
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    texts, labels = _samples()
+    model = TfidfModel.train(texts, labels, n_features=2 ** 12, margin=0.2)
+    path = tmp_path / "model.npz"
+    model.save(path)
+
+    loaded = load_model(path)
+    assert loaded.categories == model.categories
+    assert loaded.margin == pytest.approx(0.2)
+    assert loaded.predict(texts) == model.predict(texts)
+    assert load_model(tmp_path / "missing.npz") is None
+
+
+def test_cli_trains_or_only_evaluates(tmp_path, monkeypatch):
+    from dynamic_image import cli, tfidf_classifier
+
+    monkeypatch.setattr(tfidf_classifier, "load_training_data", _samples)
+    monkeypatch.setattr(tfidf_classifier, "RESULT_DIR", tmp_path)
+    monkeypatch.setattr(tfidf_classifier, "MODEL_FILE", tmp_path / "model.npz")
+
+    assert cli.main(["train-tfidf", "--evaluate-only"]) == 0
+    assert not (tmp_path / "model.npz").exists()
+    assert cli.main(["train-tfidf"]) == 0
+    assert load_model(tmp_path / "model.npz") is not None
@@ -0,0 +1,52 @@
+"""Tests for the buffered stream writer and the progress reporter."""
+
+import io
+
+from dynamic_image.transfer import ProgressReporter, StreamWriter
+
+
+def test_stream_writer_appends_at_offset(tmp_path):
+    path = tmp_path / "video.part"
+    path.write_bytes(b"head")
+
+    with StreamWriter(path, offset=4, buffer_size=10) as writer:
+        writer.preallocate(1000)
+        for i in range(7):
+            writer.write(bytes([65 + i]) * 3)
+        assert writer.written == 21
+
+    # Preallocation must not change the size: it is the resume offset.
+    assert path.read_bytes() == b"head" + b"".join(bytes([65 + i]) * 3 for i in range(7))
+
+
+def test_stream_writer_flushes_on_error(tmp_path):
+    path = tmp_path / "video.part"
+    try:
+        with StreamWriter(path, buffer_size=1 << 20) as writer:
+            writer.write(b"partial")
+            raise ConnectionError("reset")
+    except ConnectionError:
+        pass
+    assert path.read_bytes() == b"partial"
+
+
+def test_progress_reporter_is_throttled():
+    now = [0.0]
+    out = io.StringIO()
+    progress = ProgressReporter(total_files=2, interval=1.0, stream=out, clock=lambda: now[0])
+
+    progress.start("a", total=100)
+    for _ in range(50):
+        now[0] += 0.01
+        progress.update("a", 1)
+    assert out.getvalue().count("\r") == 0
+
+    now[0] += 1.0
+    progress.update("a", 1)
+    assert out.getvalue().count("\r") == 1
+
+    progress.finish("a", True)
+    progress.finish("b", None)
+    progress.close()
+    last = out.getvalue().rsplit("\r", 1)[-1]
+    assert "完成 1/2" in last and "失败" not in last
@@ -0,0 +1,65 @@
+"""Tests for batch translation, the translation cache and background back-fill."""
+
+import sqlite3
+
+from dynamic_image.download_store import DownloadStore
+from dynamic_image.translation import BackgroundTranslator, translate_batch, translate_with_cache
+
+
+class FakeTranslator:
+    """Uppercases text and records every request it receives."""
+
+    def __init__(self, merge_lines=False):
+        self.requests = []
+        self.merge_lines = merge_lines
+
+    def __call__(self, text):
+        self.requests.append(text)
+        translated = text.upper()
+        return translated.replace("\n", " ") if self.merge_lines else translated
+
+
+def test_batch_packs_many_prompts_per_request():
+    fake = FakeTranslator()
+    texts = ["a cat", "a dog", "x" * 30, "a bird"]
+
+    assert translate_batch(texts, fake, max_length=40) == ["A CAT", "A DOG", "X" * 30, "A BIRD"]
+    assert len(fake.requests) == 2
+
+
+def test_batch_falls_back_when_lines_do_not_match():
+    fake = FakeTranslator(merge_lines=True)
+
+    assert translate_batch(["a cat", "a dog"], fake) == ["A CAT", "A DOG"]
+    assert fake.requests == ["a cat\na dog", "a cat", "a dog"]
+
+
+def test_cache_and_background_backfill(tmp_path):
+    db_file = str(tmp_path / "store.db")
+    store = DownloadStore(db_file)
+    for video_id in ("v1", "v2", "v3"):
+        store.save_downloaded_video(video_id, "美女", f"prompt {video_id[-1]}", None, "x.mp4")
+
+    fake = FakeTranslator()
+    with BackgroundTranslator(store, batch_size=2, translate_fn=fake) as translator:
+        for video_id, text in store.get_untranslated(10):
+            translator.submit(video_id, text)
+        translator.submit("v1", "prompt 1")
+
+    assert translator.translated_count == 4
+    assert store.get_untranslated(10) == []
+    store.close()
+
+    rows = sqlite3.connect(db_file).execute(
+        "SELECT video_id, prompt_content_cn FROM downloaded_videos ORDER BY video_id"
+    ).fetchall()
+    assert rows == [("v1", "PROMPT 1"), ("v2", "PROMPT 2"), ("v3", "PROMPT 3")]
+
+    # Re-runs are served from the cache without another request.
+    requests_before = len(fake.requests)
+    with DownloadStore(db_file) as store:
+        assert translate_with_cache(store, ["prompt 2", "prompt 3"], fake) == {
+            "prompt 2": "PROMPT 2",
+            "prompt 3": "PROMPT 3",
+        }
+    assert len(fake.requests) == requests_before